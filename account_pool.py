@@ -0,0 +1,155 @@
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import threading
+import time
+
+import ccxt
+
+from binance_client import BinanceClient
+from metrics import metrics
+from rate_limiter import TokenBucket
+
+
+class AccountUnavailable(Exception):
+    """账户处于退避期或排队的请求已满"""
+
+
+class AccountWorker:
+    """单个账户的专属执行线程，拥有独立的限速器和失败退避状态
+
+    同一账户的请求串行执行，最多 max_pending 个请求排队；队列已满或处于退避期时直接拒绝，
+    因此一个卡住或被限流的账户不会占用其他账户的线程和配额。
+    """
+
+    def __init__(self, account: BinanceClient, rate_limit: float = 2, burst: float = 5,
+                 base_backoff: float = 5, max_backoff: float = 300, max_pending: int = 2,
+                 clock: Callable[[], float] = time.monotonic):
+        self.account = account
+        self.limiter = TokenBucket(rate_limit, burst, clock)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.backoff_until = 0.0
+        self.max_pending = max_pending
+        self._clock = clock
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'account-{account.account_name}')
+        metrics.gauge('account_pending_requests', '账户排队和执行中的请求数',
+                      func=lambda: self._pending, account=account.account_name)
+        metrics.gauge('account_backoff_seconds', '账户剩余退避时间（秒）',
+                      func=lambda: max(self.backoff_until - self._clock(), 0), account=account.account_name)
+
+    def submit(self, func: Callable[[BinanceClient], Any]) -> Future:
+        """提交一次账户请求，不可用时返回已失败的 Future"""
+        with self._lock:
+            now = self._clock()
+            if now < self.backoff_until:
+                return self._failed(AccountUnavailable(
+                    f"{self.account.account_name} 连续失败 {self.failures} 次，"
+                    f"退避中（剩余 {self.backoff_until - now:.0f}秒）"
+                ))
+            if self._pending >= self.max_pending:
+                return self._failed(AccountUnavailable(f"{self.account.account_name} 之前的请求仍在执行"))
+            self._pending += 1
+        try:
+            future = self._executor.submit(self._run, func)
+        except RuntimeError as e:
+            self._release()
+            return self._failed(e)
+        # 执行结束或排队中被取消时都释放名额
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future: Optional[Future] = None):
+        with self._lock:
+            self._pending -= 1
+
+    def _run(self, func: Callable[[BinanceClient], Any]):
+        try:
+            self.limiter.acquire()
+            result = func(self.account)
+        except Exception as e:
+            self._record_failure(e)
+            raise
+        else:
+            self._record_success()
+            return result
+
+    def _record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.backoff_until = 0.0
+
+    def _record_failure(self, error: Exception):
+        """连续失败按指数退避，被交易所限流时至少退避一分钟"""
+        metrics.counter('account_failures_total', '账户请求失败次数', account=self.account.account_name).inc()
+        with self._lock:
+            self.failures += 1
+            delay = min(self.base_backoff * 2 ** (self.failures - 1), self.max_backoff)
+            if isinstance(error, (ccxt.RateLimitExceeded, ccxt.DDoSProtection)):
+                delay = max(delay, min(60, self.max_backoff))
+            self.backoff_until = self._clock() + delay
+
+    @staticmethod
+    def _failed(error: Exception) -> Future:
+        future = Future()
+        future.set_exception(error)
+        return future
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AccountPool:
+    """多账户并发执行：每个账户由独立的 AccountWorker 执行，各账户错误、限流互不影响，并限制单次调用耗时"""
+
+    def __init__(self, accounts: List[BinanceClient], timeout: float = 30,
+                 rate_limit: float = 2, burst: float = 5, max_backoff: float = 300,
+                 limits: Optional[Dict[str, Dict]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.accounts = accounts
+        self.timeout = timeout
+        limits = limits or {}
+        self.workers = {}
+        for account in accounts:
+            options = {'rate_limit': rate_limit, 'burst': burst, 'max_backoff': max_backoff}
+            options.update(limits.get(account.account_name, {}))
+            self.workers[account.account_name] = AccountWorker(account, clock=clock, **options)
+
+    def submit(self, account: BinanceClient, func: Callable[[BinanceClient], Any]) -> Future:
+        """在账户专属线程中执行 func"""
+        return self.workers[account.account_name].submit(func)
+
+    def call(self, account: BinanceClient, func: Callable[[BinanceClient], Any],
+             timeout: Optional[float] = None) -> Any:
+        """在账户专属线程中执行 func 并等待结果"""
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return self.submit(account, func).result(timeout=timeout)
+        except FutureTimeoutError:
+            raise TimeoutError(f"{account.account_name} 请求超时（{timeout}秒）")
+
+    def map(self, func: Callable[[BinanceClient], Any],
+            timeout: Optional[float] = None) -> List[Tuple[BinanceClient, Any, Optional[Exception]]]:
+        """对每个账户并发执行 func，按账户顺序返回 (账户, 结果, 异常)"""
+        timeout = self.timeout if timeout is None else timeout
+        futures = [(account, self.submit(account, func)) for account in self.accounts]
+        deadline = time.monotonic() + timeout
+
+        results = []
+        for account, future in futures:
+            try:
+                result = future.result(timeout=max(deadline - time.monotonic(), 0))
+                results.append((account, result, None))
+            except FutureTimeoutError:
+                future.cancel()
+                results.append((account, None, TimeoutError(f"{account.account_name} 请求超时（{timeout}秒）")))
+            except Exception as e:
+                results.append((account, None, e))
+        return results
+
+    def shutdown(self):
+        """关闭所有账户线程"""
+        for worker in self.workers.values():
+            worker.shutdown()
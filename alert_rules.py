@@ -0,0 +1,311 @@
+import bisect
+import logging
+import math
+import threading
+import time
+from collections import namedtuple
+from typing import Callable, Dict, List, Optional, Tuple
+
+from db import open_sqlite
+
+logger = logging.getLogger(__name__)
+
+# 一条提醒规则：kind 为 price（标记价格）或 pnl（持仓收益率 %），
+# op 为 '>'（达到或高于）或 '<'（达到或低于），价格规则未指定方向时为 None，收到第一个价格后按穿越方向确定
+AlertRule = namedtuple('AlertRule', ['id', 'kind', 'market_id', 'op', 'value', 'created_at'])
+
+# 触发检查的价格阈值：同一交易对、同一方向的阈值按价格排序；position 为 pnl 规则对应的 (账户, 方向)
+_Trigger = namedtuple('_Trigger', ['price', 'rule_id', 'position'])
+
+# 价格规则在标记价格缓存中的跟踪方名称
+TRACK_OWNER = '提醒规则'
+# 规则编号为 SQLite INTEGER，超出范围的编号不可能存在
+MAX_RULE_ID = 2 ** 63 - 1
+
+
+def normalize_market_id(symbol: str) -> str:
+    """BTC、btcusdt、BTC/USDT、BTC/USDT:USDT -> BTCUSDT（未写计价货币时默认 USDT）"""
+    market_id = symbol.upper().split(':')[0].replace('/', '')
+    if not market_id.endswith(('USDT', 'USDC')):
+        market_id += 'USDT'
+    return market_id
+
+
+def format_threshold(value: float) -> str:
+    """阈值显示：去掉多余的 0，小币种价格不使用科学计数法"""
+    return f"{value:.8f}".rstrip('0').rstrip('.')
+
+
+def parse_rule(args: List[str]) -> Tuple[str, str, Optional[str], float]:
+    """解析 /alert 参数，返回 (kind, market_id, op, value)
+
+    BTC > 70000、BTC 70000（按当前价格判断穿越方向）、SOL pnl < -5、SOL < -5%、SOL -5%（负数为低于）
+    """
+    if len(args) < 2:
+        raise ValueError("格式: /alert BTC > 70000 或 /alert SOL pnl < -5")
+    market_id = normalize_market_id(args[0])
+    rest = args[1:]
+    kind = 'price'
+    if rest[0].lower() in ('pnl', '收益率'):
+        kind = 'pnl'
+        rest = rest[1:]
+    op = None
+    if rest and rest[0] in ('>', '>=', '<', '<='):
+        op = rest[0][0]
+        rest = rest[1:]
+    if len(rest) != 1:
+        raise ValueError("格式: /alert BTC > 70000 或 /alert SOL pnl < -5")
+    text = rest[0]
+    if text.endswith('%'):
+        kind = 'pnl'
+        text = text[:-1]
+    try:
+        value = float(text.replace(',', ''))
+    except ValueError:
+        raise ValueError(f"无法识别的数值: {rest[0]}")
+    if not math.isfinite(value):
+        raise ValueError(f"数值必须是有限的数: {rest[0]}")
+    if kind == 'price' and value <= 0:
+        raise ValueError("价格必须大于 0")
+    if kind == 'pnl' and op is None:
+        op = '<' if value < 0 else '>'
+    return kind, market_id, op, value
+
+
+class AlertRuleStore:
+    """提醒规则（SQLite WAL 模式），触发后保留记录并标记触发时间"""
+
+    def __init__(self, path: str):
+        self._conn = open_sqlite(path)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS alert_rules (
+                    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind         TEXT NOT NULL,
+                    market_id    TEXT NOT NULL,
+                    op           TEXT,
+                    value        REAL NOT NULL,
+                    created_at   INTEGER NOT NULL,
+                    triggered_at INTEGER
+                )
+            """)
+            self._conn.commit()
+
+    def add(self, kind: str, market_id: str, op: Optional[str], value: float) -> AlertRule:
+        created_at = int(time.time() * 1000)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO alert_rules (kind, market_id, op, value, created_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, market_id, op, value, created_at)
+            )
+        return AlertRule(cursor.lastrowid, kind, market_id, op, value, created_at)
+
+    def set_ops(self, ops: List[Tuple[int, str]]):
+        """保存 (规则编号, 方向)：未指定方向的规则收到第一个价格后确定"""
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE alert_rules SET op = ? WHERE id = ?", [(op, i) for i, op in ops])
+
+    def remove(self, rule_id: int) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM alert_rules WHERE id = ? AND triggered_at IS NULL", (rule_id,)
+            )
+        return cursor.rowcount > 0
+
+    def mark_triggered(self, rule_ids: List[int]):
+        triggered_at = int(time.time() * 1000)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE alert_rules SET triggered_at = ? WHERE id = ?", [(triggered_at, i) for i in rule_ids]
+            )
+
+    def active(self) -> List[AlertRule]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, kind, market_id, op, value, created_at FROM alert_rules "
+                "WHERE triggered_at IS NULL ORDER BY id"
+            ).fetchall()
+        return [AlertRule(*row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class AlertRuleEngine:
+    """按标记价格触发用户提醒规则（一次性，触发后失效）
+
+    每个交易对的阈值按方向存放在两个有序列表中：'>' 阈值升序，价格更新时用 bisect 取出
+    不高于当前价格的前缀；'<' 阈值同样升序，取出不低于当前价格的后缀。每次价格更新只接触被穿越的阈值，
+    耗时与规则总数无关。收益率规则按持仓的开仓均价、数量和保证金换算成价格阈值，持仓变化时重新换算。
+    """
+
+    def __init__(self, store: AlertRuleStore, notify: Callable[[List[Dict]], None], price_cache=None):
+        self.store = store
+        self.notify = notify
+        self.price_cache = price_cache
+        self._rules: Dict[int, AlertRule] = {}
+        self._above: Dict[str, List[_Trigger]] = {}
+        self._below: Dict[str, List[_Trigger]] = {}
+        self._pending: Dict[str, List[int]] = {}  # 未指定方向的价格规则，等待第一个价格
+        self._triggers: Dict[int, List[Tuple[List[_Trigger], _Trigger]]] = {}  # 规则 -> 已建立索引的阈值
+        # 账户 -> {交易对: [(方向, 开仓均价, 数量, 保证金)]}
+        self._positions: Dict[str, Dict[str, List[Tuple[str, float, float, float]]]] = {}
+        self._lock = threading.Lock()
+        with self._lock:
+            for rule in store.active():
+                self._index(rule)
+        self._track()
+
+    def add(self, kind: str, market_id: str, op: Optional[str], value: float) -> AlertRule:
+        rule = self.store.add(kind, market_id, op, value)
+        with self._lock:
+            self._index(rule)
+        self._track()
+        return rule
+
+    def remove(self, rule_id: int) -> bool:
+        removed = self.store.remove(rule_id)
+        with self._lock:
+            self._unindex(rule_id)
+        self._track()
+        return removed
+
+    def rules(self) -> List[AlertRule]:
+        with self._lock:
+            return sorted(self._rules.values())
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def update_positions(self, account_name: str, positions: List[Dict]):
+        """持仓变化后重新换算收益率规则的价格阈值"""
+        book = {}
+        for position in positions:
+            market_id = normalize_market_id(position['symbol'])
+            book.setdefault(market_id, []).append((
+                position['side'], float(position['entryPrice']), float(position['contracts']),
+                float(position['margin'])
+            ))
+        with self._lock:
+            if self._positions.get(account_name) == book:
+                return
+            self._positions[account_name] = book
+            for rule in [rule for rule in self._rules.values() if rule.kind == 'pnl']:
+                self._unindex(rule.id)
+                self._index(rule)
+
+    def on_prices(self, prices: Dict[str, float]):
+        """标记价格推送：只取出被穿越的阈值"""
+        fired = []
+        resolved = []
+        with self._lock:
+            above_book, below_book, pending = self._above, self._below, self._pending
+            for market_id, price in prices.items():
+                if pending and market_id in pending:
+                    resolved.extend(self._resolve(market_id, price))
+                above = above_book.get(market_id)
+                if above and above[0][0] <= price:
+                    end = bisect.bisect_right(above, (price, float('inf')))
+                    hits = above[:end]
+                    del above[:end]
+                    self._fire(hits, price, fired)
+                below = below_book.get(market_id)
+                if below and below[-1][0] >= price:
+                    start = bisect.bisect_left(below, (price,))
+                    hits = below[start:]
+                    del below[start:]
+                    self._fire(hits, price, fired)
+        if resolved:
+            self.store.set_ops(resolved)
+        if fired:
+            self.store.mark_triggered([alert['rule'].id for alert in fired])
+            self._track()
+            try:
+                self.notify(fired)
+            except Exception as e:
+                logger.error(f"发送提醒失败: {e}")
+
+    def _fire(self, hits: List[_Trigger], price: float, fired: List[Dict]):
+        for trigger in hits:
+            rule = self._rules.get(trigger.rule_id)
+            if rule is None:
+                continue
+            # 同一条收益率规则可能对应多个账户的持仓，只触发一次
+            self._unindex(rule.id)
+            fired.append(self._describe(rule, trigger, price))
+
+    def _resolve(self, market_id: str, price: float) -> List[Tuple[int, str]]:
+        """第一个价格到达时确定未指定方向的价格规则：当前低于阈值则等待上穿，否则等待下穿"""
+        resolved = []
+        for rule_id in self._pending.pop(market_id):
+            rule = self._rules.get(rule_id)
+            if rule is None:
+                continue
+            rule = self._rules[rule_id] = rule._replace(op='>' if price < rule.value else '<')
+            self._index(rule)
+            resolved.append((rule_id, rule.op))
+        return resolved
+
+    def _index(self, rule: AlertRule):
+        self._rules[rule.id] = rule
+        if rule.kind == 'price':
+            if rule.op is None:
+                self._pending.setdefault(rule.market_id, []).append(rule.id)
+                return
+            self._insert(rule.id, rule.market_id, rule.op, rule.value, None)
+            return
+        # 收益率 = 方向 × 数量 × (价格 - 开仓均价) / 保证金 × 100，换算为价格阈值
+        for account_name, book in self._positions.items():
+            for side, entry_price, contracts, margin in book.get(rule.market_id, ()):
+                if not contracts or not margin:
+                    continue
+                sign = 1 if side == 'long' else -1
+                price = entry_price + rule.value * margin / (100 * sign * contracts)
+                if price <= 0:
+                    continue
+                # 空头的收益率随价格下跌而上升，方向与价格相反
+                op = rule.op if sign > 0 else ('<' if rule.op == '>' else '>')
+                self._insert(rule.id, rule.market_id, op, price, (account_name, side))
+
+    def _insert(self, rule_id: int, market_id: str, op: str, price: float, position: Optional[Tuple]):
+        book = self._above if op == '>' else self._below
+        triggers = book.setdefault(market_id, [])
+        trigger = _Trigger(price, rule_id, position)
+        bisect.insort(triggers, trigger)
+        self._triggers.setdefault(rule_id, []).append((triggers, trigger))
+
+    def _unindex(self, rule_id: int):
+        rule = self._rules.pop(rule_id, None)
+        if rule is None:
+            return
+        for triggers, trigger in self._triggers.pop(rule_id, ()):
+            i = bisect.bisect_left(triggers, trigger)
+            if i < len(triggers) and triggers[i] == trigger:
+                del triggers[i]
+        pending = self._pending.get(rule.market_id)
+        if pending and rule_id in pending:
+            pending.remove(rule_id)
+            if not pending:
+                del self._pending[rule.market_id]
+
+    def _describe(self, rule: AlertRule, trigger: _Trigger, price: float) -> Dict:
+        alert = {'rule': rule, 'price': price, 'account_name': None, 'side': None, 'pnl_percentage': None}
+        if trigger.position is not None:
+            account_name, side = trigger.position
+            alert['account_name'] = account_name
+            alert['side'] = side
+            for position_side, entry_price, contracts, margin in self._positions[account_name][rule.market_id]:
+                if position_side == side:
+                    sign = 1 if side == 'long' else -1
+                    alert['pnl_percentage'] = sign * contracts * (price - entry_price) / margin * 100
+        return alert
+
+    def _track(self):
+        """让标记价格缓存跟踪有价格规则的交易对（收益率规则的交易对已由账户跟踪）"""
+        if self.price_cache is None:
+            return
+        with self._lock:
+            market_ids = {rule.market_id for rule in self._rules.values() if rule.kind == 'price'}
+        self.price_cache.track(TRACK_OWNER, market_ids)
@@ -0,0 +1,125 @@
+"""账户接口解析性能测试：回放账户接口响应，对比每次轮询的响应大小和解析耗时
+
+fixtures 目录下为按币安接口格式整理的响应（600 个交易对，其中 5 个有持仓）：
+- account_v2.json: /fapi/v2/account，返回全部交易对
+- account_v3.json: /fapi/v3/account，只返回有持仓的交易对
+- position_risk_v3.json: /fapi/v3/positionRisk，v3 模式下持仓变化时才请求
+
+耗时包含 JSON 解码和持仓解析，不含网络传输。
+
+运行: python -m benchmarks.account_payload
+"""
+import json
+import os
+import timeit
+
+import ccxt
+
+from benchmarks.startup import exchange_info
+from binance_client import BinanceClient
+from price_cache import MarkPriceCache
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+ROUNDS = 500
+
+
+def read_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+class ReplayExchange:
+    """回放录制响应的交易所，交易对信息由 ccxt 解析"""
+
+    def __init__(self, payloads, markets_by_id):
+        self.payloads = payloads
+        self.markets_by_id = markets_by_id
+        self.calls = []
+
+    def milliseconds(self):
+        return 1729230000000
+
+    def load_markets(self, reload=False, params={}):
+        return {}
+
+    def _replay(self, name):
+        self.calls.append(name)
+        return json.loads(self.payloads[name])
+
+    def fapiPrivateV2GetAccount(self, params={}):
+        return self._replay('account_v2.json')
+
+    def fapiPrivateV3GetAccount(self, params={}):
+        return self._replay('account_v3.json')
+
+    def fapiPrivateV3GetPositionRisk(self, params={}):
+        rows = self._replay('position_risk_v3.json')
+        return [row for row in rows if 'symbol' not in params or row['symbol'] == params['symbol']]
+
+
+def legacy_parse_positions(client, account_info):
+    """旧实现：每一行都转换交易对和浮点数"""
+    active_positions = []
+    now = client._now()
+    for position in account_info.get('positions', []):
+        symbol = client._symbol_from_id(position['symbol'])
+        if position.get('leverage'):
+            client._leverages[symbol] = float(position['leverage'])
+        amount = float(position['positionAmt'])
+        if amount == 0:
+            continue
+        side = 'long' if amount > 0 else 'short'
+        margin = float(position['initialMargin'])
+        unrealized_pnl = float(position['unrealizedProfit'])
+        active_positions.append(client._build_position(
+            symbol, side, abs(amount), float(position['entryPrice']), margin, unrealized_pnl,
+            unrealized_pnl / margin * 100 if margin else 0.0, now
+        ))
+    return active_positions
+
+
+def main():
+    payloads = {name: read_fixture(name) for name in ('account_v2.json', 'account_v3.json', 'position_risk_v3.json')}
+    market_ids = [p['symbol'] for p in json.loads(payloads['account_v2.json'])['positions']]
+    parser = ccxt.binance({'options': {'defaultType': 'future', 'fetchMarkets': {'types': ['linear']}}})
+    parser.fapiPublicGetExchangeInfo = lambda params={}: exchange_info([m[:-4] for m in market_ids])
+    parser.load_markets()
+
+    def client(endpoint, watchlist=None):
+        exchange = ReplayExchange(payloads, parser.markets_by_id)
+        return BinanceClient({'name': '主账户'}, exchange=exchange, price_cache=MarkPriceCache(),
+                             account_endpoint=endpoint, watchlist=watchlist)
+
+    legacy = client('v2')
+    v2 = client('v2')
+    v3 = client('v3')
+    watch = client('v2', watchlist=['BTCUSDT', 'ETHUSDT'])
+    # v3 首次需要额外请求 positionRisk 获取开仓均价，之后持仓不变时只请求账户接口
+    v3.get_snapshot()
+    v3.exchange.calls.clear()
+
+    decoded_v2 = json.loads(payloads['account_v2.json'])
+    decoded_v3 = json.loads(payloads['account_v3.json'])
+    cases = [
+        # (名称, 响应大小, 解码+解析, 仅解析)
+        ('v2 旧解析', len(payloads['account_v2.json']),
+         lambda: legacy_parse_positions(legacy, json.loads(payloads['account_v2.json'])),
+         lambda: legacy_parse_positions(legacy, decoded_v2)),
+        ('v2 跳过空仓', len(payloads['account_v2.json']), v2.get_snapshot,
+         lambda: v2._parse_positions(decoded_v2)),
+        ('v2 关注列表', len(payloads['account_v2.json']), watch.get_snapshot,
+         lambda: watch._parse_positions(decoded_v2)),
+        ('v3', len(payloads['account_v3.json']), v3.get_snapshot,
+         lambda: v3._parse_positions_v3(decoded_v3)),
+    ]
+    print(f"交易对数量: {len(market_ids)}  持仓数量: {len(v2.get_snapshot()['positions'])}")
+    for name, size, func, parse in cases:
+        elapsed = timeit.timeit(func, number=ROUNDS) / ROUNDS
+        parse_elapsed = timeit.timeit(parse, number=ROUNDS) / ROUNDS
+        print(f"{name:<10}: 响应 {size / 1024:7.1f} KB  解码+解析 {elapsed * 1e6:8.1f} µs  "
+              f"仅解析 {parse_elapsed * 1e6:7.1f} µs")
+    print(f"v3 持仓不变时每次轮询请求: {sorted(set(v3.exchange.calls))}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""端到端回放测试：本地模拟交易所 + 本地通知接收端，按场景测量每个监控周期的开销
+
+- 交易所：FakeFuturesExchange（可由 fixtures/account_v2.json 录制数据初始化），替代 ccxt.binance
+- 通知：FakeWebhookServer 模拟飞书 Webhook / Telegram Bot API，经 NotificationOutbox 真实发送
+- 场景：N 个账户、每个账户 M 个持仓、每个周期批量开仓/平仓数量，轮询或推送两种来源
+
+每个周期输出：
+- 告警延迟：仓位变化发生到通知接收端收到消息的时间
+- REST 请求数：所有账户模拟交易所记录的接口调用次数
+- CPU：进程 CPU 时间；内存：进程峰值 RSS
+
+检测到的开仓/平仓数量与实际不符时以非零状态退出，可直接用于 CI。完全离线运行。
+
+运行: python -m benchmarks.harness [--quick] [--accounts N --positions M --burst K --ticks T]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+from collections import namedtuple
+
+from account_pool import AccountPool
+from binance_client import BinanceClient
+from fakes import FakeFuturesExchange, FakeWebhookServer
+from price_cache import MarkPriceCache
+from services.feishu_service import FeishuNotifier
+from services.outbox import NotificationOutbox
+from services.telegram_service import TelegramService
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'account_v2.json')
+
+Scenario = namedtuple('Scenario', [
+    'name', 'accounts', 'positions', 'opens', 'closes', 'ticks', 'source', 'endpoint', 'channel'
+])
+
+
+def scenario(name, accounts, positions, opens, closes, ticks,
+             source='poll', endpoint='v3', channel='feishu') -> Scenario:
+    """positions 为 None 时用录制的账户数据初始化持仓"""
+    return Scenario(name, accounts, positions, opens, closes, ticks, source, endpoint, channel)
+
+
+SCENARIOS = [
+    scenario('录制数据回放', 2, None, 1, 1, 10),
+    scenario('少量账户', 2, 5, 1, 1, 10),
+    scenario('多账户', 20, 10, 1, 1, 10),
+    scenario('大量持仓', 4, 200, 2, 2, 10),
+    scenario('批量开平仓', 4, 20, 20, 20, 10),
+    scenario('批量开平仓(v2)', 4, 20, 20, 20, 10, endpoint='v2'),
+    scenario('批量开平仓(推送)', 4, 20, 20, 20, 10, source='stream'),
+    scenario('Telegram', 2, 5, 1, 1, 5, channel='telegram'),
+]
+
+
+class SimulatedAccount:
+    """一个模拟账户：交易所持仓由随机数生成器按场景修改"""
+
+    def __init__(self, name: str, spec: Scenario, rng: random.Random, price_cache: MarkPriceCache):
+        if spec.positions is None:
+            self.fake = FakeFuturesExchange.from_fixture(FIXTURE)
+        else:
+            self.fake = FakeFuturesExchange()
+            for i in range(spec.positions):
+                self.fake.set_position(f"P{i}USDT", 1.0 + i, 100.0 + i)
+        self.client = BinanceClient(
+            {'name': name}, exchange=self.fake, price_cache=price_cache, account_endpoint=spec.endpoint
+        )
+        self.rng = rng
+        self.next_id = 0
+
+    def mutate(self, opens: int, closes: int):
+        """平掉 closes 个已有持仓并新开 opens 个持仓，返回对应的 ACCOUNT_UPDATE 事件"""
+        events = []
+        existing = sorted(market_id for market_id, _ in self.fake.positions)
+        for market_id in self.rng.sample(existing, min(closes, len(existing))):
+            events.append(self.fake.set_position(market_id, 0, 0))
+        for _ in range(opens):
+            self.next_id += 1
+            amount = round(self.rng.uniform(0.1, 10), 3) * self.rng.choice((1, -1))
+            events.append(self.fake.set_position(f"N{self.next_id}USDT", amount, round(self.rng.uniform(1, 1000), 2)))
+        return events
+
+
+def make_notifier(channel: str, server: FakeWebhookServer):
+    """创建指向本地接收端的通知服务"""
+    if channel == 'telegram':
+        notifier = TelegramService()
+        notifier.bot_token = 'test-token'
+        notifier.chat_id = '1'
+        notifier.api_url = f"{server.url}/bot"
+    else:
+        notifier = FeishuNotifier()
+        notifier.webhook_url = f"{server.url}/open-apis/bot/v2/hook/test"
+    return notifier
+
+
+def peak_rss_mb() -> float:
+    # Linux 下 ru_maxrss 单位为 KB，macOS 下为字节
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+
+def run(spec: Scenario, window: float, seed: int = 0):
+    """运行一个场景，返回每个周期的测量结果和检测错误"""
+    rng = random.Random(seed)
+    price_cache = MarkPriceCache()
+    accounts = [SimulatedAccount(f"账户{i}", spec, rng, price_cache) for i in range(spec.accounts)]
+    clients = [account.client for account in accounts]
+    pool = AccountPool(clients, rate_limit=10000, burst=10000)
+    errors = []
+    ticks = []
+
+    with FakeWebhookServer() as server:
+        notifier = make_notifier(spec.channel, server)
+        outbox = NotificationOutbox(notifier, window=window)
+
+        def notify(changes):
+            if changes and (changes['new_positions'] or changes['closed_positions']):
+                outbox.send_message(notifier.format_position_message(changes))
+            return changes
+
+        # 建立仓位基线（不计入测量）
+        for account, _, error in pool.map(lambda client: client.check_position_changes()):
+            if error is not None:
+                errors.append(f"{account.account_name} 建立基线失败: {error}")
+
+        for tick in range(spec.ticks):
+            events = [account.mutate(spec.opens, spec.closes) for account in accounts]
+            calls_before = sum(len(account.fake.calls) for account in accounts)
+            received_before = len(server.received)
+            cpu_before = time.process_time()
+            started = time.time()
+
+            detected = []
+            if spec.source == 'stream':
+                for account, account_events in zip(accounts, events):
+                    for event in account_events:
+                        changes = notify(account.client.apply_user_data_event(event))
+                        if changes:
+                            detected.append((account.client, changes))
+            else:
+                for account, changes, error in pool.map(lambda client: notify(client.check_position_changes())):
+                    if error is not None:
+                        errors.append(f"周期 {tick} {account.account_name} 检查仓位失败: {error}")
+                    else:
+                        detected.append((account, changes))
+            outbox.flush()
+
+            opened = sum(len(changes['new_positions']) for _, changes in detected)
+            closed = sum(len(changes['closed_positions']) for _, changes in detected)
+            expected_opened = sum(len([e for e in es if float(e['a']['P'][0]['pa'])]) for es in events)
+            expected_closed = sum(len(es) for es in events) - expected_opened
+            if (opened, closed) != (expected_opened, expected_closed):
+                errors.append(f"周期 {tick}: 检测到开仓 {opened} 平仓 {closed}，"
+                              f"实际开仓 {expected_opened} 平仓 {expected_closed}")
+            delivered = server.received[received_before:]
+            if (opened or closed) and not delivered:
+                errors.append(f"周期 {tick}: 仓位有变化但通知接收端未收到消息")
+
+            ticks.append({
+                'latency_ms': (max(ts for ts, _, _ in delivered) - started) * 1000 if delivered else None,
+                'rest_calls': sum(len(account.fake.calls) for account in accounts) - calls_before,
+                'cpu_ms': (time.process_time() - cpu_before) * 1000,
+                'messages': len(delivered),
+            })
+
+        outbox.stop()
+    pool.shutdown()
+    return ticks, errors
+
+
+def summarize(spec: Scenario, ticks, rss_mb: float):
+    latencies = sorted(t['latency_ms'] for t in ticks if t['latency_ms'] is not None)
+    return {
+        'scenario': spec.name,
+        'accounts': spec.accounts,
+        'positions': spec.positions,
+        'burst': f"+{spec.opens}/-{spec.closes}",
+        'source': spec.source,
+        'endpoint': spec.endpoint,
+        'channel': spec.channel,
+        'ticks': len(ticks),
+        'latency_p50_ms': statistics.median(latencies) if latencies else None,
+        'latency_max_ms': latencies[-1] if latencies else None,
+        'rest_calls_per_tick': statistics.mean(t['rest_calls'] for t in ticks),
+        'cpu_ms_per_tick': statistics.mean(t['cpu_ms'] for t in ticks),
+        'messages_per_tick': statistics.mean(t['messages'] for t in ticks),
+        'peak_rss_mb': rss_mb,
+    }
+
+
+def print_table(results):
+    print(f"{'场景':<16}{'账户':>5}{'持仓':>6}{'开/平':>10}{'延迟p50':>10}{'延迟max':>10}"
+          f"{'REST/周期':>10}{'CPU/周期':>10}{'消息/周期':>10}{'峰值RSS':>10}")
+    for r in results:
+        positions = '录制' if r['positions'] is None else r['positions']
+        p50 = f"{r['latency_p50_ms']:.0f}ms" if r['latency_p50_ms'] is not None else '-'
+        worst = f"{r['latency_max_ms']:.0f}ms" if r['latency_max_ms'] is not None else '-'
+        print(f"{r['scenario']:<16}{r['accounts']:>5}{positions:>6}{r['burst']:>10}{p50:>10}{worst:>10}"
+              f"{r['rest_calls_per_tick']:>10.1f}{r['cpu_ms_per_tick']:>8.1f}ms"
+              f"{r['messages_per_tick']:>10.1f}{r['peak_rss_mb']:>8.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地回放性能测试')
+    parser.add_argument('--quick', action='store_true', help='每个场景只运行 3 个周期')
+    parser.add_argument('--accounts', type=int, help='自定义场景：账户数量')
+    parser.add_argument('--positions', type=int, default=10, help='自定义场景：每个账户的初始持仓数')
+    parser.add_argument('--burst', type=int, default=1, help='自定义场景：每个周期每个账户开仓和平仓的数量')
+    parser.add_argument('--ticks', type=int, default=10, help='自定义场景：周期数')
+    parser.add_argument('--source', choices=('poll', 'stream'), default='poll')
+    parser.add_argument('--endpoint', choices=('v2', 'v3'), default='v3')
+    parser.add_argument('--channel', choices=('feishu', 'telegram'), default='feishu')
+    parser.add_argument('--window', type=float, default=0.1, help='通知合并窗口（秒）')
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    if args.accounts:
+        scenarios = [scenario('自定义', args.accounts, args.positions, args.burst, args.burst, args.ticks,
+                              source=args.source, endpoint=args.endpoint, channel=args.channel)]
+    else:
+        scenarios = SCENARIOS
+    if args.quick:
+        scenarios = [spec._replace(ticks=min(spec.ticks, 3)) for spec in scenarios]
+
+    results = []
+    failures = []
+    for spec in scenarios:
+        ticks, errors = run(spec, args.window)
+        results.append(summarize(spec, ticks, peak_rss_mb()))
+        failures.extend(f"[{spec.name}] {error}" for error in errors)
+
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'results': results, 'failures': failures}, f, ensure_ascii=False, indent=2)
+    if failures:
+        print('\n'.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
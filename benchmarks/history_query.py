@@ -0,0 +1,61 @@
+"""历史存储性能测试：模拟一年 10 秒一次的采样后，测量磁盘占用和范围查询耗时
+
+近 7 天按 10 秒逐条写入；更早的数据在 1 分钟层级会被清理，1 小时/1 天层级只保留桶内
+最后一次采样，因此每小时写入一次即可得到与逐条写入完全相同的最终数据。
+
+运行: python -m benchmarks.history_query
+"""
+import os
+import tempfile
+import time
+
+from history_store import HistoryStore
+
+DAY = 86400
+POSITIONS = 10
+
+
+def snapshot(ts: int, i: int):
+    positions = [{
+        'symbol': f"COIN{n}/USDT:USDT", 'side': 'long', 'contracts': 1.0 + n,
+        'entryPrice': 100.0 + n, 'margin': 10.0, 'unrealizedPnl': (i % 100) / 10
+    } for n in range(POSITIONS)]
+    return {
+        'balance': {
+            'account_name': '主账户', 'total_balance': 10000 + i % 500, 'free_balance': 5000.0,
+            'used_balance': 5000.0, 'total_unrealized_pnl': (i % 100) / 10
+        },
+        'positions': positions,
+        'timestamp': ts * 1000,
+    }
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), 'history.db')
+    store = HistoryStore(path)
+    now = int(time.time())
+    start = now - 365 * DAY
+
+    begin = time.perf_counter()
+    i = 0
+    for ts in range(start, now - 7 * DAY, 3600):
+        store.record(snapshot(ts, i))
+        i += 1
+    for ts in range(now - 7 * DAY, now, 10):
+        store.record(snapshot(ts, i))
+        i += 1
+    store.prune(now)
+    store._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    print(f"写入耗时: {time.perf_counter() - begin:.1f} s")
+    print(f"数据库大小: {os.path.getsize(path) / 1024 / 1024:.1f} MB（{POSITIONS} 个持仓）")
+
+    for name, days in (('1 天', 1), ('7 天', 7), ('90 天', 90), ('1 年', 365)):
+        begin = time.perf_counter()
+        balances = store.query_balances('主账户', now - days * DAY, now)
+        positions = store.query_positions('主账户', 'COIN0/USDT:USDT', now - days * DAY, now)
+        elapsed = (time.perf_counter() - begin) * 1000
+        print(f"查询 {name:<5}: {elapsed:7.2f} ms  余额点数 {len(balances):5d}  持仓点数 {len(positions):5d}")
+
+
+if __name__ == '__main__':
+    main()
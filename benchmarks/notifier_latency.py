@@ -0,0 +1,70 @@
+"""通知发送延迟测试：对本地模拟服务器连续发送 1000 条消息，对比每次新建连接与复用长连接
+
+运行: python -m benchmarks.notifier_latency [条数]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+import requests
+from telegram import Bot
+
+from fakes import FakeWebhookServer
+from services.feishu_service import FeishuNotifier
+from services.telegram_service import TelegramService
+
+
+def measure(send, count: int):
+    latencies = []
+    for i in range(count):
+        start = time.perf_counter()
+        send(f"message {i}")
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.mean(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def report(name: str, result, server: FakeWebhookServer, connections_before: int):
+    mean, p99 = result
+    print(f"{name:<18} 平均 {mean:7.3f} ms  p99 {p99:7.3f} ms  新建连接 {server.connections - connections_before}")
+
+
+def main(count: int = 1000):
+    with FakeWebhookServer() as server:
+        webhook_url = f"{server.url}/open-apis/bot/v2/hook/test"
+
+        def feishu_legacy(message):
+            payload = {"msg_type": "text", "content": {"text": message}}
+            requests.post(webhook_url, json=payload).raise_for_status()
+
+        before = server.connections
+        report("飞书 旧实现", measure(feishu_legacy, count), server, before)
+
+        feishu = FeishuNotifier()
+        feishu.webhook_url = webhook_url
+        before = server.connections
+        report("飞书 连接复用", measure(feishu.send_message, count), server, before)
+
+        telegram = TelegramService()
+        telegram.bot_token = 'test-token'
+        telegram.chat_id = '1'
+        base_url = f"{server.url}/bot"
+
+        def telegram_legacy(message):
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            bot = Bot(token=telegram.bot_token, base_url=base_url)
+            loop.run_until_complete(telegram._async_send_message(bot, message))
+            loop.close()
+
+        before = server.connections
+        report("Telegram 旧实现", measure(telegram_legacy, count), server, before)
+
+        telegram.api_url = base_url
+        before = server.connections
+        report("Telegram 连接复用", measure(telegram.send_message, count), server, before)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
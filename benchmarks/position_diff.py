@@ -0,0 +1,90 @@
+"""仓位比较性能测试：200 个持仓下，旧实现与紧凑记录实现处理一次轮询结果的耗时对比
+
+不含网络请求，只测量把接口返回值转换为持仓并与上次快照比较的开销（新实现还包含模拟交易所生成响应的时间）。
+
+运行: python -m benchmarks.position_diff
+"""
+import timeit
+from datetime import datetime
+
+import pytz
+
+from binance_client import BinanceClient, EASTERN
+from fakes import FakeFuturesExchange
+
+POSITIONS = 200
+ROUNDS = 500
+
+
+def legacy_get_positions(client, positions):
+    """旧实现：每个持仓单独计算时间戳并构造字典"""
+    active_positions = []
+    for position in positions:
+        if float(position['contracts']) > 0:
+            timestamp = client.exchange.milliseconds()
+            utc_dt = datetime.fromtimestamp(timestamp/1000, pytz.UTC)
+            datetime_str = utc_dt.astimezone(EASTERN).strftime('%Y-%m-%d %H:%M:%S')
+            active_positions.append({
+                'account_name': client.account_name,
+                'symbol': position['symbol'],
+                'base_currency': position['symbol'].split('/')[0],
+                'side': position['side'],
+                'contracts': position['contracts'],
+                'entryPrice': position['entryPrice'],
+                'margin': position['initialMargin'],
+                'unrealizedPnl': position['unrealizedPnl'],
+                'percentage': position['percentage'],
+                'timestamp': timestamp,
+                'datetime': datetime_str
+            })
+    return active_positions
+
+
+def legacy_diff(last_positions, current_positions):
+    """旧实现：按交易对索引，整字典 != 比较"""
+    changes = {'new_positions': [], 'closed_positions': [], 'modified_positions': []}
+    for symbol, position in current_positions.items():
+        if symbol not in last_positions:
+            changes['new_positions'].append(position)
+        elif position != last_positions[symbol]:
+            changes['modified_positions'].append({'old': last_positions[symbol], 'new': position})
+    for symbol, position in last_positions.items():
+        if symbol not in current_positions:
+            changes['closed_positions'].append(position)
+    return changes
+
+
+def main():
+    exchange = FakeFuturesExchange()
+    for i in range(POSITIONS):
+        exchange.set_position(f"COIN{i}USDT", 1.0 + i, 10.0 + i)
+    raw_positions = exchange.fetch_positions()
+    client = BinanceClient({'name': '主账户'}, exchange=exchange)
+
+    # 旧实现：时间戳每次都不同，导致全部持仓被判定为修改
+    legacy_state = {'last': {p['symbol']: p for p in legacy_get_positions(client, raw_positions)}}
+
+    def run_legacy():
+        current = {p['symbol']: p for p in legacy_get_positions(client, raw_positions)}
+        changes = legacy_diff(legacy_state['last'], current)
+        legacy_state['last'] = current
+        return changes
+
+    client.check_position_changes()
+
+    def run_records():
+        return client.check_position_changes()
+
+    legacy_modified = len(run_legacy()['modified_positions'])
+    record_modified = len(run_records()['modified_positions'])
+
+    legacy = min(timeit.repeat(run_legacy, number=ROUNDS, repeat=5)) / ROUNDS * 1e6
+    records = min(timeit.repeat(run_records, number=ROUNDS, repeat=5)) / ROUNDS * 1e6
+
+    print(f"持仓数量: {POSITIONS}")
+    print(f"旧实现   : {legacy:8.1f} µs/次轮询  误报修改: {legacy_modified}")
+    print(f"紧凑记录 : {records:8.1f} µs/次轮询  误报修改: {record_modified}")
+
+
+if __name__ == '__main__':
+    main()
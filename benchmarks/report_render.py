@@ -0,0 +1,151 @@
+"""报告渲染性能测试：同一份快照生成飞书每日报告、Telegram 每日报告和 Telegram 查询回复
+
+- 旧实现：每个渠道各自分组、逐组排序、用 += 拼接字符串
+- 新实现：生成一次报告模型（一次排序），各渠道模板渲染后 join，持仓部分按模板缓存
+
+同时校验新旧实现输出完全一致（不含文件保存）。
+
+运行: python -m benchmarks.report_render
+"""
+import random
+import sys
+import timeit
+
+from services.report_renderer import Report, FEISHU_DAILY, TELEGRAM_DAILY, TELEGRAM_QUERY
+
+ACCOUNTS = 5
+POSITIONS_PER_ACCOUNT = 40
+ROUNDS = 500
+DATE = '2024-11-28'
+
+
+def make_snapshot():
+    rng = random.Random(0)
+    balances, positions = [], []
+    for i in range(ACCOUNTS):
+        name = f"账户{i}"
+        balances.append({
+            'account_name': name, 'total_balance': rng.uniform(1000, 100000), 'free_balance': rng.uniform(0, 1000),
+            'used_balance': rng.uniform(0, 1000), 'total_unrealized_pnl': rng.uniform(-500, 500),
+        })
+        for j in range(POSITIONS_PER_ACCOUNT):
+            positions.append({
+                'account_name': name, 'base_currency': f"COIN{j}", 'side': rng.choice(('long', 'short')),
+                'unrealizedPnl': rng.uniform(-100, 100), 'percentage': rng.uniform(-50, 50),
+            })
+    return balances, positions
+
+
+def legacy_group(balances, positions):
+    grouped = {balance['account_name']: [] for balance in balances}
+    for pos in positions:
+        grouped.setdefault(pos['account_name'], []).append(pos)
+    return grouped
+
+
+def legacy_feishu_daily(balances, positions):
+    report = [f"📊 每日账户报告 ({DATE})\n"]
+    total_assets = sum(balance['total_balance'] for balance in balances)
+    total_pnl = sum(balance['total_unrealized_pnl'] for balance in balances)
+    report.extend([
+        "💰 账户组合总览",
+        f"总资产: ${total_assets:.2f} USDT",
+        f"总未实现盈亏: ${total_pnl:.2f} USDT\n"
+    ])
+    for balance in balances:
+        report.extend([
+            f"【{balance['account_name']}】",
+            f"账户资产: ${balance['total_balance']:.2f} USDT",
+            f"可用余额: ${balance['free_balance']:.2f} USDT",
+            f"占用保证金: ${balance['used_balance']:.2f} USDT",
+            f"未实现盈亏: ${balance['total_unrealized_pnl']:.2f} USDT\n"
+        ])
+    if positions:
+        first_group = True
+        for account_name, account_positions in legacy_group(balances, positions).items():
+            if not account_positions:
+                continue
+            account_positions.sort(key=lambda x: float(x['unrealizedPnl']), reverse=True)
+            if not first_group:
+                report.append("")
+            first_group = False
+            report.append(f"📍 {account_name}持仓:")
+            for pos in account_positions:
+                report.append(
+                    f"{pos['base_currency']}: {pos['side']} "
+                    f"未实现盈亏: ${float(pos['unrealizedPnl']):.2f} ({pos['percentage']:.2f}%)\n"
+                )
+    else:
+        report.append("当前无持仓")
+    return "\n".join(report)
+
+
+def legacy_telegram_positions(balances, positions):
+    message = ""
+    if positions:
+        for account_name, account_positions in legacy_group(balances, positions).items():
+            if not account_positions:
+                continue
+            account_positions.sort(key=lambda x: float(x['unrealizedPnl']), reverse=True)
+            message += f"📍 {account_name}持仓:\n\n"
+            for pos in account_positions:
+                message += f"{pos['base_currency']} "
+                message += f"{pos['side']} "
+                message += f"{pos['unrealizedPnl']:.2f} USDT ({pos['percentage']:.2f}%)\n\n"
+    else:
+        message += "📍 当前无持仓\n\n"
+    return message
+
+
+def legacy_telegram_daily(balances, positions):
+    message = f"📊 每日账户报告 ({DATE})\n\n"
+    message += f"💰 总资产: {sum(b['total_balance'] for b in balances):.2f} USDT\n"
+    message += f"📈 未实现盈亏: {sum(b['total_unrealized_pnl'] for b in balances):.2f} USDT\n\n"
+    for balance in balances:
+        message += f"【{balance['account_name']}】\n"
+        message += f"总资产: {balance['total_balance']:.2f} USDT\n"
+        message += f"可用余额: {balance['free_balance']:.2f} USDT\n"
+        message += f"占用保证金: {balance['used_balance']:.2f} USDT\n"
+        message += f"未实现盈亏: {balance['total_unrealized_pnl']:.2f} USDT\n\n"
+    return message + legacy_telegram_positions(balances, positions)
+
+
+def legacy_telegram_query(balances, positions):
+    message = "📊 账户资产概览\n\n"
+    message += f"💰 总资产: {sum(b['total_balance'] for b in balances):.2f} USDT\n"
+    message += f"📈 未实现盈亏: {sum(b['total_unrealized_pnl'] for b in balances):.2f} USDT\n\n"
+    for balance in balances:
+        message += f"【{balance['account_name']}】\n"
+        message += f"💰 总资产: {balance['total_balance']:.2f} USDT\n"
+        message += f"💵 可用余额: {balance['free_balance']:.2f} USDT\n"
+        message += f"🔒 占用保证金: {balance['used_balance']:.2f} USDT\n"
+        message += f"📈 未实现盈亏: {balance['total_unrealized_pnl']:.2f} USDT\n\n"
+    return message + legacy_telegram_positions(balances, positions)
+
+
+def legacy_render(balances, positions):
+    return (legacy_feishu_daily(balances, positions), legacy_telegram_daily(balances, positions),
+            legacy_telegram_query(balances, positions))
+
+
+def new_render(balances, positions):
+    report = Report(balances, positions)
+    return (report.render(FEISHU_DAILY, DATE), report.render(TELEGRAM_DAILY, DATE), report.render(TELEGRAM_QUERY))
+
+
+def main():
+    balances, positions = make_snapshot()
+    for snapshot in ((balances, positions), (balances, []), (balances[:1], positions)):
+        if legacy_render(*snapshot) != new_render(*snapshot):
+            print("新旧实现输出不一致")
+            sys.exit(1)
+
+    legacy = timeit.timeit(lambda: legacy_render(balances, positions), number=ROUNDS) / ROUNDS
+    new = timeit.timeit(lambda: new_render(balances, positions), number=ROUNDS) / ROUNDS
+    print(f"账户数量: {ACCOUNTS}  持仓数量: {len(positions)}  渠道/消息: 3")
+    print(f"旧实现: {legacy * 1e6:8.1f} µs")
+    print(f"新实现: {new * 1e6:8.1f} µs  ({legacy / new:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
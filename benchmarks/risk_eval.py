@@ -0,0 +1,125 @@
+"""风险计算性能测试：每次标记价格推送全量重新计算与按交易对增量计算的对比
+
+模拟 5 个账户、每个账户 100 个持仓（全仓为主，部分逐仓），分别测试：
+- 全市场推送（!markPrice@arr@1s，所有持有的交易对价格都变化）
+- 单个交易对价格变化
+
+旧方式每次推送重新计算所有账户的保证金余额、维持保证金和所有持仓的强平距离；
+新方式（RiskEngine）只处理价格变化的交易对。同时校验两种方式的保证金比率和强平距离一致。
+
+运行: python -m benchmarks.risk_eval
+"""
+import random
+import sys
+import timeit
+
+from risk_engine import DEFAULT_MAINT_RATE, RiskEngine
+
+ACCOUNTS = 5
+POSITIONS_PER_ACCOUNT = 100
+SYMBOLS = 150
+ROUNDS = 200
+
+
+def make_accounts(rng: random.Random):
+    """返回 [(余额, 持仓列表)]，持仓价格即快照时的标记价格"""
+    accounts = []
+    for i in range(ACCOUNTS):
+        name = f"账户{i}"
+        positions = []
+        for symbol_index in rng.sample(range(SYMBOLS), POSITIONS_PER_ACCOUNT):
+            price = rng.uniform(1, 1000)
+            contracts = rng.uniform(10, 100) / price * 100
+            entry = price * rng.uniform(0.95, 1.05)
+            side = rng.choice(('long', 'short'))
+            sign = 1 if side == 'long' else -1
+            positions.append({
+                'account_name': name, 'symbol': f"COIN{symbol_index}/USDT:USDT",
+                'base_currency': f"COIN{symbol_index}", 'side': side, 'contracts': contracts,
+                'entryPrice': entry, 'unrealizedPnl': sign * contracts * (price - entry),
+                'maintMargin': contracts * price * DEFAULT_MAINT_RATE,
+                'isolatedWallet': contracts * entry / 10 if rng.random() < 0.1 else 0.0,
+            })
+        balance = {'account_name': name, 'total_balance': 0.0, 'wallet_balance': 300000.0 + i * 50000}
+        accounts.append((balance, positions))
+    return accounts
+
+
+def full_evaluate(accounts, prices):
+    """旧方式：按当前价格重新计算所有账户和所有持仓"""
+    ratios = {}
+    distances = {}
+    for balance, positions in accounts:
+        name = balance['account_name']
+        cross_balance = balance['wallet_balance']
+        cross_maint = 0.0
+        slopes = {}
+        for p in positions:
+            market_id = p['symbol'].split(':')[0].replace('/', '')
+            price = prices[market_id]
+            sign = 1 if p['side'] == 'long' else -1
+            rate = DEFAULT_MAINT_RATE
+            if p['isolatedWallet']:
+                cross_balance -= p['isolatedWallet']
+                iso_balance = p['isolatedWallet'] + sign * p['contracts'] * (price - p['entryPrice'])
+                slope = p['contracts'] * (sign - rate)
+                distances[(name, market_id, p['side'])] = max(
+                    (iso_balance - rate * p['contracts'] * price) / (abs(slope) * price), 0.0)
+            else:
+                cross_balance += sign * p['contracts'] * (price - p['entryPrice'])
+                cross_maint += rate * p['contracts'] * price
+                slopes[market_id] = slopes.get(market_id, 0.0) + p['contracts'] * (sign - rate)
+        ratios[name] = cross_maint / cross_balance
+        for market_id, slope in slopes.items():
+            distances[(name, market_id)] = max((cross_balance - cross_maint) / (abs(slope) * prices[market_id]), 0.0)
+    return ratios, distances
+
+
+def main():
+    rng = random.Random(0)
+    accounts = make_accounts(rng)
+    alerts = []
+    engine = RiskEngine(alerts.extend)
+    prices = {}
+    for balance, positions in accounts:
+        for p in positions:
+            sign = 1 if p['side'] == 'long' else -1
+            market_id = p['symbol'].split(':')[0].replace('/', '')
+            prices[market_id] = p['entryPrice'] + p['unrealizedPnl'] / (sign * p['contracts'])
+        engine.load(balance, positions)
+
+    # 生成一批价格推送
+    batches = []
+    for _ in range(ROUNDS):
+        prices = {market_id: price * rng.uniform(0.999, 1.001) for market_id, price in prices.items()}
+        batches.append(prices)
+    single = [{market_id: price * 1.0005} for market_id, price in list(batches[-1].items())[:ROUNDS]]
+
+    for batch in batches:
+        engine.on_prices(batch)
+    ratios, distances = full_evaluate(accounts, batches[-1])
+    for name, ratio in ratios.items():
+        if abs(engine.margin_ratio(name) - ratio) > 1e-9:
+            print(f"{name} 保证金比率不一致: {engine.margin_ratio(name)} {ratio}")
+            sys.exit(1)
+    for key, distance in distances.items():
+        values = {k: value for k, _, value in engine.liquidation(key[0], key[1])}
+        value = values[key]
+        # 强平价格不大于 0（距离 ≥ 100%）时引擎返回 inf
+        if (value == float('inf') and distance < 1) or (value != float('inf') and abs(value - distance) > 1e-9):
+            print(f"{key} 强平距离不一致: {value} {distance}")
+            sys.exit(1)
+
+    positions = ACCOUNTS * POSITIONS_PER_ACCOUNT
+    full = timeit.timeit(lambda: [full_evaluate(accounts, batch) for batch in batches], number=1) / ROUNDS
+    incremental = timeit.timeit(lambda: [engine.on_prices(batch) for batch in batches], number=1) / ROUNDS
+    full_single = timeit.timeit(lambda: [full_evaluate(accounts, batches[-1]) for _ in single], number=1) / ROUNDS
+    incremental_single = timeit.timeit(lambda: [engine.on_prices(tick) for tick in single], number=1) / ROUNDS
+    print(f"账户数量: {ACCOUNTS}  持仓数量: {positions}  交易对: {len(batches[-1])}  告警: {len(alerts)}")
+    print(f"{'':<16}{'全量计算':>12}{'增量计算':>12}")
+    print(f"{'全市场推送/次':<16}{full * 1e6:>10.1f}µs{incremental * 1e6:>10.1f}µs")
+    print(f"{'单交易对变化/次':<16}{full_single * 1e6:>10.1f}µs{incremental_single * 1e6:>10.1f}µs")
+
+
+if __name__ == '__main__':
+    main()
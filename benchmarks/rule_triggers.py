@@ -0,0 +1,97 @@
+"""提醒规则触发性能测试：每次价格推送逐条检查所有规则与按交易对有序阈值索引的对比
+
+在 200 个交易对上随机生成 N 条价格规则（阈值在当前价格 ±3%~30%，约 1/3 不指定方向），
+用随机游走生成 300 批全市场标记价格推送（约 5 分钟），统计每批推送的检查耗时（含触发后写入数据库），
+并校验两种方式触发的规则和时机一致。
+
+运行: python -m benchmarks.rule_triggers
+"""
+import os
+import random
+import sys
+import tempfile
+import timeit
+
+from alert_rules import AlertRuleEngine, AlertRuleStore
+
+SYMBOLS = 200
+RULE_COUNTS = (100, 1000, 5000, 20000)
+BATCHES = 300
+
+
+def make_rules(rng: random.Random, count: int, prices):
+    rules = []
+    market_ids = list(prices)
+    for _ in range(count):
+        market_id = rng.choice(market_ids)
+        # 高于当前价格的阈值等待上穿，低于的等待下穿，约 1/3 不指定方向
+        sign = rng.choice((-1, 1))
+        op = rng.choice(('>' if sign > 0 else '<', '>' if sign > 0 else '<', None))
+        rules.append((market_id, op, prices[market_id] * (1 + sign * rng.uniform(0.03, 0.3))))
+    return rules
+
+
+def make_batches(rng: random.Random, prices):
+    batches = []
+    for _ in range(BATCHES):
+        prices = {market_id: price * rng.uniform(0.998, 1.002) for market_id, price in prices.items()}
+        batches.append(prices)
+    return batches
+
+
+def scan(rules, batches):
+    """旧方式：每批推送逐条检查所有未触发的规则，返回 [(批次, 规则序号)]"""
+    active = [[market_id, op, value] for market_id, op, value in rules]
+    fired = []
+    for i, batch in enumerate(batches):
+        for index, rule in enumerate(active):
+            if rule is None:
+                continue
+            market_id, op, value = rule
+            price = batch.get(market_id)
+            if price is None:
+                continue
+            if op is None:
+                rule[1] = op = '>' if price < value else '<'
+            if (op == '>' and price >= value) or (op == '<' and price <= value):
+                fired.append((i, index))
+                active[index] = None
+    return fired
+
+
+def indexed(engine, batches, ids):
+    fired = []
+    for i, batch in enumerate(batches):
+        engine.notify = lambda alerts, i=i: fired.extend((i, ids[alert['rule'].id]) for alert in alerts)
+        engine.on_prices(batch)
+    return fired
+
+
+def main():
+    rng = random.Random(0)
+    prices = {f"COIN{i}USDT": rng.uniform(0.001, 1000) for i in range(SYMBOLS)}
+    batches = make_batches(rng, prices)
+    print(f"交易对: {SYMBOLS}  推送批次: {BATCHES}")
+    print(f"{'规则数':>8}{'已触发':>8}{'逐条检查/批':>14}{'索引/批':>12}")
+    for count in RULE_COUNTS:
+        rules = make_rules(rng, count, prices)
+        with tempfile.TemporaryDirectory() as tmp:
+            store = AlertRuleStore(os.path.join(tmp, 'rules.db'))
+            engine = AlertRuleEngine(store, lambda alerts: None)
+            ids = {engine.add('price', market_id, op, value).id: index for index, (market_id, op, value) in
+                   enumerate(rules)}
+
+            expected = scan(rules, batches)
+            start = timeit.default_timer()
+            actual = indexed(engine, batches, ids)
+            elapsed = timeit.default_timer() - start
+            store.close()
+        if sorted(expected) != sorted(actual):
+            print(f"{count} 条规则时两种方式触发结果不一致")
+            sys.exit(1)
+        legacy = timeit.timeit(lambda: scan(rules, batches), number=1)
+        print(f"{count:>8}{len(expected):>8}{legacy / BATCHES * 1e6:>12.1f}µs{elapsed / BATCHES * 1e6:>10.1f}µs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""多进程分片吞吐量测试：同样数量的账户分给 1、2、4 个工作进程时，每秒完成的仓位检查次数
+
+每个账户回放录制的 /fapi/v2/account 响应（600 个交易对，JSON 解码和持仓解析为主要开销），
+工作进程不断轮询分到的账户，检查结果经管道发送给主进程汇总（与正式运行的事件格式相同）。
+同时校验：
+- 每日报告请求（map_snapshots）能拿到所有账户的快照
+- 工作进程被强制结束后由 Supervisor.check 自动重启，并恢复上报
+
+吞吐量随进程数的提升受限于机器的 CPU 核心数。
+
+运行: python -m benchmarks.sharding
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+import ccxt
+
+from account_pool import AccountPool
+from benchmarks.account_payload import ReplayExchange, read_fixture
+from benchmarks.startup import exchange_info
+from binance_client import BinanceClient
+from price_cache import MarkPriceCache
+from scheduler import TaskScheduler
+from supervisor import ShardWorker, Supervisor
+
+ACCOUNTS = 8
+WORKER_COUNTS = (1, 2, 4)
+DURATION = 3.0
+
+
+def replay_worker(configs, sub_accounts, conn):
+    """测试用工作进程：账户回放录制的响应，后台线程不停轮询，主线程处理主进程的命令"""
+    payloads = {name: read_fixture(name) for name in ('account_v2.json', 'account_v3.json', 'position_risk_v3.json')}
+    market_ids = [p['symbol'] for p in json.loads(payloads['account_v2.json'])['positions']]
+    parser = ccxt.binance({'options': {'defaultType': 'future', 'fetchMarkets': {'types': ['linear']}}})
+    parser.fapiPublicGetExchangeInfo = lambda params={}: exchange_info([m[:-4] for m in market_ids])
+    parser.load_markets()
+
+    accounts = [BinanceClient({'name': config['name']}, exchange=ReplayExchange(payloads, parser.markets_by_id),
+                              price_cache=MarkPriceCache(), account_endpoint='v2') for config in configs]
+    pool = AccountPool(accounts, rate_limit=1e6, burst=1e6)
+    worker = ShardWorker(accounts, pool, TaskScheduler(handle_signals=False), conn)
+    worker.send('ready', [account.account_name for account in accounts])
+
+    def poll():
+        while True:
+            for account in accounts:
+                worker.check_account(account)
+
+    threading.Thread(target=poll, daemon=True).start()
+    worker.serve()
+
+
+def main():
+    counts = {}
+    lock = threading.Lock()
+
+    def on_update(account, changes, snapshot, positions):
+        if snapshot is None or len(snapshot['positions']) != 5:
+            print(f"{account.account_name} 快照不完整")
+            os._exit(1)
+        with lock:
+            counts[account.account_name] = counts.get(account.account_name, 0) + 1
+
+    configs = [{'name': f"账户{i}"} for i in range(ACCOUNTS)]
+    print(f"账户数量: {ACCOUNTS}  CPU 核心: {os.cpu_count()}  测量时长: {DURATION:g}秒")
+    print(f"{'工作进程':>8}{'检查次数/秒':>14}{'相对单进程':>12}")
+    baseline = None
+    for workers in WORKER_COUNTS:
+        counts.clear()
+        supervisor = Supervisor(configs, on_update, workers=workers, target=replay_worker, base_backoff=0.1)
+        supervisor.start()
+        # 等所有账户都上报过一次（工作进程启动和交易对加载不计入）
+        while len(counts) < ACCOUNTS:
+            time.sleep(0.05)
+        before = sum(counts.values())
+        time.sleep(DURATION)
+        rate = (sum(counts.values()) - before) / DURATION
+        baseline = baseline or rate
+        print(f"{workers:>8}{rate:>14.0f}{rate / baseline:>11.2f}x")
+
+        results = supervisor.map_snapshots(timeout=10)
+        failed = [account.account_name for account, snapshot, error in results if error is not None]
+        if len(results) != ACCOUNTS or failed:
+            print(f"获取快照失败: {failed}")
+            sys.exit(1)
+
+        if workers == WORKER_COUNTS[-1]:
+            # 强制结束一个工作进程，检查自动重启
+            process = supervisor._workers[0].process
+            process.kill()
+            process.join()
+            started = time.monotonic()
+            victim = supervisor.accounts[0].account_name
+            seen = counts[victim]
+            while counts[victim] == seen:
+                supervisor.check()
+                if time.monotonic() - started > 30:
+                    print("工作进程没有自动重启")
+                    sys.exit(1)
+                time.sleep(0.05)
+            print(f"工作进程被结束后 {time.monotonic() - started:.2f}秒恢复上报")
+        supervisor.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""启动耗时测试：从创建客户端到开始监控（调度器启动）所需时间
+
+使用真实的 ccxt.binance 实例解析交易对，但 exchangeInfo、账户等接口替换为本地数据并模拟网络延迟：
+- 旧流程：每个客户端各自 load_markets（现货/U本位/币本位 exchangeInfo + 币种信息），
+  启动前同步发送每日报告
+- 新流程：只加载 U 本位交易对并在客户端间共享、重启时读取磁盘缓存，
+  每日报告和仓位基线在后台并发执行
+
+运行: python -m benchmarks.startup
+"""
+import os
+import tempfile
+import threading
+import time
+
+import ccxt
+
+from account_pool import AccountPool
+from binance_client import BinanceClient
+from config import account_config
+from fakes import FakeFuturesExchange
+from market_cache import MarketCache
+
+ACCOUNTS = 4
+SYMBOLS = 600
+EXCHANGE_INFO_LATENCY = 0.4   # 下载一次 exchangeInfo（数 MB）的耗时
+CURRENCIES_LATENCY = 0.3      # 获取币种信息的耗时
+REQUEST_LATENCY = 0.1         # 普通接口往返耗时
+
+
+def exchange_info(bases):
+    """生成 U 本位合约 exchangeInfo"""
+    symbols = []
+    for base in bases:
+        symbols.append({
+            'symbol': f"{base}USDT", 'pair': f"{base}USDT", 'contractType': 'PERPETUAL',
+            'deliveryDate': 4133404800000, 'onboardDate': 1569398400000, 'status': 'TRADING',
+            'baseAsset': base, 'quoteAsset': 'USDT', 'marginAsset': 'USDT',
+            'pricePrecision': 2, 'quantityPrecision': 3, 'baseAssetPrecision': 8, 'quotePrecision': 8,
+            'underlyingType': 'COIN', 'triggerProtect': '0.0500', 'liquidationFee': '0.012500',
+            'filters': [
+                {'filterType': 'PRICE_FILTER', 'minPrice': '0.10', 'maxPrice': '4529764', 'tickSize': '0.10'},
+                {'filterType': 'LOT_SIZE', 'stepSize': '0.001', 'maxQty': '1000', 'minQty': '0.001'},
+                {'filterType': 'MARKET_LOT_SIZE', 'stepSize': '0.001', 'maxQty': '120', 'minQty': '0.001'},
+                {'filterType': 'MIN_NOTIONAL', 'notional': '100'},
+            ],
+            'orderTypes': ['LIMIT', 'MARKET', 'STOP', 'STOP_MARKET'],
+            'timeInForce': ['GTC', 'IOC', 'FOK', 'GTX'],
+        })
+    return {'timezone': 'UTC', 'serverTime': 0, 'rateLimits': [], 'exchangeFilters': [],
+            'assets': [], 'symbols': symbols}
+
+
+def delayed(result, latency):
+    def call(params={}):
+        time.sleep(latency)
+        return result
+    return call
+
+
+def make_exchange(config, info, fake):
+    """创建 ccxt.binance，并把用到的接口替换为本地数据"""
+    exchange = ccxt.binance(config)
+    exchange.fapiPublicGetExchangeInfo = delayed(info, EXCHANGE_INFO_LATENCY)
+    exchange.publicGetExchangeInfo = delayed({'symbols': []}, EXCHANGE_INFO_LATENCY)
+    exchange.dapiPublicGetExchangeInfo = delayed({'symbols': []}, EXCHANGE_INFO_LATENCY)
+    exchange.sapiGetMarginAllPairs = delayed([], REQUEST_LATENCY)
+    exchange.sapiGetMarginIsolatedAllPairs = delayed([], REQUEST_LATENCY)
+    exchange.fetch_currencies = delayed({}, CURRENCIES_LATENCY)
+    exchange.fapiPrivateV2GetAccount = lambda params={}: (time.sleep(REQUEST_LATENCY), fake.fapiPrivateV2GetAccount())[1]
+    return exchange
+
+
+def fake_exchange():
+    fake = FakeFuturesExchange()
+    for i in range(5):
+        fake.set_position(f"COIN{i}USDT", 1.0 + i, 10.0 + i)
+    return fake
+
+
+def legacy_startup(info):
+    """旧流程：默认交易对配置，各客户端分别加载，启动前同步发送报告"""
+    started = time.perf_counter()
+    accounts = []
+    for i in range(ACCOUNTS):
+        config = {'name': f"账户{i}", 'apiKey': 'key', 'secret': 'secret', 'enableRateLimit': False,
+                  'options': {'defaultType': 'future'}}
+        accounts.append(BinanceClient(config, exchange=make_exchange(
+            {k: v for k, v in config.items() if k != 'name'}, info, fake_exchange()
+        )))
+    pool = AccountPool(accounts, rate_limit=100, burst=100)
+    # 同步发送每日报告
+    pool.map(lambda account: account.get_snapshot())
+    live = time.perf_counter() - started
+    pool.shutdown()
+    # 旧流程的仓位基线在第一个监控间隔后才建立
+    return live, None
+
+
+def new_startup(info, cache_path):
+    """新流程：共享交易对缓存，报告和基线在后台执行"""
+    started = time.perf_counter()
+    market_cache = MarketCache(cache_path)
+    accounts = []
+    for i in range(ACCOUNTS):
+        config = account_config(f"账户{i}", 'key', 'secret')
+        config['enableRateLimit'] = False
+        exchange = make_exchange({k: v for k, v in config.items() if k != 'name'}, info, fake_exchange())
+        accounts.append(BinanceClient(config, exchange=exchange, market_cache=market_cache))
+    pool = AccountPool(accounts, rate_limit=100, burst=100)
+    baseline_done = threading.Event()
+
+    def baseline():
+        pool.map(lambda account: account.check_position_changes())
+        baseline_done.set()
+
+    threading.Thread(target=baseline, daemon=True).start()
+    threading.Thread(target=lambda: pool.map(lambda account: account.get_snapshot()), daemon=True).start()
+    live = time.perf_counter() - started
+    baseline_done.wait()
+    baseline = time.perf_counter() - started
+    pool.shutdown()
+    return live, baseline
+
+
+def main():
+    info = exchange_info([f"COIN{i}" for i in range(SYMBOLS)])
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, 'markets.json')
+        legacy = legacy_startup(info)
+        cold = new_startup(info, cache_path)
+        warm = new_startup(info, cache_path)
+
+    print(f"账户数量: {ACCOUNTS}  交易对数量: {SYMBOLS}")
+    print(f"{'':<16}{'开始监控':>10}{'仓位基线完成':>14}")
+    for name, (live, baseline) in (('旧流程', legacy), ('新流程(首次启动)', cold), ('新流程(重启)', warm)):
+        baseline_str = f"{baseline * 1000:.0f}ms" if baseline is not None else "一个间隔后"
+        print(f"{name:<16}{live * 1000:>8.0f}ms{baseline_str:>14}")
+
+
+if __name__ == '__main__':
+    main()
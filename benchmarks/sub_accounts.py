@@ -0,0 +1,88 @@
+"""子账户报告请求数测试：每个子账户单独配置 API Key 与母账户批量接口的对比
+
+模拟一个母账户和 N 个子账户（其中约 1/5 有持仓），统计生成一次每日报告（所有账户快照）需要的签名请求数，
+并校验两种方式得到的余额和持仓一致。
+
+运行: python -m benchmarks.sub_accounts
+"""
+import sys
+
+from account_pool import AccountPool
+from binance_client import BinanceClient, SubAccountAggregator, SubAccountExchange
+from fakes import FakeMasterExchange
+from price_cache import MarkPriceCache
+
+SUB_ACCOUNTS = (1, 5, 20, 50, 100)
+
+
+def make_master(count: int) -> FakeMasterExchange:
+    master = FakeMasterExchange()
+    master.set_position('BTCUSDT', 0.5, 60000.0, leverage=5)
+    for i in range(count):
+        sub = master.add_sub_account(f"sub{i}@example.com", wallet_balance=1000.0 + i)
+        if i % 5 == 0:
+            sub.set_position(f"COIN{i}USDT", 1.0 + i, 10.0 + i, leverage=10, unrealized_pnl=i * 0.5)
+    return master
+
+
+def snapshots(accounts):
+    pool = AccountPool(accounts, rate_limit=10000, burst=10000)
+    results = {}
+    for account, snapshot, error in pool.map(lambda account: account.get_snapshot()):
+        if error is not None:
+            raise error
+        results[account.account_name] = snapshot
+    pool.shutdown()
+    return results
+
+
+def comparable(snapshot):
+    positions = sorted(
+        (p['symbol'], p['side'], p['contracts'], p['entryPrice'], round(p['margin'], 8), p['unrealizedPnl'])
+        for p in snapshot['positions']
+    )
+    return snapshot['balance'], positions
+
+
+def per_key_report(master: FakeMasterExchange):
+    """每个子账户单独的 API Key 和客户端"""
+    price_cache = MarkPriceCache()
+    accounts = [BinanceClient({'name': '母账户'}, exchange=master, price_cache=price_cache)]
+    for email, sub in master.sub_accounts.items():
+        accounts.append(BinanceClient({'name': email}, exchange=sub, price_cache=price_cache))
+    before = len(master.calls) + sum(len(sub.calls) for sub in master.sub_accounts.values())
+    results = snapshots(accounts)
+    after = len(master.calls) + sum(len(sub.calls) for sub in master.sub_accounts.values())
+    return results, after - before
+
+
+def master_report(master: FakeMasterExchange):
+    """母账户批量接口"""
+    price_cache = MarkPriceCache()
+    aggregator = SubAccountAggregator(master)
+    before = len(master.calls)
+    # 子账户列表与各子账户余额来自同一次批量请求（ttl 内复用）
+    accounts = [BinanceClient({'name': '母账户'}, exchange=master, price_cache=price_cache)]
+    for email in aggregator.emails():
+        accounts.append(BinanceClient({'name': email}, exchange=SubAccountExchange(aggregator, email),
+                                      price_cache=price_cache))
+    results = snapshots(accounts)
+    return results, len(master.calls) - before
+
+
+def main():
+    print(f"{'子账户数':>8}{'有持仓':>8}{'单独 API Key':>14}{'母账户批量':>12}")
+    for count in SUB_ACCOUNTS:
+        master = make_master(count)
+        legacy, legacy_calls = per_key_report(master)
+        batched, batched_calls = master_report(master)
+        for name, snapshot in legacy.items():
+            if comparable(snapshot) != comparable(batched[name]):
+                print(f"{name} 两种方式的快照不一致")
+                sys.exit(1)
+        holding = sum(1 for sub in master.sub_accounts.values() if sub.positions)
+        print(f"{count:>8}{holding:>8}{legacy_calls:>14}{batched_calls:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""平仓成交历史同步测试：每次平仓重新下载最近 7 天历史与按游标增量同步的对比
+
+模拟一个账户 10 个交易对、30 天的开平仓记录（每个交易对约每 2 小时一轮，每 8 小时一次资金费），
+之后每次平仓分别：
+- 重新下载：按交易对请求最近 7 天成交和全部资金费，再计算平仓结果
+- 增量同步：TradeHistory 按 fromId / startTime 游标只获取新记录（游标和数据保存在 SQLite）
+
+统计每次平仓的请求数和下载条数，并校验两种方式算出的结果一致。
+
+运行: python -m benchmarks.trade_sync
+"""
+import os
+import random
+import sys
+import tempfile
+
+from fakes import FakeFuturesExchange
+from trade_history import TradeHistory, TradeHistoryStore
+
+SYMBOLS = [f"COIN{i}USDT" for i in range(10)]
+HISTORY_DAYS = 30
+CLOSES = 50
+WEEK_MS = 7 * 86400 * 1000
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingExchange:
+    """统计请求数和返回的记录数"""
+
+    def __init__(self, exchange: FakeFuturesExchange):
+        self.exchange = exchange
+        self.requests = 0
+        self.rows = 0
+
+    def _count(self, rows):
+        self.requests += 1
+        self.rows += len(rows)
+        return rows
+
+    def fapiPrivateGetUserTrades(self, params={}):
+        return self._count(self.exchange.fapiPrivateGetUserTrades(params))
+
+    def fapiPrivateGetIncome(self, params={}):
+        return self._count(self.exchange.fapiPrivateGetIncome(params))
+
+
+def round_trip(exchange: FakeFuturesExchange, clock: Clock, rng: random.Random, symbol: str):
+    """开仓、可能加仓、平仓，返回开仓时间（毫秒）"""
+    side = rng.choice((1, -1))
+    price = rng.uniform(10, 1000)
+    opened_at = exchange.milliseconds()
+    exchange.set_position(symbol, side * 1.0, price)
+    clock.now += rng.uniform(60, 3600)
+    if rng.random() < 0.5:
+        exchange.set_position(symbol, side * 2.0, price, fill_price=price * rng.uniform(0.98, 1.02))
+        clock.now += rng.uniform(60, 3600)
+    exchange.set_position(symbol, 0, 0, fill_price=price * rng.uniform(0.95, 1.05))
+    return opened_at
+
+
+def main():
+    rng = random.Random(0)
+    clock = Clock(1_700_000_000.0)
+    fake = FakeFuturesExchange(clock=clock)
+
+    # 30 天历史
+    end = clock.now + HISTORY_DAYS * 86400
+    next_funding = clock.now + 8 * 3600
+    while clock.now < end:
+        for symbol in SYMBOLS:
+            round_trip(fake, clock, rng, symbol)
+        while clock.now >= next_funding:
+            for symbol in SYMBOLS:
+                fake.add_funding(symbol, rng.uniform(-1, 1))
+            next_funding += 8 * 3600
+        clock.now += rng.uniform(600, 3600)
+
+    counting = CountingExchange(fake)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TradeHistoryStore(os.path.join(tmp, 'state.db'))
+        incremental = TradeHistory(counting, '账户', store)
+        stats = {'重新下载': [0, 0], '增量同步': [0, 0]}
+        for i in range(CLOSES):
+            symbol = rng.choice(SYMBOLS)
+            side = 'long' if rng.random() < 0.5 else 'short'
+            fake.set_position(symbol, 1.0 if side == 'long' else -1.0, 100.0)
+            opened_at = fake.milliseconds()
+            clock.now += 1800
+            fake.add_funding(symbol, -0.1)
+            clock.now += 60
+            fake.set_position(symbol, 0, 0, fill_price=101.0)
+            now = fake.milliseconds()
+
+            # 重新下载：每次都从空库开始，拉取最近 7 天的成交和资金费
+            counting.requests = counting.rows = 0
+            legacy = TradeHistory(counting, '账户', TradeHistoryStore(':memory:'), lookback=0)
+            legacy.sync_trades(symbol, now - WEEK_MS + 1, now)
+            legacy.sync_income(now - WEEK_MS + 1, now)
+            stats['重新下载'][0] += counting.requests
+            stats['重新下载'][1] += counting.rows
+            expected = legacy.close_summary(symbol, side, now - WEEK_MS + 1, now)
+
+            counting.requests = counting.rows = 0
+            actual = incremental.close_summary(symbol, side, opened_at, now)
+            if i > 0:  # 第一次平仓的首次同步不计入
+                stats['增量同步'][0] += counting.requests
+                stats['增量同步'][1] += counting.rows
+            if expected is None or actual is None or any(
+                abs(expected[key] - actual[key]) > 1e-6 for key in ('close_price', 'realized_pnl', 'fee', 'funding')
+            ):
+                print(f"第 {i} 次平仓结果不一致: {expected} {actual}")
+                sys.exit(1)
+            clock.now += 600
+        store.close()
+
+    print(f"历史: {len(fake.trades)} 笔成交, {len(fake.income)} 条资金费  平仓次数: {CLOSES}")
+    print(f"{'':<10}{'请求/次':>10}{'下载条数/次':>12}")
+    for name, (requests, rows) in stats.items():
+        count = CLOSES if name == '重新下载' else CLOSES - 1
+        print(f"{name:<10}{requests / count:>10.1f}{rows / count:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
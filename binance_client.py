@@ -1,114 +1,566 @@
 import ccxt
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional, Tuple
 from datetime import datetime
+import threading
+import time
 import pytz
 import logging
 
+from market_cache import MarketCache
+from metrics import instrument_exchange
+from position_index import PositionIndex, PositionRecord
+from price_cache import MarkPriceCache, mark_prices
+from state_store import PositionStateStore
+from trade_history import TradeHistory, TradeHistoryStore
+
 logger = logging.getLogger(__name__)
 
+# 美国东部时区
+EASTERN = pytz.timezone('America/New_York')
+
 class BinanceClient:
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, exchange=None, price_cache: Optional[MarkPriceCache] = None,
+                 state_store: Optional[PositionStateStore] = None,
+                 position_index: Optional[PositionIndex] = None,
+                 market_cache: Optional[MarketCache] = None,
+                 account_endpoint: str = 'v2', watchlist: Optional[Iterable[str]] = None,
+                 trade_store: Optional[TradeHistoryStore] = None, trade_lookback: float = 600):
         self.account_name = config.pop('name')  # 获取并移除name字段
-        self.exchange = ccxt.binance(config)
-        self._last_positions = {}
+        # 允许注入交易所实例（例如本地模拟交易所），默认使用 ccxt
+        self.exchange = exchange if exchange is not None else ccxt.binance(config)
+        # 按接口统计耗时、失败次数和请求权重
+        instrument_exchange(self.exchange, self.account_name)
+        # 交易对信息在首次请求时才加载，多个客户端可共享同一个缓存
+        self.market_cache = market_cache
+        self._market_generation = None
+        # 默认使用进程内共享的标记价格缓存
+        self.price_cache = price_cache if price_cache is not None else mark_prices
+        # 仓位簿，键为 (交易对, 方向)；多个账户可共享同一个索引以便按币种反查
+        self.position_index = position_index if position_index is not None else PositionIndex()
         self._position_open_times = {}
+        # 仓位簿会被轮询线程和推送线程同时更新
+        self._lock = threading.RLock()
+        # 账户接口版本：v2 返回所有交易对（大部分为空仓），v3 只返回有持仓或挂单的交易对
+        self.account_endpoint = account_endpoint.lower()
+        # 只关注的交易所原始交易对（如 BTCUSDT），None 表示全部
+        self.watchlist = set(watchlist) if watchlist else None
+        self._leverages = {}  # market_id -> 杠杆倍数
+        # v3 账户接口不含开仓均价：按 (market_id, positionSide) 缓存 (updateTime, 数量, 开仓均价)
+        self._entry_prices = {}
+        self._last_fill_prices = {}  # (交易对, 方向) -> 最近一次减仓成交价
+        # 双向持仓模式：出现过 LONG/SHORT 仓位行后为真，推送中的 BOTH 行不再代表任何方向
+        self._hedge_mode = False
+        # 最近一次账户快照及其获取时间（monotonic）
+        self._snapshot = None
+        self._snapshot_time = 0.0
 
-    def get_account_balance(self) -> Dict:
-        """获取账户总资产和盈亏信息"""
+        # 成交和资金费增量同步：平仓时据此给出实际成交均价、手续费、资金费和已实现盈亏
+        self.trade_history = TradeHistory(self.exchange, self.account_name, trade_store, trade_lookback) \
+            if trade_store is not None else None
+
+        # 从持久化存储恢复上次的持仓和开仓时间，重启后首次比较即可识别停机期间的变化
+        self.state_store = state_store
+        if state_store is not None:
+            restored = {}
+            for key, (position, open_time) in state_store.load(self.account_name).items():
+                restored[key] = PositionRecord(
+                    position['contracts'], position['entryPrice'], position['margin'], position
+                )
+                if open_time:
+                    self._position_open_times[key] = open_time
+            self.position_index.update(self.account_name, restored)
+
+    def get_snapshot(self, max_age: Optional[float] = None) -> Dict:
+        """通过一次账户接口请求同时获取余额和持仓
+
+        指定 max_age 时，若最近一次快照未超过 max_age 秒则直接返回缓存。
+        """
+        if max_age is not None and self._snapshot is not None \
+                and time.monotonic() - self._snapshot_time <= max_age:
+            return self._snapshot
         try:
-            # 获取账户总资产、可用余额和占用保证金
-            balance = self.exchange.fetch_balance()
-            total_balance = balance['total']['USDT']
-            free_balance = balance['free']['USDT']
-            used_balance = balance['used']['USDT']
-
-            # 获取总未实现盈亏
-            account_info = self.exchange.fapiPrivateV2GetAccount()
-            total_unrealized_pnl = float(account_info['totalUnrealizedProfit'])
-
-            return {
-                'account_name': self.account_name,
-                'total_balance': total_balance,
-                'free_balance': free_balance,
-                'used_balance': used_balance,
-                'total_unrealized_pnl': total_unrealized_pnl
+            # 确保交易对信息已加载（用于将 BTCUSDT 转换为 BTC/USDT:USDT）
+            self._ensure_markets()
+            if self.account_endpoint == 'v3':
+                account_info = self.exchange.fapiPrivateV3GetAccount()
+                positions = self._parse_positions_v3(account_info)
+            else:
+                account_info = self.exchange.fapiPrivateV2GetAccount()
+                positions = self._parse_positions(account_info)
+            snapshot = {
+                'balance': self._parse_balance(account_info),
+                'positions': positions,
+                'timestamp': self.exchange.milliseconds()
             }
+            self._snapshot = snapshot
+            self._snapshot_time = time.monotonic()
+            return snapshot
         except Exception as e:
-            raise Exception(f"{self.account_name} 获取账户余额失败: {str(e)}")
+            raise Exception(f"{self.account_name} 获取账户快照失败: {str(e)}")
+
+    @property
+    def last_snapshot(self) -> Optional[Dict]:
+        """最近一次获取的账户快照"""
+        return self._snapshot
+
+    def get_account_balance(self) -> Dict:
+        """获取账户总资产和盈亏信息"""
+        return self.get_snapshot()['balance']
 
     def get_positions(self) -> List[Dict]:
         """获取当前持仓信息"""
+        return self.get_snapshot()['positions']
+
+    def _parse_balance(self, account_info: Dict) -> Dict:
+        """从账户接口返回中解析 USDT 资产（与 ccxt fetch_balance 口径一致）"""
+        usdt = next((a for a in account_info.get('assets', []) if a['asset'] == 'USDT'), None)
+        if usdt is not None:
+            total_balance = float(usdt['marginBalance'])
+            free_balance = float(usdt['availableBalance'])
+            used_balance = float(usdt['initialMargin'])
+            wallet_balance = float(usdt.get('walletBalance') or 0)
+            maint_margin = float(usdt.get('maintMargin') or 0)
+        else:
+            total_balance = float(account_info['totalMarginBalance'])
+            free_balance = float(account_info['availableBalance'])
+            used_balance = float(account_info['totalInitialMargin'])
+            wallet_balance = float(account_info.get('totalWalletBalance') or 0)
+            maint_margin = float(account_info.get('totalMaintMargin') or 0)
+
+        return {
+            'account_name': self.account_name,
+            'total_balance': total_balance,
+            'free_balance': free_balance,
+            'used_balance': used_balance,
+            'total_unrealized_pnl': float(account_info['totalUnrealizedProfit']),
+            # 风险计算用：钱包余额（不含未实现盈亏）和维持保证金
+            'wallet_balance': wallet_balance,
+            'maint_margin': maint_margin
+        }
+
+    @staticmethod
+    def _is_zero(amount: str) -> bool:
+        """不做浮点转换判断数量字符串是否为 0（如 "0"、"0.000"、"-0.0"）"""
+        return not amount.strip('-0.')
+
+    def _parse_positions(self, account_info: Dict) -> List[Dict]:
+        """从 v2 账户接口返回中解析持仓（空仓行只记录杠杆，不做其他解析）"""
+        active_positions = []
+        # 同一次快照内所有持仓共用一个时间戳
+        now = self._now()
+        watchlist = self.watchlist
+        leverages = self._leverages
+
+        for position in account_info.get('positions', []):
+            market_id = position['symbol']
+            if watchlist is not None and market_id not in watchlist:
+                continue
+            # 记录杠杆倍数（原始字符串，使用时再转换），推送模式下据此估算保证金
+            if position.get('leverage'):
+                leverages[market_id] = position['leverage']
+            if position.get('positionSide', 'BOTH') != 'BOTH':
+                self._hedge_mode = True
+            if self._is_zero(position['positionAmt']):
+                continue
+
+            symbol = self._symbol_from_id(market_id)
+            amount = float(position['positionAmt'])
+            position_side = position.get('positionSide', 'BOTH')
+            if position_side == 'BOTH':
+                side = 'long' if amount > 0 else 'short'
+            else:
+                side = position_side.lower()
+
+            margin = float(position['initialMargin'])
+            unrealized_pnl = float(position['unrealizedProfit'])
+            active_positions.append(self._build_position(
+                symbol,
+                side,
+                abs(amount),
+                float(position['entryPrice']),
+                margin,
+                unrealized_pnl,
+                unrealized_pnl / margin * 100 if margin else 0.0,
+                now,
+                maint_margin=float(position['maintMargin']) if position.get('maintMargin') else None,
+                isolated_wallet=float(position.get('isolatedWallet') or 0) if position.get('isolated') else 0.0
+            ))
+        return active_positions
+
+    def _parse_positions_v3(self, account_info: Dict) -> List[Dict]:
+        """从 v3 账户接口返回中解析持仓
+
+        v3 只返回有持仓或挂单的交易对，但不含开仓均价和杠杆：
+        开仓均价只在成交时变化（同时更新 updateTime），因此按 updateTime 缓存，
+        只有新出现或发生变化的持仓才额外请求一次 positionRisk。
+        """
+        rows = []
+        stale = set()
+        watchlist = self.watchlist
+        for position in account_info.get('positions', []):
+            market_id = position['symbol']
+            if (watchlist is not None and market_id not in watchlist) or self._is_zero(position['positionAmt']):
+                continue
+            key = (market_id, position.get('positionSide', 'BOTH'))
+            if key[1] != 'BOTH':
+                self._hedge_mode = True
+            cached = self._entry_prices.get(key)
+            if cached is None or cached[0] != position['updateTime'] or cached[1] != position['positionAmt']:
+                stale.add(market_id)
+            rows.append((key, position))
+
+        if stale:
+            self._refresh_entry_prices(stale)
+        # 已平仓的交易对不再缓存开仓均价
+        self._entry_prices = {key: self._entry_prices[key] for key, _ in rows if key in self._entry_prices}
+
+        active_positions = []
+        now = self._now()
+        for (market_id, position_side), position in rows:
+            cached = self._entry_prices.get((market_id, position_side))
+            if cached is None:
+                continue
+            amount = float(position['positionAmt'])
+            if position_side == 'BOTH':
+                side = 'long' if amount > 0 else 'short'
+            else:
+                side = position_side.lower()
+            margin = float(position['initialMargin'])
+            unrealized_pnl = float(position['unrealizedProfit'])
+            # v3 不返回杠杆，按名义价值/保证金估算，供推送模式估算保证金
+            if margin:
+                self._leverages[market_id] = round(abs(float(position['notional'])) / margin)
+            active_positions.append(self._build_position(
+                self._symbol_from_id(market_id),
+                side,
+                abs(amount),
+                cached[2],
+                margin,
+                unrealized_pnl,
+                unrealized_pnl / margin * 100 if margin else 0.0,
+                now,
+                maint_margin=float(position['maintMargin']) if position.get('maintMargin') else None,
+                isolated_wallet=float(position.get('isolatedWallet') or 0)
+            ))
+        return active_positions
+
+    def _refresh_entry_prices(self, market_ids: set):
+        """通过 v3 positionRisk 获取开仓均价：少量交易对逐个查询，否则一次获取全部持仓"""
+        if len(market_ids) <= 2:
+            rows = []
+            for market_id in market_ids:
+                rows.extend(self.exchange.fapiPrivateV3GetPositionRisk({'symbol': market_id}))
+        else:
+            rows = self.exchange.fapiPrivateV3GetPositionRisk()
+        for row in rows:
+            if self._is_zero(row['positionAmt']):
+                continue
+            self._entry_prices[(row['symbol'], row.get('positionSide', 'BOTH'))] = (
+                row['updateTime'], row['positionAmt'], float(row['entryPrice'])
+            )
+
+    def _now(self) -> Tuple[int, str]:
+        """返回当前毫秒时间戳和对应的美东时间字符串"""
+        timestamp = self.exchange.milliseconds()
+        # 转换为美国东部时间
+        utc_dt = datetime.fromtimestamp(timestamp/1000, pytz.UTC)
+        eastern_dt = utc_dt.astimezone(EASTERN)
+        return timestamp, eastern_dt.strftime('%Y-%m-%d %H:%M:%S')
+
+    def _build_position(self, symbol: str, side: str, contracts, entry_price,
+                        margin, unrealized_pnl, percentage,
+                        now: Optional[Tuple[int, str]] = None,
+                        maint_margin: Optional[float] = None, isolated_wallet: float = 0.0) -> Dict:
+        """构造统一格式的持仓记录（维持保证金未知时为 None，全仓持仓的逐仓钱包余额为 0）"""
+        timestamp, datetime_str = now or self._now()
+        return {
+            'account_name': self.account_name,
+            'symbol': symbol,
+            # 提取基础货币名称（例如从"BTC/USDT:USDT"提取"BTC"）
+            'base_currency': symbol.split('/')[0],
+            'side': side,
+            'contracts': contracts,
+            'entryPrice': entry_price,
+            'margin': margin,
+            'unrealizedPnl': unrealized_pnl,
+            'percentage': percentage,
+            'maintMargin': maint_margin,
+            'isolatedWallet': isolated_wallet,
+            'timestamp': timestamp,
+            'datetime': datetime_str
+        }
+
+    def check_position_changes(self) -> Dict:
+        """检查仓位变化（REST 轮询，推送模式下用于定期校准）"""
+        current_positions = self._index_positions(self.get_snapshot()['positions'])
+        with self._lock:
+            changes = self._diff_positions(current_positions)
+        self.resolve_close_prices(changes['closed_positions'])
+        return changes
+
+    def resolve_close_prices(self, closed_positions: List[Dict]):
+        """为平仓记录补充价格
+
+        开启成交历史时使用实际成交均价并补充已实现盈亏、手续费和资金费；
+        仍缺少价格的优先读标记价格缓存，缺失的一次请求批量获取。
+        """
+        if self.trade_history is not None:
+            for position in closed_positions:
+                self._resolve_from_trades(position)
+        pending = [p for p in closed_positions if p.get('close_price') is None]
+        if not pending:
+            return
         try:
-            positions = self.exchange.fetch_positions()
-            active_positions = []
-            
-            # 设置美国东部时区
-            eastern = pytz.timezone('America/New_York')
-            
-            for position in positions:
-                if float(position['contracts']) > 0:
-                    # 提取基础货币名称（例如从"BTC/USDT:USDT"提取"BTC"）
-                    base_currency = position['symbol'].split('/')[0]
-                    
-                    timestamp = self.exchange.milliseconds()
-                    # 转换为美国东部时间
-                    utc_dt = datetime.fromtimestamp(timestamp/1000, pytz.UTC)
-                    eastern_dt = utc_dt.astimezone(eastern)
-                    datetime_str = eastern_dt.strftime('%Y-%m-%d %H:%M:%S')
-                    
-                    position_data = {
-                        'account_name': self.account_name,
-                        'symbol': position['symbol'],
-                        'base_currency': base_currency,  # 添加基础货币字段
-                        'side': position['side'],
-                        'contracts': position['contracts'],
-                        'entryPrice': position['entryPrice'],
-                        'margin': position['initialMargin'],
-                        'unrealizedPnl': position['unrealizedPnl'],
-                        'percentage': position['percentage'],
-                        'timestamp': timestamp,
-                        'datetime': datetime_str
-                    }
-                    active_positions.append(position_data)
-            return active_positions
+            prices = self.get_mark_prices({p['symbol'] for p in pending})
         except Exception as e:
-            raise Exception(f"{self.account_name} 获取持仓信息失败: {str(e)}")
+            logger.error(f"{self.account_name} 获取平仓价格失败: {e}")
+            return
+        for position in pending:
+            price = prices.get(position['symbol'])
+            if price is not None:
+                position['close_price'] = price
 
-    def check_position_changes(self) -> Dict:
-        """检查仓位变化"""
-        current_positions = {
-            p['symbol']: p for p in self.get_positions()
+    def _resolve_from_trades(self, position: Dict):
+        """用同步到的成交和资金费计算平仓结果，成交尚不可查时保持原样"""
+        opened_at = None
+        if position.get('open_time'):
+            opened_at = int(EASTERN.localize(
+                datetime.strptime(position['open_time'], '%Y-%m-%d %H:%M:%S')
+            ).timestamp() * 1000)
+        try:
+            summary = self.trade_history.close_summary(
+                self._market_id(position['symbol']), position['side'], opened_at, self.exchange.milliseconds()
+            )
+        except Exception as e:
+            logger.error(f"{self.account_name} 同步成交历史失败: {e}")
+            return
+        if summary is None:
+            return
+        if summary['close_price'] is not None:
+            position['close_price'] = summary['close_price']
+        for key in ('realized_pnl', 'fee', 'other_fees', 'funding', 'funding_shared', 'net_pnl'):
+            position[key] = summary[key]
+        position['trades_complete'] = summary['complete']
+
+    def get_mark_prices(self, symbols) -> Dict[str, float]:
+        """获取标记价格：优先读共享缓存，缺失或过期的交易对通过 REST 一次补齐"""
+        ids = {self._market_id(symbol): symbol for symbol in symbols}
+        prices = self.price_cache.get_many(ids, fetcher=self._fetch_mark_prices)
+        return {ids[market_id]: price for market_id, price in prices.items()}
+
+    def _fetch_mark_prices(self, market_ids) -> Dict[str, float]:
+        """通过 REST 获取标记价格，单个交易对按交易对查询，多个则一次获取全部"""
+        market_ids = list(market_ids)
+        if len(market_ids) == 1:
+            response = [self.exchange.fapiPublicGetPremiumIndex({'symbol': market_ids[0]})]
+        else:
+            response = self.exchange.fapiPublicGetPremiumIndex()
+        return {item['symbol']: float(item['markPrice']) for item in response}
+
+    @staticmethod
+    def _index_positions(positions: List[Dict]) -> Dict[Tuple[str, str], PositionRecord]:
+        """将持仓列表转换为以 (交易对, 方向) 为键的紧凑记录"""
+        return {
+            (p['symbol'], p['side']): PositionRecord(
+                p['contracts'], p['entryPrice'], p['margin'], p
+            )
+            for p in positions
         }
-        
+
+    def _diff_positions(self, current_positions: Dict[Tuple[str, str], PositionRecord],
+                        removals: Optional[List[Tuple[str, str]]] = None) -> Dict:
+        """更新仓位簿并返回变化
+
+        removals 为 None 时 current_positions 视为完整快照（轮询），
+        否则只更新 current_positions 和 removals 涉及的键（推送）。
+        """
+        if removals is None:
+            opened, modified, closed = self.position_index.sync(self.account_name, current_positions)
+        else:
+            opened, modified, closed = self.position_index.update(self.account_name, current_positions, removals)
+
         changes = {
             'new_positions': [],
             'closed_positions': [],
             'modified_positions': []
         }
+        for key, record in opened:
+            changes['new_positions'].append(record.data)
+            # 记录开仓时间，丢弃该方向上残留的旧成交价
+            self._position_open_times[key] = record.data['datetime']
+            self._last_fill_prices.pop(key, None)
+        for key, old, record in modified:
+            changes['modified_positions'].append({
+                'old': old.data,
+                'new': record.data
+            })
+        for key, record in closed:
+            position = record.data
+            # 添加开仓时间到平仓信息中
+            position['open_time'] = self._position_open_times.pop(key, None)
+            # 推送模式下记录了实际成交价，优先作为平仓价格
+            close_price = self._last_fill_prices.pop(key, None)
+            if close_price is not None:
+                position['close_price'] = close_price
+            changes['closed_positions'].append(position)
+
+        if self.state_store is not None:
+            try:
+                self.state_store.apply(self.account_name, changes, self._position_open_times)
+            except Exception as e:
+                logger.error(f"{self.account_name} 保存持仓状态失败: {e}")
+        # 标记价格缓存只跟踪当前持有的交易对
+        self.price_cache.track(
+            self.account_name, {self._market_id(symbol) for symbol, _ in self.position_index.keys(self.account_name)}
+        )
+        return changes
+
+    def used_weight(self) -> Optional[int]:
+        """最近一次响应头中的 X-MBX-USED-WEIGHT-1M（按 IP 统计的每分钟已用权重）"""
+        headers = getattr(self.exchange, 'last_response_headers', None) or {}
+        value = headers.get('X-MBX-USED-WEIGHT-1M') or headers.get('x-mbx-used-weight-1m')
+        return int(value) if value is not None else None
+
+    @property
+    def supports_user_stream(self) -> bool:
+        """没有独立 API Key 的账户（如母账户批量接口提供的子账户）不能申请 listenKey"""
+        return getattr(self.exchange, 'supports_user_stream', True)
+
+    def create_listen_key(self) -> str:
+        """申请合约用户数据流 listenKey"""
+        return self.exchange.fapiPrivatePostListenKey()['listenKey']
+
+    def keepalive_listen_key(self):
+        """延长 listenKey 有效期（需每 60 分钟内调用一次）"""
+        self.exchange.fapiPrivatePutListenKey()
+
+    def apply_user_data_event(self, event: Dict) -> Optional[Dict]:
+        """将用户数据流推送事件应用到仓位簿，仓位有变化时返回与轮询相同格式的变化"""
+        event_type = event.get('e')
+
+        if event_type == 'ORDER_TRADE_UPDATE':
+            # 记录最近一次成交价，平仓时作为平仓价格
+            order = event['o']
+            if order.get('x') == 'TRADE' and float(order.get('L', 0)) > 0:
+                position_side = order.get('ps', 'BOTH')
+                if position_side == 'BOTH':
+                    # 单向持仓模式：卖出减少多头，买入减少空头
+                    side = 'long' if order.get('S') == 'SELL' else 'short'
+                else:
+                    side = position_side.lower()
+                with self._lock:
+                    self._last_fill_prices[(self._symbol_from_id(order['s']), side)] = float(order['L'])
+            return None
+
+        if event_type == 'ACCOUNT_CONFIG_UPDATE':
+            # 杠杆倍数调整
+            config = event.get('ac')
+            if config:
+                self._leverages[config['s']] = config['l']
+            return None
+
+        if event_type != 'ACCOUNT_UPDATE':
+            return None
+
+        with self._lock:
+            # 只更新推送涉及的 (交易对, 方向)，其余持仓保持不变
+            items = event['a'].get('P', [])
+            # 双向持仓模式的推送同时带有 LONG/SHORT 行和数量恒为 0 的 BOTH 行
+            if any(item.get('ps', 'BOTH') != 'BOTH' for item in items):
+                self._hedge_mode = True
+            upserts = {}
+            removals = []
+            for item in items:
+                symbol = self._symbol_from_id(item['s'])
+                amount = float(item['pa'])
+                position_side = item.get('ps', 'BOTH')
+                if position_side != 'BOTH':
+                    side = position_side.lower()
+                    previous = self.position_index.get(self.account_name, symbol, side)
+                    if amount == 0:
+                        removals.append((symbol, side))
+                        continue
+                elif self._hedge_mode:
+                    # BOTH 行不对应双向持仓的任何一边，不能据此平掉多头或空头
+                    continue
+                else:
+                    # 单向持仓模式：每个交易对最多一个方向，方向翻转或平仓时移除已记录的方向
+                    side = ('long' if amount > 0 else 'short') if amount else None
+                    previous = None
+                    for stored_side in ('long', 'short'):
+                        record = self.position_index.get(self.account_name, symbol, stored_side)
+                        if record is not None:
+                            previous = record
+                            if stored_side != side:
+                                removals.append((symbol, stored_side))
+                    if side is None:
+                        continue
+                position = self._position_from_stream(symbol, side, item, amount, previous)
+                upserts[(symbol, side)] = PositionRecord(
+                    position['contracts'], position['entryPrice'], position['margin'], position
+                )
+            changes = self._diff_positions(upserts, removals)
+            # 推送改变了持仓，缓存的快照已不再准确
+            self._snapshot = None
+        self.resolve_close_prices(changes['closed_positions'])
+        return changes
+
+    def _position_from_stream(self, symbol: str, side: str, item: Dict, amount: float,
+                              previous: Optional[PositionRecord] = None) -> Dict:
+        """将 ACCOUNT_UPDATE 中的单条仓位转换为持仓记录"""
+        contracts = abs(amount)
+        entry_price = float(item['ep'])
+        unrealized_pnl = float(item['up'])
+
+        # 逐仓直接使用逐仓保证金，全仓按名义价值/杠杆估算
+        isolated_wallet = float(item.get('iw', 0)) if item.get('mt') == 'isolated' else 0.0
+        if isolated_wallet > 0:
+            margin = isolated_wallet
+        else:
+            leverage = self._leverages.get(item['s'])
+            if not leverage or not float(leverage):
+                margin = previous.margin if previous else contracts * entry_price
+            else:
+                margin = contracts * entry_price / float(leverage)
+        percentage = unrealized_pnl / margin * 100 if margin else 0.0
 
-        # 检查新开仓和仓位修改
-        for symbol, position in current_positions.items():
-            if symbol not in self._last_positions:
-                changes['new_positions'].append(position)
-                # 记录开仓时间
-                self._position_open_times[symbol] = position['datetime']
-            elif position != self._last_positions[symbol]:
-                changes['modified_positions'].append({
-                    'old': self._last_positions[symbol],
-                    'new': position
-                })
-
-        # 检查平仓
-        for symbol, position in self._last_positions.items():
-            if symbol not in current_positions:
-                # 添加开仓时间到平仓信息中
-                position['open_time'] = self._position_open_times.get(symbol)
-                changes['closed_positions'].append(position)
-                # 清除开仓时间记录
-                self._position_open_times.pop(symbol, None)
-
-        self._last_positions = current_positions
-        return changes 
+        return self._build_position(
+            symbol,
+            side,
+            contracts,
+            entry_price,
+            margin,
+            unrealized_pnl,
+            percentage,
+            isolated_wallet=isolated_wallet
+        )
+
+    def _ensure_markets(self):
+        """加载交易对信息：有共享缓存时从缓存获取，否则由 ccxt 自行加载"""
+        if self.market_cache is not None:
+            self._market_generation = self.market_cache.apply(self.exchange, self._market_generation)
+        else:
+            self.exchange.load_markets()
+
+    def _market_id(self, symbol: str) -> str:
+        """将统一格式交易对（如 BTC/USDT:USDT）转换为交易所原始交易对（如 BTCUSDT）"""
+        markets = getattr(self.exchange, 'markets', None) or {}
+        if symbol in markets:
+            return markets[symbol]['id']
+        return symbol.split(':')[0].replace('/', '')
+
+    def _symbol_from_id(self, market_id: str) -> str:
+        """将交易所原始交易对（如 BTCUSDT）转换为统一格式（如 BTC/USDT:USDT）"""
+        markets_by_id = getattr(self.exchange, 'markets_by_id', None) or {}
+        markets = markets_by_id.get(market_id)
+        if markets:
+            for market in markets:
+                if market.get('swap'):
+                    return market['symbol']
+        for quote in ('USDT', 'USDC'):
+            if market_id.endswith(quote):
+                return f"{market_id[:-len(quote)]}/{quote}:{quote}"
+        return market_id
 
     async def get_account_overview(self) -> str:
         """Get account overview including main and sub-accounts"""
@@ -143,4 +595,114 @@ class BinanceClient:
             return message
         except Exception as e:
             logger.error(f"Error getting account overview: {e}")
-            return "获取账户概览失败"
\ No newline at end of file
+            return "获取账户概览失败"
+
+class SubAccountAggregator:
+    """通过母账户接口批量获取所有子账户的 U 本位合约余额和持仓
+
+    - 余额：/sapi/v2/sub-account/futures/accountSummary 分页返回全部子账户，一次刷新供所有子账户共用
+    - 持仓：只对占用持仓保证金的子账户请求 /sapi/v2/sub-account/futures/positionRisk
+    因此每次报告的请求数不随子账户数量线性增长，也不需要为每个子账户单独配置 API Key。
+    """
+
+    def __init__(self, exchange, ttl: float = 5, page_size: int = 20):
+        self.exchange = exchange  # 母账户的 ccxt 实例
+        self.ttl = ttl
+        self.page_size = page_size
+        self._summaries = {}  # email -> 子账户合约资产汇总
+        self._fetched_at = None
+        self._lock = threading.Lock()
+
+    def summaries(self) -> Dict[str, Dict]:
+        """所有子账户的合约资产汇总，ttl 秒内的重复调用（如同一轮并发检查）共用一次批量请求"""
+        with self._lock:
+            if self._fetched_at is None or time.monotonic() - self._fetched_at > self.ttl:
+                summaries = {}
+                page = 1
+                while True:
+                    response = self.exchange.sapiV2GetSubAccountFuturesAccountSummary({
+                        'futuresType': 1, 'page': page, 'limit': self.page_size
+                    })
+                    rows = (response.get('futureAccountSummaryResp') or {}).get('subAccountList') or []
+                    for row in rows:
+                        summaries[row['email']] = row
+                    if len(rows) < self.page_size:
+                        break
+                    page += 1
+                self._summaries = summaries
+                self._fetched_at = time.monotonic()
+            return self._summaries
+
+    def emails(self) -> List[str]:
+        return list(self.summaries())
+
+    def positions(self, email: str, summary: Dict) -> List[Dict]:
+        """子账户的持仓风险，没有占用持仓保证金时不发送请求"""
+        if not float(summary.get('totalPositionInitialMargin') or 0):
+            return []
+        response = self.exchange.sapiV2GetSubAccountFuturesPositionRisk({'email': email, 'futuresType': 1})
+        return response.get('futurePositionRiskVos') or []
+
+    def account(self, email: str) -> Dict:
+        """按 /fapi/v2/account 的格式组装子账户的余额和持仓"""
+        summary = self.summaries().get(email)
+        if summary is None:
+            raise Exception(f"母账户下没有子账户 {email}")
+        margin_balance = float(summary['totalMarginBalance'])
+        initial_margin = float(summary['totalInitialMargin'])
+        available = str(margin_balance - initial_margin)
+        positions = []
+        for row in self.positions(email, summary):
+            leverage = float(row.get('leverage') or 0)
+            notional = abs(float(row['positionAmount'])) * float(row.get('markPrice') or row['entryPrice'])
+            positions.append({
+                'symbol': row['symbol'],
+                'positionAmt': row['positionAmount'],
+                'entryPrice': row['entryPrice'],
+                # 接口不返回持仓保证金，按标记价格名义价值 / 杠杆计算（与币安起始保证金口径一致）
+                'initialMargin': str(notional / leverage if leverage else 0.0),
+                'unrealizedProfit': row['unrealizedProfit'],
+                'leverage': row.get('leverage'),
+                'positionSide': 'BOTH',
+            })
+        return {
+            'totalWalletBalance': summary['totalWalletBalance'],
+            'totalUnrealizedProfit': summary['totalUnrealizedProfit'],
+            'totalMarginBalance': summary['totalMarginBalance'],
+            'totalInitialMargin': summary['totalInitialMargin'],
+            'totalMaintMargin': summary.get('totalMaintenanceMargin', '0'),
+            'availableBalance': available,
+            'assets': [{
+                'asset': 'USDT',
+                'walletBalance': summary['totalWalletBalance'],
+                'unrealizedProfit': summary['totalUnrealizedProfit'],
+                'marginBalance': summary['totalMarginBalance'],
+                'initialMargin': summary['totalInitialMargin'],
+                'maintMargin': summary.get('totalMaintenanceMargin', '0'),
+                'availableBalance': available,
+            }],
+            'positions': positions,
+        }
+
+
+class SubAccountExchange:
+    """子账户视图：账户接口由母账户批量接口提供，其余（交易对、标记价格等公共接口）交给母账户实例
+
+    作为 BinanceClient 的 exchange 使用，仓位比较、状态持久化和通知与普通账户完全相同；
+    子账户没有自己的 API Key，因此不支持用户数据流。
+    """
+
+    supports_user_stream = False
+
+    def __init__(self, aggregator: SubAccountAggregator, email: str):
+        self.aggregator = aggregator
+        self.email = email
+
+    def __getattr__(self, name):
+        # 私有接口会返回母账户自己的数据，不能转发
+        if name.startswith(('fapiPrivate', 'sapi', 'private')):
+            raise AttributeError(f"子账户视图不支持 {name}")
+        return getattr(self.aggregator.exchange, name)
+
+    def fapiPrivateV2GetAccount(self, params={}) -> Dict:
+        return self.aggregator.account(self.email)
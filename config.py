@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -12,31 +13,169 @@ BINANCE_API_SECRET = os.getenv('BINANCE_API_SECRET')
 SUB_ACCOUNT_API_KEY = os.getenv('SUB_ACCOUNT_API_KEY')
 SUB_ACCOUNT_API_SECRET = os.getenv('SUB_ACCOUNT_API_SECRET')
 
+# 母账户批量模式：用主账户（母账户）的子账户接口一次获取所有子账户的合约余额和持仓，
+# 子账户无需单独配置 API Key；SUB_ACCOUNT_NAMES 为 邮箱=显示名称（逗号分隔），留空则监控全部子账户
+MASTER_SUB_ACCOUNTS = os.getenv('MASTER_SUB_ACCOUNTS', 'false').lower() == 'true'
+
+
+def parse_sub_account_names(value: str) -> dict:
+    """解析 邮箱=名称 列表，未写名称时使用邮箱"""
+    names = {}
+    for item in value.split(','):
+        email, _, name = item.strip().partition('=')
+        if email.strip():
+            names[email.strip()] = name.strip() or email.strip()
+    return names
+
+
+SUB_ACCOUNT_NAMES = parse_sub_account_names(os.getenv('SUB_ACCOUNT_NAMES', ''))
+
 # 飞书配置
 FEISHU_WEBHOOK_URL = os.getenv('FEISHU_WEBHOOK_URL')
 
+# Telegram 配置
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org/bot')
+
+# 通知发送的连接/读取超时（秒）
+NOTIFY_CONNECT_TIMEOUT = float(os.getenv('NOTIFY_CONNECT_TIMEOUT', '5'))
+NOTIFY_READ_TIMEOUT = float(os.getenv('NOTIFY_READ_TIMEOUT', '10'))
+# 合并通知的时间窗口（秒），窗口内的多条仓位变化会合并为一条消息发送
+NOTIFY_BATCH_WINDOW = float(os.getenv('NOTIFY_BATCH_WINDOW', '1'))
+
 # 监控配置
-NOTIFY_INTERVAL = int(os.getenv('NOTIFY_INTERVAL'))
+NOTIFY_INTERVAL = int(os.getenv('NOTIFY_INTERVAL', '60'))
 DAILY_REPORT_TIME = os.getenv('DAILY_REPORT_TIME')
 
-# 主账户配置
-MAIN_ACCOUNT_CONFIG = {
-    'name': '主账户',
-    'apiKey': BINANCE_API_KEY,
-    'secret': BINANCE_API_SECRET,
-    'enableRateLimit': True,
-    'options': {
-        'defaultType': 'future'
+# 自适应轮询：以 NOTIFY_INTERVAL 为基础，有变化时收紧到最小间隔，空仓时退避到最大间隔
+ADAPTIVE_POLLING = os.getenv('ADAPTIVE_POLLING', 'true').lower() == 'true'
+POLL_MIN_INTERVAL = float(os.getenv('POLL_MIN_INTERVAL', '10'))
+POLL_MAX_INTERVAL = float(os.getenv('POLL_MAX_INTERVAL', '300'))
+# 每分钟请求权重上限（币安合约按 IP 统计）及允许占用的比例
+WEIGHT_LIMIT = int(os.getenv('WEIGHT_LIMIT', '2400'))
+WEIGHT_BUDGET = float(os.getenv('WEIGHT_BUDGET', '0.5'))
+
+# 仓位数据来源：POLL（REST 轮询）或 STREAM（用户数据流推送）
+POSITION_SOURCE = os.getenv('POSITION_SOURCE', 'POLL').upper()
+# 推送模式下 REST 校准间隔（秒）
+RECONCILE_INTERVAL = int(os.getenv('RECONCILE_INTERVAL', '600'))
+USER_STREAM_URL = os.getenv('USER_STREAM_URL', 'wss://fstream.binance.com/ws')
+# 标记价格推送：开启后平仓价格等优先读取内存中的标记价格
+MARK_PRICE_STREAM = os.getenv('MARK_PRICE_STREAM', 'true').lower() == 'true'
+MARK_PRICE_STREAM_URL = os.getenv('MARK_PRICE_STREAM_URL', 'wss://fstream.binance.com/ws/!markPrice@arr@1s')
+# 标记价格缓存有效期（秒）
+MARK_PRICE_TTL = float(os.getenv('MARK_PRICE_TTL', '10'))
+# 风险告警：按标记价格实时计算保证金比率（维持保证金/保证金余额）和强平距离，超过阈值时通知
+RISK_ALERTS = os.getenv('RISK_ALERTS', 'true').lower() == 'true'
+# 告警阈值（逗号分隔，多个阈值对应逐级升高的告警级别）
+RISK_MARGIN_RATIO_LEVELS = [float(v) for v in os.getenv('RISK_MARGIN_RATIO_LEVELS', '0.5,0.8').split(',') if v.strip()]
+RISK_LIQUIDATION_DISTANCE_LEVELS = [
+    float(v) for v in os.getenv('RISK_LIQUIDATION_DISTANCE_LEVELS', '0.1,0.05').split(',') if v.strip()
+]
+# 滞回比例：告警后需回落超过阈值的该比例才解除（如 0.2 表示 80% 的阈值在 64% 以下才恢复）
+RISK_HYSTERESIS = float(os.getenv('RISK_HYSTERESIS', '0.2'))
+# 用户提醒规则（Telegram /alert 命令添加），保存在持仓状态数据库中，由标记价格推送触发
+ALERT_RULES = os.getenv('ALERT_RULES', 'true').lower() == 'true'
+# 账户快照缓存有效期（秒），Telegram 查询在此时间内直接使用监控循环获取的快照
+SNAPSHOT_CACHE_TTL = float(os.getenv('SNAPSHOT_CACHE_TTL', '30'))
+# 账户接口版本：V3 只返回有持仓的交易对（响应小、解析快），V2 返回全部交易对
+ACCOUNT_ENDPOINT = os.getenv('ACCOUNT_ENDPOINT', 'V3').upper()
+# 只监控的交易对（交易所原始格式，逗号分隔，如 BTCUSDT,ETHUSDT），留空则监控全部
+POSITION_WATCHLIST = [s.strip().upper() for s in os.getenv('POSITION_WATCHLIST', '').split(',') if s.strip()]
+# 持仓状态数据库路径（留空则不持久化），重启后据此恢复持仓和开仓时间
+STATE_DB_PATH = os.getenv('STATE_DB_PATH', 'data/state.db')
+# 平仓时增量同步成交和资金费历史（游标保存在持仓状态数据库中），通知中给出实际成交均价、手续费、资金费和已实现盈亏
+TRADE_HISTORY = os.getenv('TRADE_HISTORY', 'true').lower() == 'true'
+# 首次同步某个交易对时，从开仓检测时间往前多取的时间（秒），应覆盖一个轮询间隔
+TRADE_HISTORY_LOOKBACK = float(os.getenv('TRADE_HISTORY_LOOKBACK', '600'))
+# 余额和持仓历史数据库路径（留空则不记录）
+HISTORY_DB_PATH = os.getenv('HISTORY_DB_PATH', 'data/history.db')
+# 交易对信息磁盘缓存路径（留空则只在进程内共享）及有效期（秒）
+MARKET_CACHE_PATH = os.getenv('MARKET_CACHE_PATH', 'data/markets.json')
+MARKET_CACHE_TTL = float(os.getenv('MARKET_CACHE_TTL', '86400'))
+# 多账户并发请求时单个账户的超时时间（秒）
+ACCOUNT_TIMEOUT = float(os.getenv('ACCOUNT_TIMEOUT', '30'))
+# 工作进程数：大于 1 时账户按分片交给多个工作进程监控（JSON 解析等开销分摊到多个 CPU 核心），
+# 主进程汇总仓位变化并统一发送通知、报告和告警，工作进程异常退出后自动重启；0 或 1 为单进程模式
+WORKER_PROCESSES = int(os.getenv('WORKER_PROCESSES', '1'))
+
+# 本地指标接口（Prometheus 文本格式，路径 /metrics），端口为 0 时不启动
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+
+# 账户列表文件（YAML 或 JSON），留空则使用上面的主账户/子账户环境变量
+ACCOUNTS_FILE = os.getenv('ACCOUNTS_FILE')
+# 单个账户的请求速率（次/秒）、突发上限和连续失败后的最长退避时间（秒），账户之间互不影响
+ACCOUNT_RATE_LIMIT = float(os.getenv('ACCOUNT_RATE_LIMIT', '2'))
+ACCOUNT_RATE_BURST = float(os.getenv('ACCOUNT_RATE_BURST', '5'))
+ACCOUNT_MAX_BACKOFF = float(os.getenv('ACCOUNT_MAX_BACKOFF', '300'))
+
+
+def account_config(name: str, api_key: str, secret: str) -> dict:
+    """生成单个账户的 ccxt 配置"""
+    return {
+        'name': name,
+        'apiKey': api_key,
+        'secret': secret,
+        'enableRateLimit': True,
+        'options': {
+            'defaultType': 'future',
+            # 只监控 U 本位合约：只加载 U 本位交易对，跳过现货/币本位 exchangeInfo 和币种信息
+            'fetchMarkets': {'types': ['linear']},
+            'fetchCurrencies': False
+        }
     }
-}
+
+
+# 主账户配置
+MAIN_ACCOUNT_CONFIG = account_config('主账户', BINANCE_API_KEY, BINANCE_API_SECRET)
 
 # 子账户配置
-SUB_ACCOUNT_CONFIG = {
-    'name': '子账户',
-    'apiKey': SUB_ACCOUNT_API_KEY,
-    'secret': SUB_ACCOUNT_API_SECRET,
-    'enableRateLimit': True,
-    'options': {
-        'defaultType': 'future'
-    }
-} 
\ No newline at end of file
+SUB_ACCOUNT_CONFIG = account_config('子账户', SUB_ACCOUNT_API_KEY, SUB_ACCOUNT_API_SECRET)
+
+
+def load_account_configs(path: str = None) -> list:
+    """读取账户列表，返回 ccxt 配置列表（每项的 limits 为该账户的限速设置）
+
+    文件格式（YAML 或 JSON）：
+        accounts:
+          - name: 主账户
+            api_key_env: BINANCE_API_KEY      # 从环境变量读取密钥，也可直接写 api_key / secret
+            secret_env: BINANCE_API_SECRET
+            rate_limit: 2                     # 可选，覆盖 ACCOUNT_RATE_LIMIT
+            burst: 5                          # 可选，覆盖 ACCOUNT_RATE_BURST
+    """
+    path = path if path is not None else ACCOUNTS_FILE
+    if not path:
+        configs = [dict(MAIN_ACCOUNT_CONFIG)]
+        # 母账户批量模式下子账户由主账户接口提供，不再单独创建
+        if SUB_ACCOUNT_API_KEY and not MASTER_SUB_ACCOUNTS:
+            configs.append(dict(SUB_ACCOUNT_CONFIG))
+        return configs
+
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    entries = data.get('accounts', []) if isinstance(data, dict) else data
+
+    configs = []
+    names = set()
+    for entry in entries:
+        name = entry['name']
+        if name in names:
+            raise ValueError(f"账户名称重复: {name}")
+        names.add(name)
+        api_key = entry.get('api_key') or os.getenv(entry.get('api_key_env', ''))
+        secret = entry.get('secret') or os.getenv(entry.get('secret_env', ''))
+        if not api_key or not secret:
+            raise ValueError(f"账户 {name} 缺少 API Key 或 Secret")
+        config = account_config(name, api_key, secret)
+        config['limits'] = {
+            key: float(entry[key]) for key in ('rate_limit', 'burst', 'max_backoff') if key in entry
+        }
+        configs.append(config)
+    if not configs:
+        raise ValueError(f"账户列表为空: {path}")
+    return configs
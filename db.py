@@ -0,0 +1,16 @@
+import os
+import sqlite3
+
+
+def open_sqlite(path: str) -> sqlite3.Connection:
+    """打开多线程共享的 SQLite 连接（WAL 模式），按需创建所在目录
+
+    调用方自行用锁串行化对连接的访问；WAL 模式下多个进程可以同时打开同一个数据库。
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
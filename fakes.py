@@ -0,0 +1,517 @@
+"""本地模拟的币安接口，用于离线测试和性能测试（不访问任何外部网络）"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+import websockets
+
+
+class FakeFuturesExchange:
+    """模拟 ccxt.binance 合约接口的最小实现，持仓保存在内存中"""
+
+    # 模拟的手续费率和维持保证金率
+    commission_rate = 0.0004
+    maint_margin_rate = 0.004
+
+    def __init__(self, wallet_balance: float = 10000.0, clock=time.time):
+        self.wallet_balance = wallet_balance
+        self.positions = {}  # (market_id, positionSide) -> {'pa', 'ep', 'up', 'leverage', 'ut'}
+        self.prices = {}
+        self.markets_by_id = None
+        self.listen_keys_issued = 0
+        self.calls = []
+        self.trades = []  # userTrades 记录，持仓数量变化时自动生成
+        self.income = []  # 资金费等收益记录
+        self._clock = clock
+
+    @classmethod
+    def from_fixture(cls, path: str) -> 'FakeFuturesExchange':
+        """用录制的 /fapi/v2/account 响应初始化余额和持仓"""
+        with open(path, 'r', encoding='utf-8') as f:
+            account = json.load(f)
+        exchange = cls(wallet_balance=float(account['totalWalletBalance']))
+        for row in account['positions']:
+            amount = float(row['positionAmt'])
+            if amount:
+                exchange.set_position(
+                    row['symbol'], amount, float(row['entryPrice']),
+                    leverage=float(row['leverage']), unrealized_pnl=float(row['unrealizedProfit']),
+                    position_side=row.get('positionSide', 'BOTH')
+                )
+        return exchange
+
+    def milliseconds(self) -> int:
+        return int(self._clock() * 1000)
+
+    def set_position(self, market_id: str, amount: float, entry_price: float,
+                     leverage: float = 10, unrealized_pnl: float = 0.0,
+                     position_side: str = 'BOTH', fill_price: float = None) -> Dict:
+        """修改持仓，并返回对应的 ACCOUNT_UPDATE 推送事件
+
+        position_side 为 LONG/SHORT 时模拟双向持仓模式（空头数量为负数）。
+        数量变化时按 fill_price（默认为开仓价或当前价格）生成一笔成交记录。
+        """
+        key = (market_id, position_side)
+        self._record_fill(market_id, position_side, amount, entry_price, fill_price)
+        if amount == 0:
+            self.positions.pop(key, None)
+        else:
+            self.positions[key] = {
+                'pa': amount, 'ep': entry_price, 'up': unrealized_pnl, 'leverage': leverage,
+                'ut': self.milliseconds()
+            }
+        self.prices.setdefault(market_id, entry_price)
+        return account_update_event(market_id, amount, entry_price, unrealized_pnl, position_side=position_side)
+
+    def _record_fill(self, market_id: str, position_side: str, amount: float, entry_price: float,
+                     fill_price: float = None):
+        old = self.positions.get((market_id, position_side))
+        old_amount = old['pa'] if old else 0.0
+        delta = amount - old_amount
+        if not delta:
+            return
+        # 减仓：数量同方向变小或平仓（不模拟一笔成交内的反手）
+        reducing = bool(old_amount) and (amount == 0 or (amount > 0) == (old_amount > 0)) \
+            and abs(amount) < abs(old_amount)
+        if fill_price is None:
+            fill_price = self.prices.get(market_id, entry_price) if reducing else entry_price
+        realized = (fill_price - old['ep']) * abs(delta) * (1 if old_amount > 0 else -1) if reducing else 0.0
+        qty = abs(delta)
+        self.trades.append({
+            'symbol': market_id, 'id': len(self.trades) + 1, 'orderId': len(self.trades) + 1,
+            'side': 'BUY' if delta > 0 else 'SELL', 'positionSide': position_side,
+            'price': str(fill_price), 'qty': str(qty), 'quoteQty': str(qty * fill_price),
+            'realizedPnl': str(realized), 'commission': str(qty * fill_price * self.commission_rate),
+            'commissionAsset': 'USDT', 'time': self.milliseconds(), 'buyer': delta > 0, 'maker': False,
+        })
+
+    def add_funding(self, market_id: str, amount: float):
+        """记录一笔资金费（负数为支付）"""
+        self.income.append({
+            'symbol': market_id, 'incomeType': 'FUNDING_FEE', 'income': str(amount), 'asset': 'USDT',
+            'info': 'FUNDING_FEE', 'time': self.milliseconds(), 'tranId': len(self.income) + 1, 'tradeId': '',
+        })
+
+    def fapiPrivateGetUserTrades(self, params={}) -> List[Dict]:
+        """成交历史：按 fromId 或 [startTime, endTime] 查询，按 id 升序"""
+        self.calls.append('fapiPrivateGetUserTrades')
+        rows = [t for t in self.trades if t['symbol'] == params['symbol']]
+        if 'fromId' in params:
+            rows = [t for t in rows if t['id'] >= int(params['fromId'])]
+        else:
+            # 不指定时间范围时返回最近 7 天
+            start = int(params.get('startTime', self.milliseconds() - 7 * 86400 * 1000))
+            end = int(params.get('endTime', 2 ** 62))
+            rows = [t for t in rows if start <= t['time'] <= end]
+        return rows[:int(params.get('limit', 500))]
+
+    def fapiPrivateGetIncome(self, params={}) -> List[Dict]:
+        """收益历史：按类型、交易对和 [startTime, endTime] 查询，按时间升序"""
+        self.calls.append('fapiPrivateGetIncome')
+        start = int(params.get('startTime', self.milliseconds() - 7 * 86400 * 1000))
+        rows = [
+            r for r in self.income
+            if ('incomeType' not in params or r['incomeType'] == params['incomeType'])
+            and ('symbol' not in params or r['symbol'] == params['symbol'])
+            and start <= r['time'] <= int(params.get('endTime', 2 ** 62))
+        ]
+        return rows[:int(params.get('limit', 100))]
+
+    def fetch_positions(self, symbols=None, params={}) -> List[Dict]:
+        self.calls.append('fetch_positions')
+        result = []
+        for (market_id, position_side), p in self.positions.items():
+            contracts = abs(p['pa'])
+            margin = contracts * p['ep'] / p['leverage']
+            result.append({
+                'symbol': _symbol(market_id),
+                'side': ('long' if p['pa'] > 0 else 'short') if position_side == 'BOTH' else position_side.lower(),
+                'contracts': contracts,
+                'entryPrice': p['ep'],
+                'initialMargin': margin,
+                'unrealizedPnl': p['up'],
+                'percentage': p['up'] / margin * 100 if margin else 0.0,
+                'leverage': p['leverage'],
+            })
+        return result
+
+    def load_markets(self, reload=False, params={}):
+        return {}
+
+    def fapiPrivateV2GetAccount(self, params={}) -> Dict:
+        """账户接口（v2）：余额和持仓在同一个响应中"""
+        self.calls.append('fapiPrivateV2GetAccount')
+        positions = []
+        total_margin = 0.0
+        total_maint = 0.0
+        total_pnl = 0.0
+        for (market_id, position_side), p in self.positions.items():
+            margin = abs(p['pa']) * p['ep'] / p['leverage']
+            maint = self._maint_margin(p)
+            total_margin += margin
+            total_maint += maint
+            total_pnl += p['up']
+            positions.append({
+                'symbol': market_id,
+                'positionAmt': str(p['pa']),
+                'entryPrice': str(p['ep']),
+                'initialMargin': str(margin),
+                'maintMargin': str(maint),
+                'unrealizedProfit': str(p['up']),
+                'leverage': str(p['leverage']),
+                'isolated': False,
+                'isolatedWallet': '0',
+                'positionSide': position_side,
+            })
+        wallet = self.wallet_balance
+        return {
+            'totalWalletBalance': str(wallet),
+            'totalUnrealizedProfit': str(total_pnl),
+            'totalMarginBalance': str(wallet + total_pnl),
+            'totalInitialMargin': str(total_margin),
+            'totalMaintMargin': str(total_maint),
+            'availableBalance': str(wallet + total_pnl - total_margin),
+            'assets': [{
+                'asset': 'USDT',
+                'walletBalance': str(wallet),
+                'unrealizedProfit': str(total_pnl),
+                'marginBalance': str(wallet + total_pnl),
+                'initialMargin': str(total_margin),
+                'maintMargin': str(total_maint),
+                'availableBalance': str(wallet + total_pnl - total_margin),
+            }],
+            'positions': positions,
+        }
+
+    def _maint_margin(self, p: Dict) -> float:
+        """维持保证金：按未实现盈亏推算标记价格，乘以固定维持保证金率"""
+        mark_price = p['ep'] + p['up'] / p['pa']
+        return abs(p['pa']) * mark_price * self.maint_margin_rate
+
+    def fapiPrivateV3GetAccount(self, params={}) -> Dict:
+        """账户接口（v3）：只返回有持仓的交易对，持仓不含开仓均价和杠杆"""
+        self.calls.append('fapiPrivateV3GetAccount')
+        account = self.fapiPrivateV2GetAccount()
+        self.calls.pop()
+        account['positions'] = [
+            {
+                'symbol': market_id,
+                'positionSide': position_side,
+                'positionAmt': str(p['pa']),
+                'unrealizedProfit': str(p['up']),
+                'isolatedMargin': '0',
+                'notional': str(p['pa'] * self.prices.get(market_id, p['ep'])),
+                'isolatedWallet': '0',
+                'initialMargin': str(abs(p['pa']) * p['ep'] / p['leverage']),
+                'maintMargin': str(self._maint_margin(p)),
+                'updateTime': p['ut'],
+            }
+            for (market_id, position_side), p in self.positions.items()
+        ]
+        return account
+
+    def fapiPrivateV3GetPositionRisk(self, params={}) -> List[Dict]:
+        """持仓风险接口（v3）：只返回有持仓的交易对，可按交易对过滤"""
+        self.calls.append('fapiPrivateV3GetPositionRisk')
+        return [
+            {
+                'symbol': market_id,
+                'positionSide': position_side,
+                'positionAmt': str(p['pa']),
+                'entryPrice': str(p['ep']),
+                'markPrice': str(self.prices.get(market_id, p['ep'])),
+                'unRealizedProfit': str(p['up']),
+                'initialMargin': str(abs(p['pa']) * p['ep'] / p['leverage']),
+                'updateTime': p['ut'],
+            }
+            for (market_id, position_side), p in self.positions.items()
+            if 'symbol' not in params or params['symbol'] == market_id
+        ]
+
+    def fetch_ticker(self, symbol: str) -> Dict:
+        self.calls.append('fetch_ticker')
+        market_id = symbol.split(':')[0].replace('/', '')
+        return {'symbol': symbol, 'last': self.prices.get(market_id, 0.0)}
+
+    def fapiPublicGetPremiumIndex(self, params={}):
+        self.calls.append('fapiPublicGetPremiumIndex')
+        now = self.milliseconds()
+        if 'symbol' in params:
+            return {'symbol': params['symbol'], 'markPrice': str(self.prices.get(params['symbol'], 0.0)), 'time': now}
+        return [{'symbol': market_id, 'markPrice': str(price), 'time': now} for market_id, price in self.prices.items()]
+
+    def fapiPrivatePostListenKey(self, params={}) -> Dict:
+        self.calls.append('fapiPrivatePostListenKey')
+        self.listen_keys_issued += 1
+        return {'listenKey': f"fake-listen-key-{self.listen_keys_issued}"}
+
+    def fapiPrivatePutListenKey(self, params={}) -> Dict:
+        self.calls.append('fapiPrivatePutListenKey')
+        return {}
+
+
+class FakeMasterExchange(FakeFuturesExchange):
+    """模拟母账户：除自身合约账户外，还提供子账户合约资产汇总（分页）和持仓风险接口"""
+
+    def __init__(self, wallet_balance: float = 10000.0):
+        super().__init__(wallet_balance)
+        self.sub_accounts = {}  # email -> FakeFuturesExchange
+
+    def add_sub_account(self, email: str, wallet_balance: float = 1000.0) -> FakeFuturesExchange:
+        self.sub_accounts[email] = FakeFuturesExchange(wallet_balance)
+        return self.sub_accounts[email]
+
+    def sapiV2GetSubAccountFuturesAccountSummary(self, params={}) -> Dict:
+        self.calls.append('sapiV2GetSubAccountFuturesAccountSummary')
+        page, limit = int(params.get('page', 1)), int(params.get('limit', 10))
+        rows = []
+        for email, sub in list(self.sub_accounts.items())[(page - 1) * limit:page * limit]:
+            account = sub.fapiPrivateV2GetAccount()
+            sub.calls.pop()
+            rows.append({
+                'email': email,
+                'totalInitialMargin': account['totalInitialMargin'],
+                'totalMaintenanceMargin': account['totalMaintMargin'],
+                'totalMarginBalance': account['totalMarginBalance'],
+                'totalOpenOrderInitialMargin': '0',
+                'totalPositionInitialMargin': account['totalInitialMargin'],
+                'totalUnrealizedProfit': account['totalUnrealizedProfit'],
+                'totalWalletBalance': account['totalWalletBalance'],
+                'asset': 'USD',
+            })
+        return {'futureAccountSummaryResp': {'asset': 'USD', 'subAccountList': rows}}
+
+    def sapiV2GetSubAccountFuturesPositionRisk(self, params={}) -> Dict:
+        self.calls.append('sapiV2GetSubAccountFuturesPositionRisk')
+        sub = self.sub_accounts[params['email']]
+        return {'futurePositionRiskVos': [
+            {
+                'symbol': market_id,
+                'positionAmount': str(p['pa']),
+                'entryPrice': str(p['ep']),
+                'markPrice': str(p['ep']),
+                'leverage': str(p['leverage']),
+                'unrealizedProfit': str(p['up']),
+                'liquidationPrice': '0',
+                'maxNotional': '1000000',
+            }
+            for (market_id, _), p in sub.positions.items()
+        ]}
+
+
+def _symbol(market_id: str) -> str:
+    """BTCUSDT -> BTC/USDT:USDT"""
+    return f"{market_id[:-4]}/USDT:USDT"
+
+
+def account_update_event(market_id: str, amount: float, entry_price: float,
+                         unrealized_pnl: float = 0.0, margin_type: str = 'cross',
+                         position_side: str = 'BOTH') -> Dict:
+    """构造 ACCOUNT_UPDATE 推送事件"""
+    now = int(time.time() * 1000)
+    return {
+        'e': 'ACCOUNT_UPDATE',
+        'E': now,
+        'T': now,
+        'a': {
+            'm': 'ORDER',
+            'B': [],
+            'P': [{
+                's': market_id,
+                'pa': str(amount),
+                'ep': str(entry_price),
+                'cr': '0',
+                'up': str(unrealized_pnl),
+                'mt': margin_type,
+                'iw': '0',
+                'ps': position_side,
+            }]
+        }
+    }
+
+
+def order_trade_update_event(market_id: str, side: str, quantity: float, price: float,
+                             position_side: str = 'BOTH') -> Dict:
+    """构造 ORDER_TRADE_UPDATE 成交推送事件"""
+    now = int(time.time() * 1000)
+    return {
+        'e': 'ORDER_TRADE_UPDATE',
+        'E': now,
+        'T': now,
+        'o': {
+            's': market_id,
+            'S': side,
+            'o': 'MARKET',
+            'x': 'TRADE',
+            'X': 'FILLED',
+            'l': str(quantity),
+            'z': str(quantity),
+            'L': str(price),
+            'ap': str(price),
+            'rp': '0',
+            'ps': position_side,
+        }
+    }
+
+
+def mark_price_event(prices: Dict[str, float]) -> List[Dict]:
+    """构造 !markPrice@arr 推送（一批交易对的标记价格）"""
+    now = int(time.time() * 1000)
+    return [
+        {'e': 'markPriceUpdate', 'E': now, 's': market_id, 'p': str(price), 'r': '0.0001', 'T': now}
+        for market_id, price in prices.items()
+    ]
+
+
+class FakeStreamServer:
+    """本地 WebSocket 推送服务器，向所有已连接客户端广播事件"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.host = host
+        self.port = port
+        self.paths = []
+        self._clients = set()
+        self._loop = None
+        self._server = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/ws"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._server = await websockets.serve(self._handler, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        await self._server.wait_closed()
+
+    async def _handler(self, connection):
+        self.paths.append(connection.request.path)
+        self._clients.add(connection)
+        try:
+            await connection.wait_closed()
+        finally:
+            self._clients.discard(connection)
+
+    def wait_for_clients(self, count: int = 1, timeout: float = 5) -> bool:
+        """等待指定数量的客户端连接"""
+        deadline = time.monotonic() + timeout
+        while len(self._clients) < count:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def push(self, event):
+        """广播一条事件（dict 或 list 会被序列化为 JSON）"""
+        message = json.dumps(event)
+
+        async def broadcast():
+            for client in list(self._clients):
+                await client.send(message)
+
+        asyncio.run_coroutine_threadsafe(broadcast(), self._loop).result(5)
+
+    def expire_listen_key(self):
+        """模拟 listenKey 过期"""
+        self.push({'e': 'listenKeyExpired', 'E': int(time.time() * 1000)})
+
+
+class FakeWebhookServer:
+    """本地 HTTP 接收端，模拟飞书 Webhook 和 Telegram Bot API（支持 keep-alive）"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, delay: float = 0.0):
+        self.received = []
+        self.connections = 0
+        self.delay = delay
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                server.connections += 1
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+                if server.delay:
+                    time.sleep(server.delay)
+                server.received.append((time.time(), self.path, body))
+                self._reply(server._response_for(self.path, body))
+
+            def _reply(self, payload: Dict):
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self.host, self.port = self._httpd.server_address
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _response_for(self, path: str, body: bytes) -> Dict:
+        if '/sendMessage' in path:
+            now = int(time.time())
+            return {'ok': True, 'result': {
+                'message_id': len(self.received),
+                'date': now,
+                'chat': {'id': 1, 'type': 'private'},
+                'text': '',
+            }}
+        if '/getUpdates' in path:
+            return {'ok': True, 'result': []}
+        return {'code': 0, 'msg': 'success'}
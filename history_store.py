@@ -0,0 +1,145 @@
+import threading
+import time
+from typing import Dict, List, Optional
+
+from db import open_sqlite
+
+# 降采样层级（秒）及各层保留时长（秒，None 表示永久保留）
+RESOLUTIONS = {
+    60: 7 * 86400,          # 1 分钟粒度保留 7 天
+    3600: 180 * 86400,      # 1 小时粒度保留 180 天
+    86400: None,            # 1 天粒度永久保留
+}
+
+
+class HistoryStore:
+    """余额和持仓的时序历史（SQLite）
+
+    每次采样同时写入 1分钟/1小时/1天 三个层级，同一时间桶内只保留最后一次采样，
+    过期数据按层级定期清理，因此磁盘占用有上限；查询时按时间范围自动选择层级。
+    """
+
+    def __init__(self, path: str, resolutions: Optional[Dict[int, Optional[int]]] = None):
+        self.resolutions = resolutions or RESOLUTIONS
+        self._conn = open_sqlite(path)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS balance_history (
+                    resolution INTEGER NOT NULL,
+                    account    TEXT NOT NULL,
+                    ts         INTEGER NOT NULL,
+                    total      REAL,
+                    free       REAL,
+                    used       REAL,
+                    unrealized REAL,
+                    PRIMARY KEY (resolution, account, ts)
+                ) WITHOUT ROWID
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS position_history (
+                    resolution  INTEGER NOT NULL,
+                    account     TEXT NOT NULL,
+                    symbol      TEXT NOT NULL,
+                    side        TEXT NOT NULL,
+                    ts          INTEGER NOT NULL,
+                    contracts   REAL,
+                    entry_price REAL,
+                    margin      REAL,
+                    unrealized  REAL,
+                    PRIMARY KEY (resolution, account, symbol, ts, side)
+                ) WITHOUT ROWID
+            """)
+            self._conn.commit()
+
+    def record(self, snapshot: Dict):
+        """写入一次账户快照（BinanceClient.get_snapshot 的返回值）"""
+        balance = snapshot['balance']
+        account = balance['account_name']
+        ts = int(snapshot['timestamp'] // 1000)
+
+        balance_rows = []
+        position_rows = []
+        for resolution in self.resolutions:
+            bucket = ts - ts % resolution
+            balance_rows.append((
+                resolution, account, bucket,
+                balance['total_balance'], balance['free_balance'],
+                balance['used_balance'], balance['total_unrealized_pnl']
+            ))
+            for p in snapshot['positions']:
+                position_rows.append((
+                    resolution, account, p['symbol'], p['side'], bucket,
+                    p['contracts'], p['entryPrice'], p['margin'], p['unrealizedPnl']
+                ))
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO balance_history VALUES (?, ?, ?, ?, ?, ?, ?)",
+                balance_rows
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO position_history VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                position_rows
+            )
+
+    def prune(self, now: Optional[float] = None):
+        """按各层级的保留时长删除过期数据"""
+        now = int(now if now is not None else time.time())
+        with self._lock, self._conn:
+            for resolution, retention in self.resolutions.items():
+                if retention is None:
+                    continue
+                for table in ('balance_history', 'position_history'):
+                    self._conn.execute(
+                        f"DELETE FROM {table} WHERE resolution = ? AND ts < ?",
+                        (resolution, now - retention)
+                    )
+
+    def pick_resolution(self, start: float, end: float, now: Optional[float] = None,
+                        max_points: int = 5000) -> int:
+        """选择能覆盖起始时间、且点数不超过 max_points 的最细层级"""
+        now = now if now is not None else time.time()
+        for resolution in sorted(self.resolutions):
+            retention = self.resolutions[resolution]
+            if retention is not None and start < now - retention:
+                continue
+            if (end - start) / resolution <= max_points:
+                return resolution
+        return max(self.resolutions)
+
+    def query_balances(self, account: str, start: float, end: float,
+                       resolution: Optional[int] = None) -> List[Dict]:
+        """查询账户余额曲线，时间为秒级时间戳"""
+        resolution = resolution or self.pick_resolution(start, end)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ts, total, free, used, unrealized FROM balance_history "
+                "WHERE resolution = ? AND account = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+                (resolution, account, int(start), int(end))
+            ).fetchall()
+        return [
+            {'ts': ts, 'total_balance': total, 'free_balance': free,
+             'used_balance': used, 'total_unrealized_pnl': unrealized}
+            for ts, total, free, used, unrealized in rows
+        ]
+
+    def query_positions(self, account: str, symbol: str, start: float, end: float,
+                        resolution: Optional[int] = None) -> List[Dict]:
+        """查询单个交易对的持仓历史，时间为秒级时间戳"""
+        resolution = resolution or self.pick_resolution(start, end)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ts, side, contracts, entry_price, margin, unrealized FROM position_history "
+                "WHERE resolution = ? AND account = ? AND symbol = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+                (resolution, account, symbol, int(start), int(end))
+            ).fetchall()
+        return [
+            {'ts': ts, 'side': side, 'contracts': contracts, 'entryPrice': entry_price,
+             'margin': margin, 'unrealizedPnl': unrealized}
+            for ts, side, contracts, entry_price, margin, unrealized in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
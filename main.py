@@ -1,20 +1,42 @@
-from binance_client import BinanceClient
 from services.feishu_service import FeishuNotifier
 from scheduler import TaskScheduler
 from config import (
     NOTIFY_INTERVAL, DAILY_REPORT_TIME,
-    MAIN_ACCOUNT_CONFIG, SUB_ACCOUNT_CONFIG
+    load_account_configs, ACCOUNT_RATE_LIMIT, ACCOUNT_RATE_BURST, ACCOUNT_MAX_BACKOFF,
+    POSITION_SOURCE, RECONCILE_INTERVAL, ACCOUNT_TIMEOUT,
+    NOTIFY_BATCH_WINDOW, MARK_PRICE_STREAM, MARK_PRICE_STREAM_URL, MARK_PRICE_TTL,
+    STATE_DB_PATH, HISTORY_DB_PATH, ADAPTIVE_POLLING, POLL_MIN_INTERVAL,
+    POLL_MAX_INTERVAL, MARKET_CACHE_PATH, MARKET_CACHE_TTL, METRICS_HOST, METRICS_PORT,
+    MASTER_SUB_ACCOUNTS, TRADE_HISTORY,
+    RISK_ALERTS, RISK_MARGIN_RATIO_LEVELS, RISK_LIQUIDATION_DISTANCE_LEVELS, RISK_HYSTERESIS,
+    ALERT_RULES, WORKER_PROCESSES
 )
 from services.telegram_service import TelegramService
+from services.outbox import NotificationOutbox
+from services.report_renderer import Report
+from account_pool import AccountPool
+from price_cache import mark_prices
+from state_store import PositionStateStore
+from trade_history import TradeHistoryStore
+from risk_engine import RiskEngine
+from alert_rules import AlertRuleEngine, AlertRuleStore
+from history_store import HistoryStore
+from market_cache import MarketCache
+from monitoring import create_accounts, schedule_monitoring, timed_check
+from supervisor import Supervisor
+from metrics import metrics
 import os
 import asyncio
 import threading
 
 def main():
-    # 创建主账户和子账户的客户端
-    main_account = BinanceClient(MAIN_ACCOUNT_CONFIG.copy())
-    sub_account = BinanceClient(SUB_ACCOUNT_CONFIG.copy())
-    accounts = [main_account, sub_account]
+    # 余额和持仓历史，每次获取快照后记录
+    history = HistoryStore(HISTORY_DB_PATH) if HISTORY_DB_PATH else None
+
+    # 共享标记价格缓存，由推送实时更新
+    mark_prices.ttl = MARK_PRICE_TTL
+    if MARK_PRICE_STREAM:
+        mark_prices.start(MARK_PRICE_STREAM_URL)
     
     # 初始化通知服务
     notification_type = os.getenv('NOTIFICATION_TYPE')
@@ -22,20 +44,86 @@ def main():
         notifier = TelegramService()
     else:
         notifier = FeishuNotifier()
+    # 通知由后台发件箱发送，避免慢速的通知接口阻塞仓位监控
+    outbox = NotificationOutbox(notifier, window=NOTIFY_BATCH_WINDOW)
+
+    # 风险告警：快照载入后由标记价格推送驱动，每次只重新计算价格有变化的交易对
+    risk_engine = None
+    if RISK_ALERTS:
+        risk_engine = RiskEngine(
+            lambda alerts: outbox.send_message(notifier.format_risk_message(alerts)),
+            RISK_MARGIN_RATIO_LEVELS, RISK_LIQUIDATION_DISTANCE_LEVELS, RISK_HYSTERESIS
+        )
+        mark_prices.add_listener(risk_engine.on_prices)
+
+    # 用户提醒规则：按交易对和方向建立有序阈值索引，每次价格推送只取出被穿越的阈值
+    alert_rules = None
+    if ALERT_RULES:
+        alert_rules = AlertRuleEngine(
+            AlertRuleStore(STATE_DB_PATH or ':memory:'),
+            lambda alerts: outbox.send_message(notifier.format_rule_message(alerts)),
+            price_cache=mark_prices
+        )
+        mark_prices.add_listener(alert_rules.on_prices)
+
+    def handle_update(account, changes, snapshot=None, positions=None):
+        """处理一个账户的检查结果：发送仓位变化通知，记录快照，更新风险敞口和提醒规则
+
+        轮询检查给出完整快照，用户数据流推送只给出当前持仓。
+        """
+        if changes and (changes['new_positions'] or changes['closed_positions']):
+            message = notifier.format_position_message(changes)
+            outbox.send_message(message)
+        if snapshot is not None:
+            if history is not None:
+                history.record(snapshot)
+            if risk_engine is not None:
+                risk_engine.load(snapshot['balance'], snapshot['positions'])
+            positions = snapshot['positions']
+        elif positions is not None and risk_engine is not None:
+            risk_engine.update_positions(account.account_name, positions)
+        if alert_rules is not None and positions is not None:
+            alert_rules.update_positions(account.account_name, positions)
+
+    supervisor = None
+    pool = None
+    if WORKER_PROCESSES > 1:
+        # 多进程模式：账户分片交给工作进程监控，主进程只汇总结果、发送通知和报告
+        supervisor = Supervisor(
+            load_account_configs(), handle_update, workers=WORKER_PROCESSES,
+            sub_accounts=MASTER_SUB_ACCOUNTS, timeout=ACCOUNT_TIMEOUT
+        )
+        accounts = supervisor.accounts
+        scheduler = TaskScheduler(max_workers=4)
+    else:
+        # 持仓状态持久化，重启后不会把已有持仓重复通知为新开仓
+        state_store = PositionStateStore(STATE_DB_PATH) if STATE_DB_PATH else None
+        # 成交和资金费历史与持仓状态保存在同一个数据库，平仓时增量同步
+        trade_store = TradeHistoryStore(STATE_DB_PATH) if STATE_DB_PATH and TRADE_HISTORY else None
+        # 交易对信息所有账户共享并缓存到磁盘，重启时无需重新下载
+        market_cache = MarketCache(MARKET_CACHE_PATH or None, ttl=MARKET_CACHE_TTL)
+
+        # 按账户列表创建客户端，每个账户有独立的执行线程、限速器和退避状态
+        accounts, limits = create_accounts(
+            load_account_configs(), state_store, market_cache, trade_store, MASTER_SUB_ACCOUNTS
+        )
+        pool = AccountPool(
+            accounts, timeout=ACCOUNT_TIMEOUT, rate_limit=ACCOUNT_RATE_LIMIT,
+            burst=ACCOUNT_RATE_BURST, max_backoff=ACCOUNT_MAX_BACKOFF, limits=limits
+        )
+        # 创建调度器（每个账户可能有独立的轮询任务，线程数随账户数增加）
+        scheduler = TaskScheduler(max_workers=len(accounts) + 4)
 
-    # 创建调度器
-    scheduler = TaskScheduler()
+    def check_account(account):
+        """检查单个账户的仓位变化并发送通知"""
+        changes = timed_check(account)
+        handle_update(account, changes, snapshot=account.last_snapshot)
+        return changes
 
-    def check_positions():
-        """检查所有账户的仓位变化并发送通知"""
-        for account in accounts:
-            try:
-                changes = account.check_position_changes()
-                if changes['new_positions'] or changes['closed_positions']:
-                    message = notifier.format_position_message(changes, account.exchange)
-                    notifier.send_message(message)
-            except Exception as e:
-                print(f"{account.account_name} 检查仓位失败: {str(e)}")
+    def on_stream_changes(account, changes):
+        """用户数据流推送的仓位变化：发送通知并更新风险敞口"""
+        positions = [record.data for record in account.position_index.positions(account.account_name).values()]
+        handle_update(account, changes, positions=positions)
 
     def send_daily_report():
         """发送所有账户的每日报告"""
@@ -44,22 +132,37 @@ def main():
             all_balances = []
             all_positions = []
             
-            for account in accounts:
-                balance = account.get_account_balance()
-                positions = account.get_positions()
-                all_balances.append(balance)
-                all_positions.extend(positions)
+            if supervisor is not None:
+                results = supervisor.map_snapshots()
+            else:
+                results = pool.map(lambda account: account.get_snapshot())
+            for account, snapshot, error in results:
+                if error is not None:
+                    print(f"{account.account_name} 获取账户信息失败: {str(error)}")
+                    continue
+                all_balances.append(snapshot['balance'])
+                all_positions.extend(snapshot['positions'])
+                if history is not None:
+                    history.record(snapshot)
+                if risk_engine is not None:
+                    risk_engine.load(snapshot['balance'], snapshot['positions'])
+                if alert_rules is not None:
+                    alert_rules.update_positions(account.account_name, snapshot['positions'])
+
+            if not all_balances:
+                raise Exception("所有账户均获取失败")
             
-            # 格式化并发送报告
-            message = notifier.format_daily_report(all_balances, all_positions)
-            notifier.send_message(message)
+            # 分组、排序只做一次，再按通知渠道的模板渲染
+            message = notifier.render_daily_report(Report(all_balances, all_positions))
+            outbox.send_message(message)
         except Exception as e:
             print(f"发送每日报告失败: {str(e)}")
 
     async def run_telegram_handler():
         """运行Telegram消息处理器"""
         if notification_type == 'TELEGRAM':
-            await notifier.start_message_handler(accounts)
+            # 多进程模式下 accounts 为代理，查询由工作进程的账户线程执行
+            await notifier.start_message_handler(accounts, alert_rules, pool)
 
     def start_telegram_handler():
         """在新线程中启动Telegram处理器"""
@@ -71,24 +174,59 @@ def main():
             telegram_thread.start()
 
     # 添加定时任务
-    scheduler.add_interval_task(NOTIFY_INTERVAL, check_positions)
+    if supervisor is not None:
+        # 工作进程各自按配置的方式轮询或推送，主进程定期检查并重启异常退出的工作进程
+        supervisor.start()
+        scheduler.add_interval_task(5, supervisor.check)
+    else:
+        schedule_monitoring(accounts, pool, scheduler, check_account, on_stream_changes)
     scheduler.add_daily_task(DAILY_REPORT_TIME, send_daily_report)
+    if history is not None:
+        # 每小时清理超出保留期的历史数据
+        scheduler.add_interval_task(3600, history.prune)
 
-    # 启动时先执行一次每日报告
-    send_daily_report()
+    # 启动时在后台发送一次每日报告，不推迟监控启动
+    scheduler.submit(send_daily_report)
+
+    # 本地指标接口
+    if METRICS_PORT:
+        try:
+            metrics.start_http_server(METRICS_PORT, METRICS_HOST)
+        except OSError as e:
+            print(f"启动指标接口失败: {str(e)}")
 
     # 如果使用Telegram，启动消息处理器
     if notification_type == 'TELEGRAM':
         start_telegram_handler()
 
     print(f"监控程序已启动...")
-    print(f"- 仓位监控间隔: {NOTIFY_INTERVAL}秒")
+    print(f"- 监控账户: {len(accounts)} 个")
+    if supervisor is not None:
+        print(f"- 工作进程: {supervisor.workers} 个")
+    if POSITION_SOURCE == 'STREAM':
+        print(f"- 仓位监控方式: 实时推送（校准间隔: {RECONCILE_INTERVAL}秒）")
+    elif ADAPTIVE_POLLING:
+        print(f"- 仓位监控间隔: 自适应 {POLL_MIN_INTERVAL:g}-{POLL_MAX_INTERVAL:g}秒（基础 {NOTIFY_INTERVAL}秒）")
+    else:
+        print(f"- 仓位监控间隔: {NOTIFY_INTERVAL}秒")
     print(f"- 每日报告时间: {DAILY_REPORT_TIME}")
     print(f"- 通知方式: {notification_type}")
+    if risk_engine is not None:
+        print(f"- 风险告警: 保证金比率 {RISK_MARGIN_RATIO_LEVELS} 强平距离 {RISK_LIQUIDATION_DISTANCE_LEVELS}")
+    if alert_rules is not None:
+        print(f"- 提醒规则: {len(alert_rules)} 条")
+    if METRICS_PORT:
+        print(f"- 指标接口: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
     print("按 Ctrl+C 可安全退出程序")
 
     # 运行调度器
     scheduler.run()
 
+    if supervisor is not None:
+        supervisor.stop()
+
+    # 退出前发送完剩余通知
+    outbox.stop(timeout=10)
+
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,86 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MarketCache:
+    """多个客户端共享的交易对信息（load_markets 结果），并缓存到磁盘
+
+    - 进程内只下载/解析一次，其余客户端直接共享已加载的交易对
+    - 磁盘缓存未超过 ttl 时重启无需再下载 exchangeInfo
+    - 超过 ttl 后下一次使用时重新下载
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: float = 86400,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.ttl = ttl
+        self._clock = clock
+        self._source = None  # 已加载交易对的交易所实例
+        self._loaded_at = 0.0
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def apply(self, exchange, generation: Optional[int] = None) -> int:
+        """确保 exchange 使用最新的共享交易对信息，返回当前版本号
+
+        传入上次返回的版本号且缓存未过期时直接返回，不加锁。
+        """
+        if generation == self.generation and self._source is not None \
+                and self._clock() - self._loaded_at <= self.ttl:
+            return generation
+        with self._lock:
+            if self._source is None or self._clock() - self._loaded_at > self.ttl:
+                self._refresh(exchange)
+            if exchange is not self._source:
+                exchange.set_markets_from_exchange(self._source)
+            return self.generation
+
+    def _refresh(self, exchange):
+        """优先读取未过期的磁盘缓存，否则从交易所下载"""
+        if self._source is None:
+            cached = self._read_disk()
+            if cached is not None:
+                loaded_at, markets = cached
+                exchange.set_markets(markets)
+                self._source, self._loaded_at = exchange, loaded_at
+                self.generation += 1
+                return
+
+        exchange.load_markets(reload=True)
+        self._source, self._loaded_at = exchange, self._clock()
+        self.generation += 1
+        self._write_disk(exchange.markets)
+
+    def _read_disk(self):
+        if not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if self._clock() - data['loaded_at'] > self.ttl:
+                return None
+            return data['loaded_at'], data['markets']
+        except Exception as e:
+            logger.error(f"读取交易对缓存失败: {e}")
+            return None
+
+    def _write_disk(self, markets):
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # 先写临时文件再替换，避免进程中断留下损坏的缓存；多个工作进程可能同时写入，临时文件按进程区分
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'loaded_at': self._loaded_at, 'markets': markets}, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"写入交易对缓存失败: {e}")
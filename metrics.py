@@ -0,0 +1,256 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 默认耗时分桶（秒），覆盖从本地处理到慢速网络请求
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items) + '}'
+
+
+class Counter:
+    """只增不减的计数器"""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    """可设置的瞬时值，也可以在采集时通过回调读取"""
+
+    def __init__(self, func: Optional[Callable[[], float]] = None):
+        self.value = 0.0
+        self._func = func
+
+    def set(self, value: float):
+        self.value = value
+
+    def get(self) -> float:
+        if self._func is not None:
+            try:
+                return float(self._func())
+            except Exception:
+                return float('nan')
+        return self.value
+
+
+class Histogram:
+    """固定分桶直方图，observe 只做一次二分查找和两次加法"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个为 +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q: float) -> float:
+        """按分桶估算分位数（取所在桶的上界）"""
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+            maximum = self.max
+        if not total:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, maximum)
+        return maximum
+
+
+class MetricsRegistry:
+    """进程内指标注册表，按 (名称, 标签) 复用同一个指标对象，可导出为 Prometheus 文本格式"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Tuple[str, str, Dict]] = {}  # 名称 -> (类型, 说明, {标签: 指标})
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _get(self, kind: str, name: str, help_text: str, labels: Dict[str, str], factory):
+        key = _label_key(labels)
+        family = self._metrics.get(name)
+        if family is not None:
+            metric = family[2].get(key)
+            if metric is not None:
+                return metric
+        with self._lock:
+            family = self._metrics.setdefault(name, (kind, help_text, {}))
+            if family[0] != kind:
+                raise ValueError(f"指标 {name} 已注册为 {family[0]}")
+            return family[2].setdefault(key, factory())
+
+    def counter(self, name: str, help_text: str = '', **labels) -> Counter:
+        return self._get('counter', name, help_text, labels, Counter)
+
+    def gauge(self, name: str, help_text: str = '', func: Optional[Callable[[], float]] = None, **labels) -> Gauge:
+        return self._get('gauge', name, help_text, labels, lambda: Gauge(func))
+
+    def histogram(self, name: str, help_text: str = '', buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+                  **labels) -> Histogram:
+        return self._get('histogram', name, help_text, labels, lambda: Histogram(buckets))
+
+    @contextmanager
+    def timer(self, name: str, help_text: str = '', **labels):
+        """统计代码块耗时（秒），代码块抛出异常时额外计入失败次数（xxx_seconds -> xxx_errors_total）"""
+        histogram = self.histogram(name, help_text, **labels)
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            base = name[:-len('_seconds')] if name.endswith('_seconds') else name
+            self.counter(f"{base}_errors_total", '失败次数', **labels).inc()
+            raise
+        finally:
+            histogram.observe(time.perf_counter() - started)
+
+    def render(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            families = [(name, kind, help_text, list(metrics.items()))
+                        for name, (kind, help_text, metrics) in sorted(self._metrics.items())]
+        for name, kind, help_text, metrics in families:
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in metrics:
+                if kind == 'counter':
+                    lines.append(f"{name}{_format_labels(labels)} {metric.value}")
+                elif kind == 'gauge':
+                    lines.append(f"{name}{_format_labels(labels)} {metric.get()}")
+                else:
+                    with metric._lock:
+                        counts = list(metric.counts)
+                        total, count = metric.sum, metric.count
+                    cumulative = 0
+                    for bound, bucket_count in zip(metric.buckets + (float('inf'),), counts):
+                        cumulative += bucket_count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f"{name}_bucket{_format_labels(labels, ('le', le))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def histograms(self) -> List[Tuple[str, Dict[str, str], Histogram]]:
+        """所有直方图，用于生成可读的统计摘要"""
+        with self._lock:
+            return [
+                (name, dict(labels), metric)
+                for name, (kind, _, metrics) in sorted(self._metrics.items()) if kind == 'histogram'
+                for labels, metric in metrics.items()
+            ]
+
+    def value(self, name: str, **labels) -> Optional[float]:
+        """读取计数器或瞬时值，不存在时返回 None"""
+        family = self._metrics.get(name)
+        if family is None:
+            return None
+        metric = family[2].get(_label_key(labels))
+        if metric is None:
+            return None
+        return metric.get() if isinstance(metric, Gauge) else metric.value
+
+    def values(self, name: str) -> List[Tuple[Dict[str, str], float]]:
+        """读取某个计数器或瞬时值的所有标签组合"""
+        family = self._metrics.get(name)
+        if family is None:
+            return []
+        with self._lock:
+            items = list(family[2].items())
+        return [(dict(labels), metric.get() if isinstance(metric, Gauge) else metric.value)
+                for labels, metric in items]
+
+    def start_http_server(self, port: int, host: str = '127.0.0.1'):
+        """在后台线程中提供 /metrics 接口"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True).start()
+        return self._server
+
+    def stop_http_server(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def instrument_exchange(exchange, account: str, registry: Optional['MetricsRegistry'] = None):
+    """包装 ccxt 的 exchange.request：按接口统计耗时、失败次数、请求权重和 X-MBX-USED-WEIGHT-1M"""
+    registry = registry or metrics
+    request = getattr(exchange, 'request', None)
+    if request is None:
+        return exchange
+    used_weight = registry.gauge('binance_used_weight_1m', '最近一次响应头中的每分钟已用权重（按 IP 统计）',
+                                 account=account)
+
+    def instrumented(path, api='public', method='GET', *args, **kwargs):
+        endpoint = f"{api}/{path}"
+        config = kwargs.get('config') or (args[3] if len(args) > 3 else None) or {}
+        registry.counter('binance_request_cost_total', 'ccxt 记录的接口权重累计',
+                         account=account, endpoint=endpoint).inc(config.get('cost', 1))
+        with registry.timer('binance_request_seconds', '交易所接口耗时（秒）', account=account, endpoint=endpoint):
+            try:
+                return request(path, api, method, *args, **kwargs)
+            finally:
+                headers = getattr(exchange, 'last_response_headers', None) or {}
+                value = headers.get('X-MBX-USED-WEIGHT-1M') or headers.get('x-mbx-used-weight-1m')
+                if value is not None:
+                    used_weight.set(float(value))
+
+    exchange.request = instrumented
+    return exchange
+
+
+# 进程内共享的指标注册表
+metrics = MetricsRegistry()
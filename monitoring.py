@@ -0,0 +1,107 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+from account_pool import AccountPool
+from binance_client import BinanceClient, SubAccountAggregator, SubAccountExchange
+from config import (
+    NOTIFY_INTERVAL, POSITION_SOURCE, RECONCILE_INTERVAL, USER_STREAM_URL, ADAPTIVE_POLLING,
+    POLL_MIN_INTERVAL, POLL_MAX_INTERVAL, WEIGHT_LIMIT, WEIGHT_BUDGET, ACCOUNT_ENDPOINT,
+    POSITION_WATCHLIST, SUB_ACCOUNT_NAMES, TRADE_HISTORY_LOOKBACK
+)
+from market_cache import MarketCache
+from metrics import metrics
+from polling import AdaptiveInterval
+from scheduler import TaskScheduler
+from state_store import PositionStateStore
+from trade_history import TradeHistoryStore
+from user_stream import UserDataStream
+
+
+def create_accounts(configs: List[Dict], state_store: Optional[PositionStateStore] = None,
+                    market_cache: Optional[MarketCache] = None,
+                    trade_store: Optional[TradeHistoryStore] = None,
+                    sub_accounts: bool = False) -> Tuple[List[BinanceClient], Dict[str, Dict]]:
+    """按账户配置创建客户端，返回 (客户端列表, 各账户限速设置)
+
+    sub_accounts 为真时，第一个账户作为母账户，通过其批量接口追加所有子账户。
+    """
+    accounts = []
+    limits = {}
+    for config in configs:
+        config = dict(config)
+        limits[config['name']] = config.pop('limits', {})
+        accounts.append(BinanceClient(
+            config, state_store=state_store, market_cache=market_cache,
+            account_endpoint=ACCOUNT_ENDPOINT, watchlist=POSITION_WATCHLIST,
+            trade_store=trade_store, trade_lookback=TRADE_HISTORY_LOOKBACK
+        ))
+    if sub_accounts and accounts:
+        # 子账户由母账户（第一个账户）的批量接口提供，请求数不随子账户数量线性增长
+        aggregator = SubAccountAggregator(accounts[0].exchange)
+        sub_account_names = SUB_ACCOUNT_NAMES
+        if not sub_account_names:
+            try:
+                sub_account_names = {email: email for email in aggregator.emails()}
+            except Exception as e:
+                print(f"获取子账户列表失败: {str(e)}")
+        for email, name in sub_account_names.items():
+            accounts.append(BinanceClient(
+                {'name': name}, exchange=SubAccountExchange(aggregator, email), state_store=state_store,
+                market_cache=market_cache, account_endpoint='v2', watchlist=POSITION_WATCHLIST
+            ))
+    return accounts, limits
+
+
+def timed_check(account: BinanceClient) -> Dict:
+    """检查单个账户的仓位变化并记录耗时"""
+    with metrics.timer('account_check_seconds', '单个账户一次仓位检查的耗时（秒）', account=account.account_name):
+        return account.check_position_changes()
+
+
+def schedule_monitoring(accounts: List[BinanceClient], pool: AccountPool, scheduler: TaskScheduler,
+                        check_account: Callable[[BinanceClient], Dict],
+                        on_stream_changes: Callable[[BinanceClient, Dict], None]):
+    """按仓位数据来源（推送、自适应轮询或固定间隔轮询）为账户添加监控任务"""
+
+    def check_positions():
+        """并发检查所有账户的仓位变化并发送通知"""
+        for account, _, error in pool.map(check_account):
+            if error is not None:
+                print(f"{account.account_name} 检查仓位失败: {str(error)}")
+
+    def add_adaptive_poll(account):
+        """为账户添加自适应间隔的轮询任务"""
+        policy = AdaptiveInterval(
+            NOTIFY_INTERVAL, POLL_MIN_INTERVAL, POLL_MAX_INTERVAL,
+            weight_limit=WEIGHT_LIMIT, weight_budget=WEIGHT_BUDGET
+        )
+
+        def poll():
+            try:
+                changes = pool.call(account, check_account)
+            except Exception as e:
+                print(f"{account.account_name} 检查仓位失败: {str(e)}")
+                changes = None
+            has_positions = bool(account.last_snapshot and account.last_snapshot['positions'])
+            policy.observe(changes, has_positions, account.used_weight())
+
+        scheduler.add_interval_task(lambda: policy.current, poll, name=f"check_positions:{account.account_name}")
+
+    if POSITION_SOURCE == 'STREAM':
+        # 推送模式：先并发用 REST 建立仓位快照，之后由用户数据流实时推送，REST 仅用于定期校准
+        check_positions()
+        for account in accounts:
+            if account.supports_user_stream:
+                UserDataStream(account, on_stream_changes, base_url=USER_STREAM_URL).start()
+            else:
+                # 母账户批量接口提供的子账户没有自己的用户数据流，改为轮询
+                add_adaptive_poll(account)
+        scheduler.add_interval_task(RECONCILE_INTERVAL, check_positions)
+    elif ADAPTIVE_POLLING:
+        # 自适应轮询：每个账户一个独立任务，间隔根据活跃度和权重占用调整
+        for account in accounts:
+            add_adaptive_poll(account)
+    else:
+        scheduler.add_interval_task(NOTIFY_INTERVAL, check_positions)
+    if POSITION_SOURCE != 'STREAM':
+        # 轮询模式：启动后立即在后台并发检查一次，建立仓位基线
+        scheduler.submit(check_positions)
@@ -0,0 +1,49 @@
+import time
+from typing import Callable, Dict, Optional
+
+
+class AdaptiveInterval:
+    """根据账户活跃度和 API 权重占用动态调整单个账户的轮询间隔
+
+    - 最近有仓位变化：收紧到最小间隔
+    - 有持仓但没有变化：使用基础间隔
+    - 空仓：逐步退避到最大间隔
+    - 已用权重超过预算比例时按比例拉长间隔
+    """
+
+    def __init__(self, base: float, min_interval: float, max_interval: float,
+                 backoff: float = 1.5, recent_window: float = 300,
+                 weight_limit: int = 2400, weight_budget: float = 0.5,
+                 clock: Callable[[], float] = time.monotonic):
+        self.base = base
+        self.min_interval = min(min_interval, base)
+        self.max_interval = max(max_interval, base)
+        self.backoff = backoff
+        self.recent_window = recent_window
+        self.weight_limit = weight_limit
+        self.weight_budget = weight_budget
+        self._clock = clock
+        self._last_change = None
+        self.current = base
+
+    def observe(self, changes: Optional[Dict], has_positions: bool, used_weight: Optional[int] = None) -> float:
+        """根据本次轮询结果计算下一次间隔"""
+        now = self._clock()
+        if changes and (changes['new_positions'] or changes['closed_positions'] or changes['modified_positions']):
+            self._last_change = now
+
+        if self._last_change is not None and now - self._last_change < self.recent_window:
+            interval = self.min_interval
+        elif has_positions:
+            interval = self.base
+        else:
+            interval = min(max(self.current, self.base) * self.backoff, self.max_interval)
+
+        # 权重占用超出预算时按比例放慢（权重按 IP 每分钟统计，所有账户共享）
+        if used_weight is not None and self.weight_limit:
+            usage = used_weight / self.weight_limit
+            if usage > self.weight_budget:
+                interval = min(interval * usage / self.weight_budget, self.max_interval)
+
+        self.current = interval
+        return interval
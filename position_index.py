@@ -0,0 +1,94 @@
+import threading
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 仓位簿中的紧凑记录：比较只用数值字段，data 保留完整持仓信息用于通知
+PositionRecord = namedtuple('PositionRecord', ['contracts', 'entry_price', 'margin', 'data'])
+
+# 持仓键：双向持仓模式下同一交易对的多头和空头是两个独立持仓
+PositionKey = namedtuple('PositionKey', ['account', 'symbol', 'side'])
+
+
+class PositionIndex:
+    """以 (账户, 交易对, 方向) 为键的持仓索引，支持增量更新和按基础货币反查
+
+    每个账户的持仓单独存放，更新和比较只涉及变动的键，耗时与持仓数量成线性关系。
+    """
+
+    def __init__(self):
+        self._books: Dict[str, Dict[Tuple[str, str], PositionRecord]] = {}
+        self._by_base: Dict[str, set] = {}  # 基础货币 -> PositionKey 集合
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(book) for book in self._books.values())
+
+    def get(self, account: str, symbol: str, side: str) -> Optional[PositionRecord]:
+        with self._lock:
+            return self._books.get(account, {}).get((symbol, side))
+
+    def positions(self, account: str) -> Dict[Tuple[str, str], PositionRecord]:
+        """账户当前持仓的副本，键为 (交易对, 方向)"""
+        with self._lock:
+            return dict(self._books.get(account, {}))
+
+    def keys(self, account: str) -> set:
+        with self._lock:
+            return set(self._books.get(account, {}))
+
+    def accounts(self) -> List[str]:
+        with self._lock:
+            return [account for account, book in self._books.items() if book]
+
+    def lookup_base(self, base_currency: str) -> List[Tuple[PositionKey, PositionRecord]]:
+        """按基础货币（如 BTC）查找所有账户、所有方向的持仓"""
+        with self._lock:
+            return [
+                (key, self._books[key.account][(key.symbol, key.side)])
+                for key in sorted(self._by_base.get(base_currency, ()))
+            ]
+
+    def sync(self, account: str, current: Dict[Tuple[str, str], PositionRecord]):
+        """用完整快照替换账户持仓，返回 (新开仓, 修改, 平仓)"""
+        with self._lock:
+            removed = [key for key in self._books.get(account, {}) if key not in current]
+            return self.update(account, current, removed)
+
+    def update(self, account: str, upserts: Dict[Tuple[str, str], PositionRecord],
+               removals: Iterable[Tuple[str, str]] = ()):
+        """增量更新账户持仓，返回 (新开仓, 修改, 平仓)
+
+        新开仓和平仓为 [(键, 记录)]，修改为 [(键, 旧记录, 新记录)]；
+        只比较数量和开仓均价，其余字段（时间戳、未实现盈亏等）只刷新不算修改。
+        """
+        opened, modified, closed = [], [], []
+        with self._lock:
+            book = self._books.setdefault(account, {})
+            for key, record in upserts.items():
+                old = book.get(key)
+                book[key] = record
+                if old is None:
+                    opened.append((key, record))
+                    self._by_base.setdefault(self._base(key[0]), set()).add(PositionKey(account, *key))
+                elif old.contracts != record.contracts or old.entry_price != record.entry_price:
+                    modified.append((key, old, record))
+            for key in removals:
+                if key in upserts:
+                    continue
+                old = book.pop(key, None)
+                if old is None:
+                    continue
+                closed.append((key, old))
+                base = self._base(key[0])
+                keys = self._by_base.get(base)
+                if keys is not None:
+                    keys.discard(PositionKey(account, *key))
+                    if not keys:
+                        del self._by_base[base]
+        return opened, modified, closed
+
+    @staticmethod
+    def _base(symbol: str) -> str:
+        """BTC/USDT:USDT -> BTC"""
+        return symbol.split('/')[0]
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Set
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+# 全市场标记价格推送（每秒一次）
+MARK_PRICE_STREAM_URL = 'wss://fstream.binance.com/ws/!markPrice@arr@1s'
+
+
+class MarkPriceCache:
+    """进程内共享的标记价格缓存：由 !markPrice@arr 推送更新，缺失或过期时批量走 REST
+
+    以交易所原始交易对（如 BTCUSDT）为键，只保存被跟踪（当前持有）的交易对。
+    """
+
+    def __init__(self, ttl: float = 10, clock: Callable[[], float] = time.time):
+        self.ttl = ttl
+        self._clock = clock
+        self._prices: Dict[str, tuple] = {}  # market_id -> (价格, 更新时间)
+        self._owners: Dict[str, Set[str]] = {}  # 跟踪方 -> market_id 集合
+        self._tracked: Set[str] = set()
+        self._lock = threading.Lock()
+        self.connected = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._listeners = []
+
+    def add_listener(self, callback: Callable[[Dict[str, float]], None]):
+        """订阅被跟踪交易对的价格变化，每批推送调用一次，参数为 {market_id: 价格}（只含有变化的交易对）"""
+        self._listeners.append(callback)
+
+    def _publish(self, changed: Dict[str, float]):
+        for callback in self._listeners:
+            try:
+                callback(changed)
+            except Exception as e:
+                logger.error(f"标记价格订阅方处理失败: {e}")
+
+    def track(self, owner: str, market_ids: Iterable[str]):
+        """设置某个跟踪方（通常是账户）当前需要的交易对"""
+        with self._lock:
+            self._owners[owner] = set(market_ids)
+            self._tracked = set().union(*self._owners.values())
+            # 不再跟踪且已过期的交易对直接丢弃（刚平仓的交易对仍可读取最后价格）
+            now = self._clock()
+            for market_id, (_, updated) in list(self._prices.items()):
+                if market_id not in self._tracked and now - updated > self.ttl:
+                    del self._prices[market_id]
+
+    def update(self, market_id: str, price: float, timestamp: Optional[float] = None):
+        """写入一条价格（只保存被跟踪的交易对）"""
+        if market_id in self._tracked:
+            previous = self._prices.get(market_id)
+            self._prices[market_id] = (price, self._clock() if timestamp is None else timestamp)
+            if self._listeners and (previous is None or previous[0] != price):
+                self._publish({market_id: price})
+
+    def get(self, market_id: str, max_age: Optional[float] = None) -> Optional[float]:
+        """读取价格，超过有效期返回 None"""
+        entry = self._prices.get(market_id)
+        if entry is None:
+            return None
+        price, updated = entry
+        if self._clock() - updated > (self.ttl if max_age is None else max_age):
+            return None
+        return price
+
+    def get_many(self, market_ids: Iterable[str],
+                 fetcher: Optional[Callable[[Set[str]], Dict[str, float]]] = None,
+                 max_age: Optional[float] = None) -> Dict[str, float]:
+        """批量读取价格，缺失或过期的交易对通过 fetcher 一次性补齐"""
+        result = {}
+        missing = set()
+        for market_id in market_ids:
+            price = self.get(market_id, max_age)
+            if price is None:
+                missing.add(market_id)
+            else:
+                result[market_id] = price
+
+        if missing and fetcher is not None:
+            fetched = fetcher(missing)
+            now = self._clock()
+            for market_id, price in fetched.items():
+                if market_id in missing:
+                    result[market_id] = price
+                    if market_id in self._tracked:
+                        self._prices[market_id] = (price, now)
+        return result
+
+    def start(self, url: str = MARK_PRICE_STREAM_URL, max_backoff: int = 60):
+        """在后台线程中订阅标记价格推送"""
+        self._thread = threading.Thread(
+            target=lambda: asyncio.run(self._run(url, max_backoff)),
+            name='mark-price-stream',
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """停止推送订阅"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    async def _run(self, url: str, max_backoff: int):
+        backoff = 1
+        while not self._stopping.is_set():
+            try:
+                async with websockets.connect(url) as ws:
+                    self.connected.set()
+                    backoff = 1
+                    while not self._stopping.is_set():
+                        try:
+                            raw = await asyncio.wait_for(ws.recv(), timeout=1)
+                        except asyncio.TimeoutError:
+                            continue
+                        self._handle_message(raw)
+            except Exception as e:
+                logger.error(f"标记价格推送连接异常: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, max_backoff)
+            finally:
+                self.connected.clear()
+
+    def _handle_message(self, raw):
+        """处理一批标记价格推送"""
+        events = json.loads(raw)
+        if isinstance(events, dict):
+            events = [events]
+        tracked = self._tracked
+        prices = self._prices
+        now = self._clock()
+        changed = {}
+        for event in events:
+            market_id = event.get('s')
+            if market_id in tracked:
+                price = float(event['p'])
+                previous = prices.get(market_id)
+                prices[market_id] = (price, now)
+                if previous is None or previous[0] != price:
+                    changed[market_id] = price
+        if changed and self._listeners:
+            self._publish(changed)
+
+
+# 进程内共享的标记价格缓存
+mark_prices = MarkPriceCache()
@@ -0,0 +1,40 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """令牌桶限速器：每秒补充 rate 个令牌，最多累积 capacity 个"""
+
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """尝试取出令牌，成功返回 0，否则返回需要等待的秒数"""
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1, stop: threading.Event = None):
+        """阻塞直到取得令牌（stop 被设置时提前返回 False）"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return True
+            if stop is not None:
+                if stop.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
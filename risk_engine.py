@@ -0,0 +1,281 @@
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 快照中没有维持保证金时使用的维持保证金率（币安 U 本位合约最低档）
+DEFAULT_MAINT_RATE = 0.004
+
+
+def alert_level(value: float, thresholds: Tuple[float, ...], current: int, hysteresis: float) -> int:
+    """按阈值计算告警级别（0 为正常），已触发的级别需回落超过 hysteresis 比例才解除
+
+    thresholds 按严重程度递增排列，数值越大越危险；越小越危险的指标传入相反数。
+    """
+    level = 0
+    for i, threshold in enumerate(thresholds):
+        limit = threshold - abs(threshold) * hysteresis if i < current else threshold
+        if value < limit:
+            break
+        level = i + 1
+    return level
+
+
+class _Account:
+    """账户的全仓保证金余额和维持保证金，随标记价格增量更新"""
+
+    __slots__ = ('name', 'balance', 'maint', 'level', 'exposures')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.balance = 0.0  # 全仓保证金余额（全仓钱包余额 + 全仓未实现盈亏）
+        self.maint = 0.0    # 全仓维持保证金
+        self.level = 0
+        self.exposures: List['_Exposure'] = []
+
+    @property
+    def margin_ratio(self) -> float:
+        """保证金比率 = 维持保证金 / 保证金余额，达到 100% 时强平"""
+        if self.balance <= 0:
+            return float('inf') if self.maint > 0 or self.balance < 0 else 0.0
+        return self.maint / self.balance
+
+
+class _Exposure:
+    """一个账户在一个交易对上的风险敞口：全仓持仓按交易对合并，逐仓持仓各自独立
+
+    delta 为价格每变动 1 时的盈亏（Σ 方向 × 数量），maint 为维持保证金对价格的斜率（Σ 维持保证金率 × 数量）。
+    """
+
+    __slots__ = ('account', 'key', 'market_id', 'base_currency', 'sides', 'delta', 'maint',
+                 'isolated_balance', 'price', 'level')
+
+    def __init__(self, account: _Account, key: Tuple, market_id: str, base_currency: str, price: float,
+                 isolated_balance: Optional[float] = None):
+        self.account = account
+        self.key = key
+        self.market_id = market_id
+        self.base_currency = base_currency
+        self.sides: List[str] = []
+        self.delta = 0.0
+        self.maint = 0.0
+        self.isolated_balance = isolated_balance  # 逐仓保证金余额，全仓为 None
+        self.price = price
+        self.level = 0
+
+    def liquidation(self) -> Tuple[Optional[float], float]:
+        """返回 (强平价格, 距强平的价格比例)，其他交易对价格不变时价格单向变动到强平价即触发强平"""
+        if self.isolated_balance is None:
+            buffer = self.account.balance - self.account.maint
+        else:
+            buffer = self.isolated_balance - self.maint * self.price
+        slope = self.delta - self.maint
+        if not slope:
+            return None, float('inf')
+        if buffer <= 0:
+            return self.price, 0.0
+        liquidation_price = self.price - buffer / slope
+        if liquidation_price <= 0:
+            return None, float('inf')
+        return liquidation_price, buffer / (abs(slope) * self.price)
+
+
+class RiskEngine:
+    """按标记价格增量计算保证金比率和强平距离，超过阈值时告警（带滞回，避免在阈值附近反复通知）
+
+    账户快照（余额、持仓、维持保证金）在每次轮询或推送后载入，之后每次标记价格推送只处理
+    价格有变化的交易对：按价格变动量更新所在账户的保证金余额和维持保证金，再重新计算这些交易对的
+    强平距离；其他交易对的强平距离在其下一次价格推送时刷新。
+    """
+
+    def __init__(self, notify: Callable[[List[Dict]], None],
+                 margin_ratio_levels: Iterable[float] = (0.5, 0.8),
+                 distance_levels: Iterable[float] = (0.1, 0.05),
+                 hysteresis: float = 0.2):
+        self.notify = notify
+        self.margin_ratio_levels = tuple(sorted(margin_ratio_levels))
+        # 强平距离越小越危险：取相反数后与保证金比率使用同一套级别判断
+        self._distance_levels = tuple(sorted(-level for level in distance_levels))
+        self.hysteresis = hysteresis
+        self._accounts: Dict[str, _Account] = {}
+        self._wallets: Dict[str, float] = {}
+        self._maint_rates: Dict[Tuple[str, str, str], float] = {}
+        self._by_market: Dict[str, List[_Exposure]] = {}
+        self._levels: Dict[Tuple, int] = {}  # 告警级别，重新载入快照后保持
+        self._lock = threading.Lock()
+
+    def load(self, balance: Dict, positions: List[Dict]):
+        """载入账户快照（余额和持仓），并按快照时的价格检查一次"""
+        self._wallets[balance['account_name']] = balance.get('wallet_balance', balance['total_balance'])
+        self.update_positions(balance['account_name'], positions)
+
+    def update_positions(self, account_name: str, positions: List[Dict]):
+        """持仓变化（推送）后重建账户的敞口，钱包余额沿用最近一次快照"""
+        wallet = self._wallets.get(account_name)
+        if wallet is None:
+            return
+        with self._lock:
+            account = self._rebuild(account_name, wallet, positions)
+            alerts = self._evaluate_account(account)
+            for exposure in account.exposures:
+                self._evaluate_exposure(exposure, alerts)
+        self._send(alerts)
+
+    def on_prices(self, prices: Dict[str, float]):
+        """标记价格推送：只处理有敞口且价格变化的交易对"""
+        alerts = []
+        with self._lock:
+            touched = []
+            accounts = set()
+            by_market = self._by_market
+            for market_id, price in prices.items():
+                exposures = by_market.get(market_id)
+                if not exposures:
+                    continue
+                for exposure in exposures:
+                    change = price - exposure.price
+                    if not change:
+                        continue
+                    exposure.price = price
+                    if exposure.isolated_balance is None:
+                        account = exposure.account
+                        account.balance += exposure.delta * change
+                        account.maint += exposure.maint * change
+                        accounts.add(account)
+                    else:
+                        exposure.isolated_balance += exposure.delta * change
+                    touched.append(exposure)
+            # 先更新完整批价格，再用更新后的账户余额计算
+            for account in accounts:
+                self._evaluate_account(account, alerts)
+            for exposure in touched:
+                self._evaluate_exposure(exposure, alerts)
+        self._send(alerts)
+
+    def margin_ratio(self, account_name: str) -> Optional[float]:
+        with self._lock:
+            account = self._accounts.get(account_name)
+            return account.margin_ratio if account is not None else None
+
+    def liquidation(self, account_name: str, market_id: str) -> List[Tuple[Tuple, Optional[float], float]]:
+        """返回账户在交易对上各敞口的 (键, 强平价格, 强平距离)"""
+        with self._lock:
+            return [
+                (exposure.key,) + exposure.liquidation()
+                for exposure in self._by_market.get(market_id, ()) if exposure.account.name == account_name
+            ]
+
+    def _rebuild(self, account_name: str, wallet: float, positions: List[Dict]) -> _Account:
+        """用持仓列表重建账户敞口（全量计算，消除增量更新累积的浮点误差）"""
+        old = self._accounts.get(account_name)
+        if old is not None:
+            for exposure in old.exposures:
+                exposures = self._by_market[exposure.market_id]
+                exposures.remove(exposure)
+                if not exposures:
+                    del self._by_market[exposure.market_id]
+        account = _Account(account_name)
+        account.level = self._levels.get((account_name,), 0)
+        cross = {}
+        isolated_wallets = 0.0
+        for position in positions:
+            # BTC/USDT:USDT -> BTCUSDT（与标记价格推送的交易对一致）
+            market_id = position['symbol'].split(':')[0].replace('/', '')
+            side = position['side']
+            sign = 1.0 if side == 'long' else -1.0
+            quantity = float(position['contracts'])
+            if not quantity:
+                continue
+            # 快照对应的标记价格：未实现盈亏 = 方向 × 数量 × (标记价格 - 开仓均价)
+            price = float(position['entryPrice']) + float(position['unrealizedPnl']) / (sign * quantity)
+            rate_key = (account_name, market_id, side)
+            maint_margin = position.get('maintMargin')
+            if maint_margin and price > 0:
+                rate = self._maint_rates[rate_key] = float(maint_margin) / (quantity * price)
+            else:
+                rate = self._maint_rates.get(rate_key, DEFAULT_MAINT_RATE)
+
+            isolated_wallet = float(position.get('isolatedWallet') or 0)
+            if isolated_wallet:
+                isolated_wallets += isolated_wallet
+                exposure = _Exposure(account, (account_name, market_id, side), market_id,
+                                     position['base_currency'], price,
+                                     isolated_wallet + float(position['unrealizedPnl']))
+                account.exposures.append(exposure)
+            else:
+                exposure = cross.get(market_id)
+                if exposure is None:
+                    exposure = cross[market_id] = _Exposure(
+                        account, (account_name, market_id), market_id, position['base_currency'], price
+                    )
+                    account.exposures.append(exposure)
+                account.balance += float(position['unrealizedPnl'])
+                account.maint += rate * quantity * price
+            exposure.sides.append(side)
+            exposure.delta += sign * quantity
+            exposure.maint += rate * quantity
+        account.balance += wallet - isolated_wallets
+
+        # 已平仓的敞口不再保留告警级别
+        keys = {exposure.key for exposure in account.exposures}
+        for key in [key for key in self._levels if len(key) > 1 and key[0] == account_name and key not in keys]:
+            del self._levels[key]
+        for exposure in account.exposures:
+            exposure.level = self._levels.get(exposure.key, 0)
+            self._by_market.setdefault(exposure.market_id, []).append(exposure)
+        self._accounts[account_name] = account
+        return account
+
+    def _evaluate_account(self, account: _Account, alerts: Optional[List[Dict]] = None) -> List[Dict]:
+        alerts = alerts if alerts is not None else []
+        ratio = account.margin_ratio
+        if not account.level and (not self.margin_ratio_levels or ratio < self.margin_ratio_levels[0]):
+            return alerts
+        level = alert_level(ratio, self.margin_ratio_levels, account.level, self.hysteresis)
+        if level != account.level:
+            if level > account.level or level == 0:
+                alerts.append({
+                    'type': 'margin_ratio',
+                    'account_name': account.name,
+                    'level': level,
+                    'levels': len(self.margin_ratio_levels),
+                    'margin_ratio': ratio,
+                    'threshold': self.margin_ratio_levels[max(level, account.level) - 1],
+                    'margin_balance': account.balance,
+                    'maint_margin': account.maint,
+                })
+            account.level = self._levels[(account.name,)] = level
+        return alerts
+
+    def _evaluate_exposure(self, exposure: _Exposure, alerts: List[Dict]):
+        liquidation_price, distance = exposure.liquidation()
+        # 大部分敞口离所有阈值都很远：跳过级别计算
+        if not exposure.level and (not self._distance_levels or -distance < self._distance_levels[0]):
+            return
+        level = alert_level(-distance, self._distance_levels, exposure.level, self.hysteresis)
+        if level == exposure.level:
+            return
+        if level > exposure.level or level == 0:
+            alerts.append({
+                'type': 'liquidation',
+                'account_name': exposure.account.name,
+                'base_currency': exposure.base_currency,
+                'side': '/'.join(exposure.sides),
+                'isolated': exposure.isolated_balance is not None,
+                'level': level,
+                'levels': len(self._distance_levels),
+                'distance': distance,
+                'threshold': -self._distance_levels[max(level, exposure.level) - 1],
+                'mark_price': exposure.price,
+                'liquidation_price': liquidation_price,
+            })
+        exposure.level = self._levels[exposure.key] = level
+
+    def _send(self, alerts: List[Dict]):
+        if not alerts:
+            return
+        try:
+            self.notify(alerts)
+        except Exception as e:
+            logger.error(f"发送风险告警失败: {e}")
@@ -1,53 +1,197 @@
-import schedule
-import time
+import heapq
+import itertools
 import signal
-from datetime import datetime
-from typing import Callable
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Union
+
+from metrics import metrics
+
+
+class Job:
+    """调度任务及其运行统计"""
+
+    def __init__(self, name: str, task: Callable,
+                 interval: Union[float, Callable[[], float], None] = None,
+                 daily_time: Optional[str] = None):
+        self.name = name
+        self.task = task
+        # 间隔可以是固定秒数，也可以是每次调度时计算间隔的函数
+        self.interval = interval
+        self.daily_time = daily_time
+        self.daily_target = None  # 每日任务最近一次对应的本地时间
+        self.deadline = 0.0
+        self.running = False
+        # 运行统计（秒）
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.last_lateness = 0.0
+        self.max_lateness = 0.0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+
+    def stats(self) -> Dict:
+        return {
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'failures': self.failures,
+            'running': self.running,
+            'last_lateness': self.last_lateness,
+            'max_lateness': self.max_lateness,
+            'last_duration': self.last_duration,
+            'max_duration': self.max_duration,
+        }
+
 
 class TaskScheduler:
-    def __init__(self):
+    """基于最小堆的调度器：按单调时钟精确休眠到下一个截止时间，任务在线程池中执行
+
+    - 间隔任务按固定节拍调度（下次截止时间 = 上次截止时间 + 间隔），不随执行耗时漂移
+    - 同一任务上一次尚未结束时跳过本次，避免重叠执行
+    - 各任务互不阻塞，例如卡住的仓位检查不会推迟每日报告
+    """
+
+    def __init__(self, max_workers: int = 4, clock: Callable[[], float] = time.monotonic,
+                 wall_clock: Callable[[], datetime] = datetime.now, executor=None,
+                 handle_signals: bool = True):
         self.jobs = []
         self.running = True
-        
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scheduler')
+
         # 注册信号处理
-        signal.signal(signal.SIGINT, self._handle_signal)
-        signal.signal(signal.SIGTERM, self._handle_signal)
-    
+        if handle_signals:
+            signal.signal(signal.SIGINT, self._handle_signal)
+            signal.signal(signal.SIGTERM, self._handle_signal)
+
     def _handle_signal(self, signum, frame):
         """处理退出信号"""
         print("\n正在安全退出程序...")
         self.running = False
-    
-    def add_interval_task(self, interval: int, task: Callable):
-        """添加间隔执行的任务"""
-        def job():
-            try:
-                task()
-            except Exception as e:
-                print(f"执行定时任务失败: {str(e)}")
-        
-        schedule.every(interval).seconds.do(job)
-        self.jobs.append(job)
-
-    def add_daily_task(self, time: str, task: Callable):
-        """添加每日定时任务"""
-        def job():
+
+    def add_interval_task(self, interval: Union[float, Callable[[], float]], task: Callable,
+                          name: Optional[str] = None) -> Job:
+        """添加间隔执行的任务（首次在一个间隔后执行），interval 为函数时每次调度重新计算"""
+        job = Job(name or getattr(task, '__name__', 'interval_task'), task, interval=interval)
+        self._schedule(job, self._clock() + self._interval(job))
+        return job
+
+    def add_daily_task(self, time: str, task: Callable, name: Optional[str] = None) -> Job:
+        """添加每日定时任务（time 为本地时间 HH:MM）"""
+        job = Job(name or getattr(task, '__name__', 'daily_task'), task, daily_time=time)
+        self._schedule(job, self._next_daily_deadline(job))
+        return job
+
+    def submit(self, task: Callable, name: Optional[str] = None) -> Job:
+        """立即在线程池中执行一次任务（不阻塞调用方）"""
+        job = Job(name or getattr(task, '__name__', 'once_task'), task)
+        self._dispatch(job, 0.0)
+        return job
+
+    def stats(self) -> Dict[str, Dict]:
+        """各任务的运行次数、跳过次数、延迟和耗时"""
+        return {job.name: job.stats() for job in self.jobs}
+
+    def _schedule(self, job: Job, deadline: float):
+        with self._lock:
+            if job not in self.jobs:
+                self.jobs.append(job)
+            job.deadline = deadline
+            heapq.heappush(self._heap, (deadline, next(self._counter), job))
+        self._wakeup.set()
+
+    def _next_daily_deadline(self, job: Job) -> float:
+        """将下一次本地时间 HH:MM 换算为单调时钟的截止时间"""
+        hour, minute = map(int, job.daily_time.split(':'))
+        now = self._wall_clock()
+        target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        # 墙上时钟被回拨时也不会在同一天重复执行
+        while target <= now or (job.daily_target is not None and target <= job.daily_target):
+            target += timedelta(days=1)
+        job.daily_target = target
+        return self._clock() + (target - now).total_seconds()
+
+    @staticmethod
+    def _interval(job: Job) -> float:
+        return job.interval() if callable(job.interval) else job.interval
+
+    def _next_deadline(self, job: Job, now: float) -> float:
+        """计算任务的下一次截止时间"""
+        if job.daily_time is not None:
+            return self._next_daily_deadline(job)
+        interval = self._interval(job)
+        deadline = job.deadline + interval
+        # 落后超过一个间隔时跳过错过的节拍，而不是连续补跑
+        if deadline <= now:
+            missed = int((now - deadline) // interval) + 1
+            job.skipped += missed
+            deadline += missed * interval
+        return deadline
+
+    def run_pending(self) -> Optional[float]:
+        """执行所有已到期的任务，返回距离下一个截止时间的秒数"""
+        while True:
+            with self._lock:
+                if not self._heap:
+                    return None
+                deadline, _, job = self._heap[0]
+                now = self._clock()
+                if deadline > now:
+                    return deadline - now
+                heapq.heappop(self._heap)
+
+            if job.running:
+                # 上一次还没执行完，跳过本次
+                job.skipped += 1
+                metrics.counter('scheduler_skipped_total', '因上一次未结束而跳过的次数', job=job.name).inc()
+            else:
+                self._dispatch(job, now - deadline)
+            self._schedule(job, self._next_deadline(job, now))
+
+    def _dispatch(self, job: Job, lateness: float):
+        """提交任务到线程池执行"""
+        job.running = True
+        job.last_lateness = lateness
+        job.max_lateness = max(job.max_lateness, lateness)
+        metrics.histogram('scheduler_lateness_seconds', '任务实际开始时间相对截止时间的延迟（秒）', job=job.name).observe(lateness)
+
+        def execute():
+            started = self._clock()
             try:
-                task()
+                job.task()
             except Exception as e:
-                print(f"执行每日任务失败: {str(e)}")
-        
-        schedule.every().day.at(time).do(job)
-        self.jobs.append(job)
+                job.failures += 1
+                metrics.counter('scheduler_task_failures_total', '任务失败次数', job=job.name).inc()
+                kind = "每日任务" if job.daily_time is not None else "定时任务"
+                print(f"执行{kind}失败: {str(e)}")
+            finally:
+                job.last_duration = self._clock() - started
+                job.max_duration = max(job.max_duration, job.last_duration)
+                job.runs += 1
+                job.running = False
+                metrics.histogram('scheduler_task_seconds', '任务执行耗时（秒）', job=job.name).observe(job.last_duration)
+
+        self._executor.submit(execute)
 
     def run(self):
         """运行调度器"""
         while self.running:
             try:
-                schedule.run_pending()
-                time.sleep(1)
+                delay = self.run_pending()
+                self._wakeup.clear()
+                # 精确休眠到下一个截止时间；最长 1 秒醒来一次以响应退出信号
+                self._wakeup.wait(1.0 if delay is None else min(delay, 1.0))
             except Exception as e:
                 print(f"调度器运行错误: {str(e)}")
                 time.sleep(5)
-        
-        print("程序已安全退出")
\ No newline at end of file
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        print("程序已安全退出")
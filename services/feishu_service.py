@@ -1,14 +1,29 @@
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Dict, Any, List
-from config import FEISHU_WEBHOOK_URL
+from config import FEISHU_WEBHOOK_URL, NOTIFY_CONNECT_TIMEOUT, NOTIFY_READ_TIMEOUT
+from services.outbox import NotificationRejected
+from services.report_renderer import Report, FEISHU_DAILY
+from alert_rules import format_threshold
 from datetime import datetime
 import pytz
 import os
 
 class FeishuNotifier:
+    # 飞书自定义机器人限制：每分钟 100 次、每秒 5 次
+    rate_limit = (100 / 60, 5)
+    max_message_length = 4000
+
     def __init__(self):
         self.webhook_url = FEISHU_WEBHOOK_URL
         self.report_dir = "每日报告"  # 报告保存目录
+        self.timeout = (NOTIFY_CONNECT_TIMEOUT, NOTIFY_READ_TIMEOUT)
+
+        # 复用长连接，避免每条消息都重新进行 TCP/TLS 握手
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
 
     def send_message(self, content: str) -> bool:
         """发送飞书消息"""
@@ -17,15 +32,20 @@ class FeishuNotifier:
                 "msg_type": "text",
                 "content": {"text": content}
             }
-            response = requests.post(self.webhook_url, json=payload)
+            response = self.session.post(self.webhook_url, json=payload, timeout=self.timeout)
+            if 400 <= response.status_code < 500 and response.status_code != 429:
+                # 请求本身有误（非限流），重试不会成功
+                raise NotificationRejected(f"HTTP {response.status_code}: {response.text[:200]}")
             response.raise_for_status()
             return True
+        except NotificationRejected:
+            raise
         except Exception as e:
             print(f"发送飞书消息失败: {str(e)}")
             return False
 
-    def format_position_message(self, changes: Dict[str, Any], exchange) -> str:
-        """格式化仓位变化消息"""
+    def format_position_message(self, changes: Dict[str, Any]) -> str:
+        """格式化仓位变化消息（平仓价格已由 BinanceClient 批量补充，不访问网络）"""
         messages = []
         
         if changes['new_positions']:
@@ -44,7 +64,8 @@ class FeishuNotifier:
         if changes['closed_positions']:
             messages.append("❌ 已平仓:")
             for pos in changes['closed_positions']:
-                current_price = exchange.fetch_ticker(pos['symbol'])['last']
+                current_price = pos.get('close_price')
+                close_price_str = f"${float(current_price):.7f}" if current_price is not None else "未知"
                 
                 # 计算持仓时长
                 close_time = datetime.strptime(pos['datetime'], '%Y-%m-%d %H:%M:%S')
@@ -71,22 +92,88 @@ class FeishuNotifier:
                 if minutes > 0 or not duration_parts:
                     duration_parts.append(f"{minutes}分钟")
                 duration_str = " ".join(duration_parts)
-                
+
+                if pos.get('net_pnl') is not None:
+                    # 按实际成交计算的已实现盈亏、手续费（非 USDT 部分单独列出）和资金费
+                    other_fees = "".join(f" + {amount:.6f} {asset}" for asset, amount in pos['other_fees'].items())
+                    margin = float(pos['margin'])
+                    funding_label = "资金费(交易对合计，未计入净盈亏)" if pos.get('funding_shared') else "资金费"
+                    pnl_str = (
+                        f"已实现盈亏: ${pos['realized_pnl']:.2f}\n"
+                        f"手续费: ${pos['fee']:.2f}{other_fees}\n"
+                        f"{funding_label}: ${pos['funding']:.2f}\n"
+                        f"净盈亏: ${pos['net_pnl']:.2f}\n"
+                        f"收益率: {(pos['net_pnl'] / margin * 100 if margin else 0.0):.2f}%\n"
+                    )
+                    if not pos.get('trades_complete', True):
+                        pnl_str += "⚠️ 成交记录不完整，盈亏和手续费只含已同步的成交\n"
+                else:
+                    pnl_str = f"盈亏: ${pos['unrealizedPnl']:.2f}\n收益率: {pos['percentage']:.2f}%\n"
+
                 messages.append(
                     f"账户: {pos['account_name']}\n"
                     f"币种: {pos['base_currency']}\n"
                     f"方向: {pos['side']}\n"
                     f"开仓价格: ${float(pos['entryPrice']):.7f}\n"
-                    f"平仓价格: ${float(current_price):.7f}\n"
+                    f"平仓价格: {close_price_str}\n"
                     f"数量: {pos['contracts']}\n"
-                    f"盈亏: ${pos['unrealizedPnl']:.2f}\n"
-                    f"收益率: {pos['percentage']:.2f}%\n"
+                    f"{pnl_str}"
                     f"持仓时长: {duration_str}\n"
                     f"时间: {pos['datetime']}\n"
                 )
 
         return "\n".join(messages) if messages else ""
 
+    def format_risk_message(self, alerts: List[Dict[str, Any]]) -> str:
+        """格式化风险告警（保证金比率、强平距离），级别升高或恢复正常时发送"""
+        messages = []
+        for alert in alerts:
+            if alert['type'] == 'margin_ratio':
+                title = (f"⚠️ 保证金比率告警 ({alert['level']}/{alert['levels']})" if alert['level']
+                         else "✅ 保证金比率恢复正常")
+                messages.append(
+                    f"{title}\n"
+                    f"账户: {alert['account_name']}\n"
+                    f"保证金比率: {alert['margin_ratio'] * 100:.2f}% (阈值 {alert['threshold'] * 100:g}%)\n"
+                    f"保证金余额: ${alert['margin_balance']:.2f}\n"
+                    f"维持保证金: ${alert['maint_margin']:.2f}\n"
+                )
+            else:
+                title = (f"🚨 强平距离告警 ({alert['level']}/{alert['levels']})" if alert['level']
+                         else "✅ 强平风险解除")
+                liquidation_price = alert['liquidation_price']
+                messages.append(
+                    f"{title}\n"
+                    f"账户: {alert['account_name']}\n"
+                    f"币种: {alert['base_currency']}\n"
+                    f"方向: {alert['side']}{' (逐仓)' if alert['isolated'] else ''}\n"
+                    f"标记价格: ${alert['mark_price']:.7f}\n"
+                    f"强平价格: {f'${liquidation_price:.7f}' if liquidation_price is not None else '无'}\n"
+                    f"距强平: {alert['distance'] * 100:.2f}% (阈值 {alert['threshold'] * 100:g}%)\n"
+                )
+        return "\n".join(messages)
+
+    def format_rule_message(self, alerts: List[Dict[str, Any]]) -> str:
+        """格式化已触发的提醒规则"""
+        messages = []
+        for alert in alerts:
+            rule = alert['rule']
+            op = {'>': '≥', '<': '≤'}[rule.op]
+            if rule.kind == 'pnl':
+                messages.append(
+                    f"🔔 提醒 #{rule.id}: {rule.market_id} 收益率 {op} {format_threshold(rule.value)}%\n"
+                    f"账户: {alert['account_name']}\n"
+                    f"方向: {alert['side']}\n"
+                    f"收益率: {alert['pnl_percentage']:.2f}%\n"
+                    f"标记价格: ${alert['price']:.7f}\n"
+                )
+            else:
+                messages.append(
+                    f"🔔 提醒 #{rule.id}: {rule.market_id} 价格 {op} {format_threshold(rule.value)}\n"
+                    f"标记价格: ${alert['price']:.7f}\n"
+                )
+        return "\n".join(messages)
+
     def save_daily_report_to_file(self, report_content: str, date: str):
         """保存每日报告到文件"""
         try:
@@ -103,76 +190,15 @@ class FeishuNotifier:
 
     def format_daily_report(self, balances: List[Dict], positions: List[Dict]) -> str:
         """格式化每日报告"""
+        return self.render_daily_report(Report(balances, positions))
+
+    def render_daily_report(self, report: Report) -> str:
+        """用已生成的报告模型渲染每日报告，余额部分（不含持仓）同时保存到文件"""
         # 获取美东时间
         eastern = pytz.timezone('America/New_York')
         current_date = datetime.now(pytz.UTC).astimezone(eastern).strftime('%Y-%m-%d')
-        
-        # 生成报告内容
-        report = [f"📊 每日账户报告 ({current_date})\n"]
-        
-        # 计算总资产
-        total_assets = sum(balance['total_balance'] for balance in balances)
-        total_pnl = sum(balance['total_unrealized_pnl'] for balance in balances)
-        
-        # 添加总资产信息
-        report.extend([
-            "💰 账户组合总览",
-            f"总资产: ${total_assets:.2f} USDT",
-            f"总未实现盈亏: ${total_pnl:.2f} USDT\n"
-        ])
-        
-        # 添加每个账户的余额信息
-        for balance in balances:
-            report.extend([
-                f"【{balance['account_name']}】",
-                f"账户资产: ${balance['total_balance']:.2f} USDT",
-                f"可用余额: ${balance['free_balance']:.2f} USDT",
-                f"占用保证金: ${balance['used_balance']:.2f} USDT",
-                f"未实现盈亏: ${balance['total_unrealized_pnl']:.2f} USDT\n"
-            ])
 
-        # 生成完整报告（用于发送通知）
-        full_report = "\n".join(report)
-        
-        # 保存不含持仓信息的报告到文件
-        self.save_daily_report_to_file(full_report, current_date)
-        
-        # 添加持仓信息（仅用于通知，不保存到文件）
-        if positions:
-            # 将持仓按账户分组
-            main_positions = []
-            sub_positions = []
-            
-            for pos in positions:
-                if pos['account_name'] == '主账户':
-                    main_positions.append(pos)
-                else:
-                    sub_positions.append(pos)
-            
-            # 分别对主账户和子账户的持仓按未实现盈亏排序
-            main_positions.sort(key=lambda x: float(x['unrealizedPnl']), reverse=True)
-            sub_positions.sort(key=lambda x: float(x['unrealizedPnl']), reverse=True)
-            
-            # 先添加主账户持仓
-            if main_positions:
-                report.append("📍 主账户持仓:")
-                for pos in main_positions:
-                    report.append(
-                        f"{pos['base_currency']}: {pos['side']} "
-                        f"未实现盈亏: ${float(pos['unrealizedPnl']):.2f} ({pos['percentage']:.2f}%)\n"
-                    )
-            
-            # 再添加子账户持仓
-            if sub_positions:
-                if main_positions:  # 如果有主账户持仓，添加一个空行分隔
-                    report.append("")
-                report.append("📍 子账户持仓:")
-                for pos in sub_positions:
-                    report.append(
-                        f"{pos['base_currency']}: {pos['side']} "
-                        f"未实现盈亏: ${float(pos['unrealizedPnl']):.2f} ({pos['percentage']:.2f}%)\n"
-                    )
-        else:
-            report.append("当前无持仓")
-        
-        return "\n".join(report) 
\ No newline at end of file
+        summary = report.render_summary(FEISHU_DAILY, current_date)
+        self.save_daily_report_to_file(summary, current_date)
+        # 持仓信息仅用于通知，不保存到文件
+        return summary + report.render_positions(FEISHU_DAILY.positions)
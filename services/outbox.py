@@ -0,0 +1,144 @@
+import logging
+import queue
+import threading
+import time
+from typing import List
+
+from metrics import metrics
+from rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationRejected(Exception):
+    """渠道明确拒绝的消息（格式错误、无权限等），重试不会成功"""
+
+
+class NotificationOutbox:
+    """通知发件箱：由后台线程发送，合并同一时间窗口内的消息，按渠道限速并退避重试"""
+
+    def __init__(self, notifier, window: float = 1.0, maxsize: int = 1000,
+                 max_retries: int = 5, max_backoff: float = 60):
+        self.notifier = notifier
+        self.window = window
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        # 渠道限速和单条消息长度上限由各通知服务声明
+        rate, burst = getattr(notifier, 'rate_limit', (1.0, 1))
+        self.max_length = getattr(notifier, 'max_message_length', 4000)
+        self.bucket = TokenBucket(rate, burst)
+
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.channel = type(notifier).__name__
+        metrics.gauge('outbox_queue_depth', '通知发件箱排队的消息数', func=self.qsize, channel=self.channel)
+        self._send_seconds = metrics.histogram('notifier_send_seconds', '通知接口耗时（秒）', channel=self.channel)
+        self._failures = metrics.counter('notifier_failures_total', '通知发送失败次数（含重试）', channel=self.channel)
+        self._dropped = metrics.counter('notifier_dropped_total', '丢弃的通知数', channel=self.channel)
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='notification-outbox', daemon=True)
+        self._thread.start()
+
+    def send_message(self, content: str) -> bool:
+        """加入发送队列后立即返回，队列已满时丢弃并返回 False"""
+        if not content:
+            return False
+        try:
+            self._queue.put_nowait(content)
+            return True
+        except queue.Full:
+            logger.error("通知队列已满，丢弃消息")
+            self._dropped.inc()
+            return False
+
+    def qsize(self) -> int:
+        """当前排队的消息数"""
+        return self._queue.qsize()
+
+    def flush(self, timeout: float = 30) -> bool:
+        """等待队列中的消息发送完毕"""
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(
+                lambda: self._queue.unfinished_tasks == 0, timeout
+            )
+
+    def stop(self, timeout: float = 30):
+        """发送完剩余消息后停止后台线程"""
+        self.flush(timeout)
+        self._stopping.set()
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                first = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            # 收集时间窗口内的其他消息一起发送
+            deadline = time.monotonic() + self.window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            for parts in self._coalesce(batch):
+                if self._deliver('\n\n'.join(parts)):
+                    continue
+                if len(parts) == 1 or self._stopping.is_set():
+                    self._dropped.inc(len(parts))
+                    continue
+                # 合并的消息发送失败时逐条重发，避免一条无法发送的消息连带其他消息一起丢弃
+                logger.warning(f"合并的 {len(parts)} 条通知发送失败，改为逐条发送")
+                for message in parts:
+                    if not self._deliver(message):
+                        self._dropped.inc()
+            for _ in batch:
+                self._queue.task_done()
+
+    def _coalesce(self, batch: List[str]) -> List[List[str]]:
+        """按长度上限把多条消息分成尽量少的几组，每组以空行连接后作为一条发送"""
+        groups = []
+        current = []
+        length = 0
+        for message in batch:
+            if current and length + len(message) + 2 > self.max_length:
+                groups.append(current)
+                current, length = [], 0
+            length += len(message) + (2 if current else 0)
+            current.append(message)
+        if current:
+            groups.append(current)
+        return groups
+
+    def _deliver(self, message: str) -> bool:
+        """限速发送，失败后指数退避重试（渠道明确拒绝时不重试），返回是否发送成功"""
+        backoff = 1
+        for attempt in range(self.max_retries + 1):
+            if not self.bucket.acquire(stop=self._stopping):
+                return False
+            started = time.perf_counter()
+            try:
+                if self.notifier.send_message(message):
+                    return True
+            except NotificationRejected as e:
+                logger.error(f"通知被渠道拒绝，不再重试: {e}")
+                self._failures.inc()
+                break
+            except Exception as e:
+                logger.error(f"发送通知异常: {e}")
+            finally:
+                self._send_seconds.observe(time.perf_counter() - started)
+            self._failures.inc()
+            if attempt < self.max_retries:
+                # 停止时立即结束退避等待
+                if self._stopping.wait(backoff):
+                    return False
+                backoff = min(backoff * 2, self.max_backoff)
+        else:
+            logger.error(f"通知发送失败，已重试 {self.max_retries} 次，放弃该消息")
+        return False
@@ -0,0 +1,149 @@
+import html
+from collections import namedtuple
+from typing import Callable, Dict, List, Optional
+
+# 报告模型中的一行持仓：数值字段在建模时转换一次，字段顺序即持仓行模板的参数顺序
+PositionRow = namedtuple('PositionRow', ['base_currency', 'side', 'unrealized_pnl', 'percentage'])
+
+# 报告模型中的一个账户，字段顺序即账户模板的参数顺序
+AccountRow = namedtuple('AccountRow', ['name', 'total_balance', 'free_balance', 'used_balance', 'unrealized_pnl'])
+
+
+def _no_escape(text: str) -> str:
+    return text
+
+
+class PositionsTemplate:
+    """持仓部分的渠道模板
+
+    行模板在创建时绑定为格式化函数，渲染时用 map 批量格式化后一次 join。
+    escape 作用于整段渲染结果：模板本身不含标记，对整段转义等同于逐个字段转义。
+    """
+
+    def __init__(self, group_header: str, position: str, separator: str, empty: str,
+                 escape: Callable[[str], str] = _no_escape):
+        self.group_header = group_header.__mod__   # 参数: 账户名
+        self.position = position.__mod__           # 参数: PositionRow
+        self.separator = separator
+        self.empty = empty
+        self.escape = escape
+
+
+class ReportTemplate:
+    """余额汇总部分的渠道模板（标题、总览、各账户），持仓部分由 PositionsTemplate 渲染"""
+
+    def __init__(self, header: str, totals: str, account: str, positions: PositionsTemplate):
+        self.header = header.__mod__   # 参数: {'date': 日期}
+        self.totals = totals.__mod__   # 参数: (总资产, 总未实现盈亏)
+        self.account = account.__mod__  # 参数: AccountRow
+        self.positions = positions
+        self.escape = positions.escape
+
+
+class Report:
+    """由一次账户快照生成的报告模型：只分组、排序一次，可被多个渠道模板重复渲染
+
+    渲染结果按模板缓存，同一份快照用于每日报告和查询回复时持仓部分不会重复生成。
+    """
+
+    def __init__(self, balances: List[Dict], positions: List[Dict]):
+        self.total_balance = sum(balance['total_balance'] for balance in balances)
+        self.total_unrealized_pnl = sum(balance['total_unrealized_pnl'] for balance in balances)
+        self.accounts = [
+            AccountRow(balance['account_name'], balance['total_balance'], balance['free_balance'],
+                       balance['used_balance'], balance['total_unrealized_pnl'])
+            for balance in balances
+        ]
+
+        # 账户顺序与余额列表一致，没有余额信息的账户按持仓中首次出现的顺序排在后面
+        groups = {balance['account_name']: [] for balance in balances}
+        for pos in positions:
+            groups.setdefault(pos['account_name'], [])
+        # 所有持仓按未实现盈亏一次排序后再分组，组内顺序与逐组排序相同（排序是稳定的）
+        for pos in sorted(positions, key=lambda x: float(x['unrealizedPnl']), reverse=True):
+            groups[pos['account_name']].append(PositionRow(
+                pos['base_currency'], pos['side'], float(pos['unrealizedPnl']), float(pos['percentage'])
+            ))
+        self.position_groups = [(name, rows) for name, rows in groups.items() if rows]
+        self._rendered = {}
+
+    @property
+    def has_positions(self) -> bool:
+        return bool(self.position_groups)
+
+    def render_summary(self, template: ReportTemplate, date: Optional[str] = None) -> str:
+        """渲染标题、总览和各账户余额"""
+        key = (template, date)
+        rendered = self._rendered.get(key)
+        if rendered is None:
+            parts = [template.header({'date': date}),
+                     template.totals((self.total_balance, self.total_unrealized_pnl))]
+            parts.extend(map(template.account, self.accounts))
+            rendered = self._rendered[key] = template.escape(''.join(parts))
+        return rendered
+
+    def render_positions(self, template: PositionsTemplate) -> str:
+        """渲染按账户分组的持仓"""
+        rendered = self._rendered.get(template)
+        if rendered is None:
+            if not self.position_groups:
+                rendered = template.empty
+            else:
+                parts = []
+                for name, rows in self.position_groups:
+                    if parts and template.separator:
+                        parts.append(template.separator)
+                    parts.append(template.group_header(name))
+                    parts.extend(map(template.position, rows))
+                rendered = template.escape(''.join(parts))
+            self._rendered[template] = rendered
+        return rendered
+
+    def render(self, template: ReportTemplate, date: Optional[str] = None) -> str:
+        return self.render_summary(template, date) + self.render_positions(template.positions)
+
+
+def _html_escape(text: str) -> str:
+    return html.escape(text, quote=False)
+
+
+# 飞书纯文本
+FEISHU_POSITIONS = PositionsTemplate(
+    group_header="\n📍 %s持仓:",
+    position="\n%s: %s 未实现盈亏: $%.2f (%.2f%%)\n",
+    separator="\n",
+    empty="\n当前无持仓",
+)
+
+FEISHU_DAILY = ReportTemplate(
+    header="📊 每日账户报告 (%(date)s)\n\n",
+    totals="💰 账户组合总览\n总资产: $%.2f USDT\n总未实现盈亏: $%.2f USDT\n",
+    account=("\n【%s】\n账户资产: $%.2f USDT\n可用余额: $%.2f USDT\n"
+             "占用保证金: $%.2f USDT\n未实现盈亏: $%.2f USDT\n"),
+    positions=FEISHU_POSITIONS,
+)
+
+# Telegram（parse_mode=HTML，账户名、币种中的 <、>、& 需要转义）
+TELEGRAM_POSITIONS = PositionsTemplate(
+    group_header="📍 %s持仓:\n\n",
+    position="%s %s %.2f USDT (%.2f%%)\n\n",
+    separator="",
+    empty="📍 当前无持仓\n\n",
+    escape=_html_escape,
+)
+
+TELEGRAM_DAILY = ReportTemplate(
+    header="📊 每日账户报告 (%(date)s)\n\n",
+    totals="💰 总资产: %.2f USDT\n📈 未实现盈亏: %.2f USDT\n\n",
+    account=("【%s】\n总资产: %.2f USDT\n可用余额: %.2f USDT\n"
+             "占用保证金: %.2f USDT\n未实现盈亏: %.2f USDT\n\n"),
+    positions=TELEGRAM_POSITIONS,
+)
+
+TELEGRAM_QUERY = ReportTemplate(
+    header="📊 账户资产概览\n\n",
+    totals="💰 总资产: %.2f USDT\n📈 未实现盈亏: %.2f USDT\n\n",
+    account=("【%s】\n💰 总资产: %.2f USDT\n💵 可用余额: %.2f USDT\n"
+             "🔒 占用保证金: %.2f USDT\n📈 未实现盈亏: %.2f USDT\n\n"),
+    positions=TELEGRAM_POSITIONS,
+)
@@ -1,6 +1,14 @@
 from telegram import Bot
-from telegram.error import TelegramError
+from telegram.error import BadRequest, Forbidden, TelegramError
+from telegram.request import HTTPXRequest
+from config import TELEGRAM_API_URL, NOTIFY_CONNECT_TIMEOUT, NOTIFY_READ_TIMEOUT, SNAPSHOT_CACHE_TTL
+from metrics import metrics
+from services.outbox import NotificationRejected
+from services.report_renderer import Report, TELEGRAM_DAILY, TELEGRAM_QUERY
+from alert_rules import MAX_RULE_ID, format_threshold, parse_rule
 import asyncio
+import html
+import threading
 import os
 from datetime import datetime
 import logging
@@ -8,11 +16,21 @@ import logging
 logger = logging.getLogger(__name__)
 
 class TelegramService:
+    # Telegram 限制：同一会话每秒约 1 条消息，单条最长 4096 字符
+    rate_limit = (1.0, 1)
+    max_message_length = 4000
+
     def __init__(self):
         self.bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
         self.chat_id = os.getenv('TELEGRAM_CHAT_ID')
+        self.api_url = TELEGRAM_API_URL
         self._bot = None
         self._loop = None
+        # 发送专用的事件循环线程和长期复用的 Bot（含连接池）
+        self._sender_bot = None
+        self._sender_loop = None
+        self._sender_lock = threading.Lock()
+        self._query_tasks = set()
 
         # 创建报告保存目录
         self.report_dir = os.path.join(os.path.dirname(__file__), '..', '每日报告')
@@ -23,28 +41,44 @@ class TelegramService:
     def bot(self):
         """延迟初始化 bot，确保在正确的事件循环中创建"""
         if self._bot is None:
-            self._bot = Bot(token=self.bot_token)
+            self._bot = Bot(token=self.bot_token, base_url=self.api_url)
         return self._bot
 
-    def send_message(self, message: str):
-        """同步发送消息方法"""
+    def _create_bot(self) -> Bot:
+        """创建带连接池和超时设置的 Bot"""
+        request = HTTPXRequest(
+            connection_pool_size=4,
+            connect_timeout=NOTIFY_CONNECT_TIMEOUT,
+            read_timeout=NOTIFY_READ_TIMEOUT,
+            write_timeout=NOTIFY_READ_TIMEOUT
+        )
+        return Bot(token=self.bot_token, base_url=self.api_url, request=request)
+
+    def _ensure_sender(self):
+        """启动发送专用的事件循环线程（只创建一次）"""
+        with self._sender_lock:
+            if self._sender_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='telegram-sender', daemon=True).start()
+                self._sender_bot = self._create_bot()
+                self._sender_loop = loop
+        return self._sender_loop
+
+    def send_message(self, message: str) -> bool:
+        """同步发送消息方法（在发送线程的事件循环中复用同一个 Bot 和连接）"""
         try:
-            # 创建新的事件循环
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            # 在新的事件循环中创建新的 bot 实例
-            temp_bot = Bot(token=self.bot_token)
-            
-            # 发送消息
-            loop.run_until_complete(self._async_send_message(temp_bot, message))
-            
-            # 关闭事件循环
-            loop.close()
+            loop = self._ensure_sender()
+            future = asyncio.run_coroutine_threadsafe(
+                self._async_send_message(self._sender_bot, message), loop
+            )
+            return future.result(timeout=NOTIFY_CONNECT_TIMEOUT + 2 * NOTIFY_READ_TIMEOUT)
+        except NotificationRejected:
+            raise
         except Exception as e:
             logger.error(f"Failed to send Telegram message: {e}")
+            return False
 
-    async def _async_send_message(self, bot, message: str):
+    async def _async_send_message(self, bot, message: str) -> bool:
         """异步发送消息方法"""
         try:
             await bot.send_message(
@@ -52,86 +86,32 @@ class TelegramService:
                 text=message,
                 parse_mode='HTML'
             )
+            return True
+        except (BadRequest, Forbidden) as e:
+            # 消息格式错误或机器人无权限，重试不会成功
+            raise NotificationRejected(str(e)) from e
         except TelegramError as e:
             logger.error(f"Failed to send Telegram message: {e}")
+            return False
 
-    async def start_message_handler(self, accounts):
-        """Start handling incoming messages"""
+    async def start_message_handler(self, accounts, alert_rules=None, pool=None):
+        """Start handling incoming messages
+
+        pool 为账户的 AccountPool 时，查询经账户专属线程执行（与轮询串行，受限速和退避约束）。
+        """
         try:
             offset = None
             while True:
                 try:
                     updates = await self.bot.get_updates(offset=offset, timeout=30)
                     for update in updates:
-                        if update.message and update.message.text == "查询":
-                            # 收集所有账户的信息
-                            all_balances = []
-                            for account in accounts:
-                                balance = account.get_account_balance()
-                                all_balances.append(balance)
-                            
-                            # 计算总资产和总未实现盈亏
-                            total_balance = sum(balance['total_balance'] for balance in all_balances)
-                            total_unrealized_pnl = sum(balance['total_unrealized_pnl'] for balance in all_balances)
-                            
-                            # 格式化消息
-                            message = "📊 账户资产概览\n\n"
-                            
-                            # 总览部分
-                            message += f"💰 总资产: {total_balance:.2f} USDT\n"
-                            message += f"📈 未实现盈亏: {total_unrealized_pnl:.2f} USDT\n\n"
-                            
-                            # 各账户详细信息
-                            for balance in all_balances:
-                                message += f"【{balance['account_name']}】\n"
-                                message += f"💰 总资产: {balance['total_balance']:.2f} USDT\n"
-                                message += f"💵 可用余额: {balance['free_balance']:.2f} USDT\n"
-                                message += f"🔒 占用保证金: {balance['used_balance']:.2f} USDT\n"
-                                message += f"📈 未实现盈亏: {balance['total_unrealized_pnl']:.2f} USDT\n\n"
-                            
-                            # 添加持仓信息
-                            positions = []
-                            for account in accounts:
-                                positions.extend(account.get_positions())
-                            
-                            if positions:
-                                # 将持仓按账户分组
-                                main_positions = []
-                                sub_positions = []
-                                
-                                for pos in positions:
-                                    if pos['account_name'] == '主账户':
-                                        main_positions.append(pos)
-                                    else:
-                                        sub_positions.append(pos)
-                                
-                                # 分别对主账户和子账户的持仓按未实现盈亏排序
-                                main_positions.sort(key=lambda x: float(x['unrealizedPnl']), reverse=True)
-                                sub_positions.sort(key=lambda x: float(x['unrealizedPnl']), reverse=True)
-                                
-                                # 先添加主账户持仓
-                                if main_positions:
-                                    message += "📍 主账户持仓:\n\n"
-                                    for pos in main_positions:
-                                        message += f"{pos['base_currency']} "
-                                        message += f"{pos['side']} "
-                                        message += f"{pos['unrealizedPnl']:.2f} USDT ({pos['percentage']:.2f}%)\n\n"
-
-                                # 再添加子账户持仓
-                                if sub_positions:
-                                    message += "📍 子账户持仓:\n\n"
-                                    for pos in sub_positions:
-                                        message += f"{pos['base_currency']} "
-                                        message += f"{pos['side']} "
-                                        message += f"{pos['unrealizedPnl']:.2f} USDT ({pos['percentage']:.2f}%)\n\n"
-                            else:
-                                message += "📍 当前无持仓\n\n"
-                            
-                            # 使用当前事件循环的 bot 发送消息
-                            await self._async_send_message(self.bot, message)
-                        
-                        # 更新offset
-                        offset = update.update_id + 1
+                        try:
+                            await self._handle_update(update, accounts, alert_rules, pool)
+                        except Exception as e:
+                            logger.error(f"Failed to handle update {update.update_id}: {e}")
+                        finally:
+                            # 处理失败的消息也不再重复获取，避免同一批消息被反复处理
+                            offset = update.update_id + 1
                     
                     # 短暂等待以避免过于频繁的请求
                     await asyncio.sleep(1)
@@ -143,6 +123,96 @@ class TelegramService:
         except Exception as e:
             logger.error(f"Error in message handler: {e}")
 
+    async def _handle_update(self, update, accounts, alert_rules=None, pool=None):
+        """处理一条消息：查询、统计和提醒规则命令"""
+        message = update.message
+        text = message.text.strip() if message and message.text else None
+        if text == "查询":
+            # 在后台任务中处理查询，不阻塞后续消息
+            task = asyncio.create_task(self._handle_query(accounts, pool))
+            self._query_tasks.add(task)
+            task.add_done_callback(self._query_tasks.discard)
+        elif text in ("/stats", "统计"):
+            await self._async_send_message(self.bot, self.format_stats_message())
+        elif text and alert_rules is not None and text.split()[0] in ("/alert", "/alerts", "/unalert"):
+            # 提醒规则会写入数据库，只接受配置的聊天发送的命令
+            if str(message.chat.id) != str(self.chat_id):
+                logger.warning(f"Ignored rule command from unauthorized chat {message.chat.id}")
+                return
+            await self._async_send_message(self.bot, self.handle_alert_command(alert_rules, text))
+
+    async def _handle_query(self, accounts, pool=None):
+        """处理"查询"：并发获取所有账户快照（优先使用监控循环刚获取的缓存）"""
+        def fetch(account):
+            return account.get_snapshot(SNAPSHOT_CACHE_TTL)
+
+        if pool is not None:
+            # 同一账户的请求只由其专属线程串行执行，不与正在进行的轮询同时解析
+            requests = (asyncio.to_thread(pool.call, account, fetch) for account in accounts)
+        else:
+            requests = (asyncio.to_thread(fetch, account) for account in accounts)
+        results = await asyncio.gather(*requests, return_exceptions=True)
+        balances = []
+        positions = []
+        for account, result in zip(accounts, results):
+            if isinstance(result, Exception):
+                logger.error(f"{account.account_name} 查询失败: {result}")
+                continue
+            balances.append(result['balance'])
+            positions.extend(result['positions'])
+
+        try:
+            await self._async_send_message(self.bot, self.format_query_message(balances, positions))
+        except NotificationRejected as e:
+            logger.error(f"Telegram rejected query reply: {e}")
+
+    # 统计消息中各直方图的标题
+    STATS_SECTIONS = (
+        ('account_check_seconds', '账户检查'),
+        ('binance_request_seconds', '交易所接口'),
+        ('notifier_send_seconds', '通知接口'),
+        ('scheduler_task_seconds', '任务耗时'),
+        ('scheduler_lateness_seconds', '任务延迟'),
+    )
+
+    def format_stats_message(self, registry=None) -> str:
+        """格式化运行统计：各环节耗时分位数、请求权重和队列深度"""
+        registry = registry or metrics
+        histograms = registry.histograms()
+        message = "📈 运行统计\n"
+
+        for name, title in self.STATS_SECTIONS:
+            rows = [(labels, h) for metric_name, labels, h in histograms if metric_name == name and h.count]
+            if not rows:
+                continue
+            message += f"\n【{title}】\n"
+            for labels, h in rows:
+                label = html.escape(' '.join(labels.values()))
+                message += (f"{label}: {h.count}次 p50 {h.quantile(0.5) * 1000:.0f}ms "
+                            f"p95 {h.quantile(0.95) * 1000:.0f}ms 最大 {h.max * 1000:.0f}ms\n")
+
+        message += "\n【权重与队列】\n"
+        for labels, value in registry.values('binance_used_weight_1m'):
+            message += f"{html.escape(labels['account'])} 已用权重: {value:.0f}/分钟\n"
+        for labels, value in registry.values('outbox_queue_depth'):
+            message += f"通知队列 {labels['channel']}: {value:.0f}\n"
+        for labels, value in registry.values('account_pending_requests'):
+            if value:
+                message += f"{html.escape(labels['account'])} 排队请求: {value:.0f}\n"
+
+        errors = [(name, labels, value) for name in ('binance_request_errors_total', 'account_failures_total',
+                                                      'notifier_failures_total', 'scheduler_task_failures_total')
+                  for labels, value in registry.values(name) if value]
+        if errors:
+            message += "\n【失败次数】\n"
+            for name, labels, value in errors:
+                message += f"{html.escape(' '.join(labels.values()))}: {value:.0f}\n"
+        return message
+
+    def format_query_message(self, balances: list, positions: list) -> str:
+        """格式化查询回复"""
+        return Report(balances, positions).render(TELEGRAM_QUERY)
+
     def save_daily_report_to_file(self, report_content: str, date: str):
         """保存每日报告到文件"""
         try:
@@ -159,74 +229,28 @@ class TelegramService:
 
     def format_daily_report(self, balances: list, positions: list) -> str:
         """Format daily report message"""
-        message = f"📊 每日账户报告 ({datetime.now().strftime('%Y-%m-%d')})\n\n"
-        
-        # 合计所有账户的总资产和未实现盈亏
-        total_balance = sum(balance['total_balance'] for balance in balances)
-        total_unrealized_pnl = sum(balance['total_unrealized_pnl'] for balance in balances)
-        
-        # 添加总览信息
-        message += f"💰 总资产: {total_balance:.2f} USDT\n"
-        message += f"📈 未实现盈亏: {total_unrealized_pnl:.2f} USDT\n\n"
-        
-        # 添加各个账户的详细信息
-        for balance in balances:
-            message += f"【{balance['account_name']}】\n"
-            message += f"总资产: {balance['total_balance']:.2f} USDT\n"
-            message += f"可用余额: {balance['free_balance']:.2f} USDT\n"
-            message += f"占用保证金: {balance['used_balance']:.2f} USDT\n"
-            message += f"未实现盈亏: {balance['total_unrealized_pnl']:.2f} USDT\n\n"
-        
-        # 保存每日报告到文件
-        self.save_daily_report_to_file(message, datetime.now().strftime('%Y-%m-%d'))
-        
-        # 添加持仓信息
-        if positions:
-            
-            # 将持仓按账户分组
-            main_positions = []
-            sub_positions = []
-            
-            for pos in positions:
-                if pos['account_name'] == '主账户':
-                    main_positions.append(pos)
-                else:
-                    sub_positions.append(pos)
-            
-            # 分别对主账户和子账户的持仓按未实现盈亏排序
-            main_positions.sort(key=lambda x: float(x['unrealizedPnl']), reverse=True)
-            sub_positions.sort(key=lambda x: float(x['unrealizedPnl']), reverse=True)
-            
-            # 先添加主账户持仓
-            if main_positions:
-                message += "📍 主账户持仓:\n\n"
-                for pos in main_positions:
-                    message += f"{pos['base_currency']} "
-                    message += f"{pos['side']} "
-                    message += f"{pos['unrealizedPnl']:.2f} USDT ({pos['percentage']:.2f}%)\n\n"
-
-            # 再添加子账户持仓
-            if sub_positions:
-                message += "📍 子账户持仓:\n\n"
-                for pos in sub_positions:
-                    message += f"{pos['base_currency']} "
-                    message += f"{pos['side']} "
-                    message += f"{pos['unrealizedPnl']:.2f} USDT ({pos['percentage']:.2f}%)\n\n"
-        else:
-            message += "📍 当前无持仓\n\n"
-        
-        return message
+        return self.render_daily_report(Report(balances, positions))
+
+    def render_daily_report(self, report: Report) -> str:
+        """用已生成的报告模型渲染每日报告，余额部分（不含持仓）同时保存到文件"""
+        current_date = datetime.now().strftime('%Y-%m-%d')
+        summary = report.render_summary(TELEGRAM_DAILY, current_date)
+        self.save_daily_report_to_file(summary, current_date)
+        return summary + report.render_positions(TELEGRAM_DAILY.positions)
 
-    def format_position_message(self, changes: dict, exchange) -> str:
-        """Format position change message"""
+    def format_position_message(self, changes: dict) -> str:
+        """Format position change message (close prices are resolved upstream, no network I/O)
+
+        账户名来自账户配置文件，可能含有 HTML 特殊字符，发送前需转义。
+        """
         message = ""
         
         # 处理新开仓
         if changes['new_positions']:
             message += "🆕 新开仓:\n\n"
             for pos in changes['new_positions']:
-                message += f"账户: {pos['account_name']}\n"
-                message += f"币种: {pos['base_currency']}\n"
+                message += f"账户: {html.escape(pos['account_name'])}\n"
+                message += f"币种: {html.escape(pos['base_currency'])}\n"
                 message += f"方向: {pos['side']}\n"
                 message += f"数量: {pos['contracts']}\n"
                 message += f"开仓价格: {pos['entryPrice']:.4f}\n"
@@ -237,7 +261,8 @@ class TelegramService:
         if changes['closed_positions']:
             message += "❌ 已平仓:\n\n"
             for pos in changes['closed_positions']:
-                current_price = exchange.fetch_ticker(pos['symbol'])['last']
+                current_price = pos.get('close_price')
+                close_price_str = f"{current_price:.4f}" if current_price is not None else "未知"
                 
                 # 计算持仓时长
                 close_time = datetime.strptime(pos['datetime'], '%Y-%m-%d %H:%M:%S')
@@ -260,18 +285,106 @@ class TelegramService:
                     duration_parts.append(f"{minutes}分钟")
                 duration_str = " ".join(duration_parts)
                 
-                message += f"账户: {pos['account_name']}\n"
-                message += f"币种: {pos['base_currency']}\n"
+                message += f"账户: {html.escape(pos['account_name'])}\n"
+                message += f"币种: {html.escape(pos['base_currency'])}\n"
                 message += f"方向: {pos['side']}\n"
                 message += f"开仓价格: {pos['entryPrice']:.4f}\n"
-                message += f"平仓价格: {current_price:.4f}\n"
+                message += f"平仓价格: {close_price_str}\n"
                 message += f"数量: {pos['contracts']}\n"
                 message += f"持仓时长: {duration_str}\n"
-                message += f"盈亏: {pos['unrealizedPnl']:.2f} USDT ({pos['percentage']:.2f}%)\n"
+                if pos.get('net_pnl') is not None:
+                    # 按实际成交计算的已实现盈亏、手续费（非 USDT 部分单独列出）和资金费
+                    other_fees = "".join(f" + {amount:.6f} {html.escape(asset)}" for asset, amount in pos['other_fees'].items())
+                    margin = float(pos['margin'])
+                    message += f"已实现盈亏: {pos['realized_pnl']:.2f} USDT\n"
+                    message += f"手续费: {pos['fee']:.2f} USDT{other_fees}\n"
+                    funding_label = "资金费(交易对合计，未计入净盈亏)" if pos.get('funding_shared') else "资金费"
+                    message += f"{funding_label}: {pos['funding']:.2f} USDT\n"
+                    message += (f"净盈亏: {pos['net_pnl']:.2f} USDT "
+                                f"({(pos['net_pnl'] / margin * 100 if margin else 0.0):.2f}%)\n")
+                    if not pos.get('trades_complete', True):
+                        message += "⚠️ 成交记录不完整，盈亏和手续费只含已同步的成交\n"
+                else:
+                    message += f"盈亏: {pos['unrealizedPnl']:.2f} USDT ({pos['percentage']:.2f}%)\n"
                 message += f"时间: {pos['datetime']}\n\n"
 
         return message if message else "持仓无变化"
 
+    def format_risk_message(self, alerts: list) -> str:
+        """格式化风险告警（保证金比率、强平距离），级别升高或恢复正常时发送"""
+        message = ""
+        for alert in alerts:
+            account = html.escape(alert['account_name'])
+            if alert['type'] == 'margin_ratio':
+                if alert['level']:
+                    message += f"⚠️ 保证金比率告警 ({alert['level']}/{alert['levels']})\n\n"
+                else:
+                    message += "✅ 保证金比率恢复正常\n\n"
+                message += f"账户: {account}\n"
+                message += f"保证金比率: {alert['margin_ratio'] * 100:.2f}% (阈值 {alert['threshold'] * 100:g}%)\n"
+                message += f"保证金余额: {alert['margin_balance']:.2f} USDT\n"
+                message += f"维持保证金: {alert['maint_margin']:.2f} USDT\n\n"
+            else:
+                if alert['level']:
+                    message += f"🚨 强平距离告警 ({alert['level']}/{alert['levels']})\n\n"
+                else:
+                    message += "✅ 强平风险解除\n\n"
+                liquidation_price = alert['liquidation_price']
+                message += f"账户: {account}\n"
+                message += f"币种: {html.escape(alert['base_currency'])}\n"
+                message += f"方向: {alert['side']}{' (逐仓)' if alert['isolated'] else ''}\n"
+                message += f"标记价格: {alert['mark_price']:.4f}\n"
+                message += f"强平价格: {f'{liquidation_price:.4f}' if liquidation_price is not None else '无'}\n"
+                message += f"距强平: {alert['distance'] * 100:.2f}% (阈值 {alert['threshold'] * 100:g}%)\n\n"
+        return message
+
+    def handle_alert_command(self, alert_rules, text: str) -> str:
+        """处理提醒规则命令：/alert 添加、/alerts 列出、/unalert 删除"""
+        command, *args = text.split()
+        if command == "/alerts":
+            return self.format_rule_list(alert_rules.rules())
+        if command == "/unalert":
+            if len(args) != 1 or not args[0].lstrip('#').isdigit():
+                return "格式: /unalert 规则编号"
+            rule_id = int(args[0].lstrip('#'))
+            if rule_id > MAX_RULE_ID:
+                return f"没有提醒 #{rule_id}"
+            return f"已删除提醒 #{rule_id}" if alert_rules.remove(rule_id) else f"没有提醒 #{rule_id}"
+        try:
+            rule = alert_rules.add(*parse_rule(args))
+        except ValueError as e:
+            return html.escape(str(e))
+        return f"已添加提醒 {self._describe_rule(rule)}"
+
+    @staticmethod
+    def _describe_rule(rule) -> str:
+        op = {'>': '≥', '<': '≤', None: '穿越'}[rule.op]
+        if rule.kind == 'pnl':
+            return f"#{rule.id} {rule.market_id} 收益率 {op} {format_threshold(rule.value)}%"
+        return f"#{rule.id} {rule.market_id} 价格 {op} {format_threshold(rule.value)}"
+
+    def format_rule_list(self, rules: list) -> str:
+        """格式化当前有效的提醒规则"""
+        if not rules:
+            return "📋 当前没有提醒规则"
+        message = "📋 提醒规则:\n\n"
+        for rule in rules:
+            message += self._describe_rule(rule) + "\n"
+        return message
+
+    def format_rule_message(self, alerts: list) -> str:
+        """格式化已触发的提醒规则"""
+        message = ""
+        for alert in alerts:
+            rule = alert['rule']
+            message += f"🔔 提醒 {self._describe_rule(rule)}\n\n"
+            if rule.kind == 'pnl':
+                message += f"账户: {html.escape(alert['account_name'])}\n"
+                message += f"方向: {alert['side']}\n"
+                message += f"收益率: {alert['pnl_percentage']:.2f}%\n"
+            message += f"标记价格: {alert['price']:.4f}\n\n"
+        return message
+
     def format_trade_message(self, trade_data: dict) -> str:
         """Format trade notification message"""
         action = "开仓" if trade_data['action'] == 'OPEN' else "平仓"
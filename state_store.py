@@ -0,0 +1,62 @@
+import json
+import threading
+from typing import Dict, Tuple
+
+from db import open_sqlite
+
+
+class PositionStateStore:
+    """持仓状态持久化（SQLite WAL 模式），仅在仓位发生变化时增量写入"""
+
+    def __init__(self, path: str):
+        self._conn = open_sqlite(path)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS positions (
+                    account   TEXT NOT NULL,
+                    symbol    TEXT NOT NULL,
+                    side      TEXT NOT NULL,
+                    open_time TEXT,
+                    data      TEXT NOT NULL,
+                    PRIMARY KEY (account, symbol, side)
+                )
+            """)
+            self._conn.commit()
+
+    def load(self, account: str) -> Dict[Tuple[str, str], Tuple[Dict, str]]:
+        """读取账户上次保存的持仓，返回 {(交易对, 方向): (持仓, 开仓时间)}"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT symbol, side, open_time, data FROM positions WHERE account = ?",
+                (account,)
+            ).fetchall()
+        return {(symbol, side): (json.loads(data), open_time) for symbol, side, open_time, data in rows}
+
+    def apply(self, account: str, changes: Dict, open_times: Dict[Tuple[str, str], str]):
+        """在一个事务中写入本次仓位变化"""
+        if not (changes['new_positions'] or changes['closed_positions'] or changes['modified_positions']):
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO positions (account, symbol, side, open_time, data) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (account, p['symbol'], p['side'], open_times.get((p['symbol'], p['side'])), json.dumps(p))
+                    for p in changes['new_positions']
+                ]
+            )
+            self._conn.executemany(
+                "UPDATE positions SET data = ? WHERE account = ? AND symbol = ? AND side = ?",
+                [
+                    (json.dumps(m['new']), account, m['new']['symbol'], m['new']['side'])
+                    for m in changes['modified_positions']
+                ]
+            )
+            self._conn.executemany(
+                "DELETE FROM positions WHERE account = ? AND symbol = ? AND side = ?",
+                [(account, p['symbol'], p['side']) for p in changes['closed_positions']]
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
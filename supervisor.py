@@ -0,0 +1,397 @@
+import itertools
+import multiprocessing
+import signal
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing.connection import Connection, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+from account_pool import AccountPool
+from binance_client import BinanceClient
+from config import (
+    STATE_DB_PATH, TRADE_HISTORY, MARKET_CACHE_PATH, MARKET_CACHE_TTL, ACCOUNT_TIMEOUT,
+    ACCOUNT_RATE_LIMIT, ACCOUNT_RATE_BURST, ACCOUNT_MAX_BACKOFF
+)
+from market_cache import MarketCache
+from metrics import metrics
+from monitoring import create_accounts, schedule_monitoring, timed_check
+from price_cache import MarkPriceCache, mark_prices
+from scheduler import TaskScheduler
+from state_store import PositionStateStore
+from trade_history import TradeHistoryStore
+
+
+def shard_configs(configs: List[Dict], workers: int) -> List[List[Dict]]:
+    """按顺序轮流分配账户，第一个账户（母账户）总在第 0 个分片"""
+    workers = max(min(workers, len(configs)), 1)
+    return [configs[i::workers] for i in range(workers)]
+
+
+class ShardWorker:
+    """工作进程内的监控：与单进程模式相同的轮询/推送任务，检查结果以事件发送给主进程
+
+    事件和命令都通过与主进程之间的双向管道（Unix socket）传递：
+    - 事件: ('ready', 账户名称列表) / ('update', 账户, 变化, 快照, 持仓, 交易对) / ('reply', 请求编号, 结果, 错误)
+    - 命令: ('snapshot', 请求编号, 账户, max_age) / ('snapshots', 请求编号) / ('stop',)
+    """
+
+    def __init__(self, accounts: List[BinanceClient], pool: AccountPool, scheduler: TaskScheduler,
+                 conn: Connection):
+        self.accounts = {account.account_name: account for account in accounts}
+        self.pool = pool
+        self.scheduler = scheduler
+        self.conn = conn
+        # 轮询线程、推送线程和请求回调都会发送事件
+        self._send_lock = threading.Lock()
+
+    def send(self, *event):
+        with self._send_lock:
+            self.conn.send(event)
+
+    def check_account(self, account: BinanceClient) -> Dict:
+        """检查单个账户的仓位变化，把变化和最新快照发送给主进程"""
+        changes = timed_check(account)
+        self._publish(account, changes, snapshot=account.last_snapshot)
+        return changes
+
+    def on_stream_changes(self, account: BinanceClient, changes: Dict):
+        """用户数据流推送的仓位变化：把变化和当前持仓发送给主进程"""
+        positions = [record.data for record in account.position_index.positions(account.account_name).values()]
+        self._publish(account, changes, positions=positions)
+
+    def _publish(self, account: BinanceClient, changes: Dict, snapshot: Optional[Dict] = None,
+                 positions: Optional[List[Dict]] = None):
+        if not (changes['new_positions'] or changes['closed_positions']):
+            changes = None
+        # 主进程的标记价格推送只跟踪持有的交易对，交易对转换需要交易对信息，在工作进程完成
+        market_ids = sorted({account._market_id(symbol) for symbol, _ in account.position_index.keys(account.account_name)})
+        self.send('update', account.account_name, changes, snapshot, positions, market_ids)
+
+    def handle(self, command: Tuple):
+        """处理主进程的请求，结果异步返回，不阻塞调度循环"""
+        if command[0] == 'snapshot':
+            _, request_id, name, max_age = command
+            account = self.accounts.get(name)
+            if account is None:
+                self.send('reply', request_id, None, f"账户不存在: {name}")
+                return
+            future = self.pool.submit(account, lambda account: account.get_snapshot(max_age))
+            future.add_done_callback(lambda future: self._reply(request_id, future))
+        elif command[0] == 'snapshots':
+            request_id = command[1]
+
+            def collect():
+                results = [(account.account_name, snapshot, str(error) if error is not None else None)
+                           for account, snapshot, error in self.pool.map(lambda account: account.get_snapshot())]
+                self.send('reply', request_id, results, None)
+
+            self.scheduler.submit(collect, name='snapshots')
+
+    def _reply(self, request_id: int, future: Future):
+        try:
+            self.send('reply', request_id, future.result(), None)
+        except Exception as e:
+            self.send('reply', request_id, None, str(e))
+
+    def serve(self):
+        """运行调度循环，等待下一个任务时接收主进程的命令；收到停止命令或主进程退出时返回"""
+        while True:
+            delay = self.scheduler.run_pending()
+            if not self.conn.poll(1.0 if delay is None else min(delay, 1.0)):
+                continue
+            try:
+                command = self.conn.recv()
+            except EOFError:
+                # 主进程已退出
+                return
+            if command[0] == 'stop':
+                return
+            self.handle(command)
+
+
+def run_worker(configs: List[Dict], sub_accounts: bool, conn: Connection):
+    """工作进程入口：创建分到的账户，按配置的仓位数据来源监控，直到主进程发出停止命令或退出"""
+    # Ctrl+C 由主进程处理，工作进程按停止命令退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # SQLite WAL 模式支持多进程读写，各进程只写自己账户的记录
+    state_store = PositionStateStore(STATE_DB_PATH) if STATE_DB_PATH else None
+    trade_store = TradeHistoryStore(STATE_DB_PATH) if STATE_DB_PATH and TRADE_HISTORY else None
+    market_cache = MarketCache(MARKET_CACHE_PATH or None, ttl=MARKET_CACHE_TTL)
+
+    accounts, limits = create_accounts(configs, state_store, market_cache, trade_store, sub_accounts)
+    pool = AccountPool(
+        accounts, timeout=ACCOUNT_TIMEOUT, rate_limit=ACCOUNT_RATE_LIMIT,
+        burst=ACCOUNT_RATE_BURST, max_backoff=ACCOUNT_MAX_BACKOFF, limits=limits
+    )
+    scheduler = TaskScheduler(max_workers=len(accounts) + 4, handle_signals=False)
+    worker = ShardWorker(accounts, pool, scheduler, conn)
+    # 先上报账户列表（含母账户批量接口发现的子账户），之后的事件都能找到对应账户
+    worker.send('ready', [account.account_name for account in accounts])
+    schedule_monitoring(accounts, pool, scheduler, worker.check_account, worker.on_stream_changes)
+    try:
+        worker.serve()
+    finally:
+        pool.shutdown()
+
+
+class RemoteAccount:
+    """主进程中代表工作进程内某个账户的代理，提供与 BinanceClient 相同的 account_name 和 get_snapshot"""
+
+    def __init__(self, supervisor: 'Supervisor', name: str, shard: int):
+        self.supervisor = supervisor
+        self.account_name = name
+        self.shard = shard
+        self.last_snapshot = None
+        self._snapshot_time = 0.0
+
+    def _store(self, snapshot: Optional[Dict]):
+        if snapshot is not None:
+            self.last_snapshot = snapshot
+            self._snapshot_time = time.monotonic()
+
+    def get_snapshot(self, max_age: Optional[float] = None) -> Dict:
+        """获取账户快照，max_age 内有工作进程上报的快照时直接返回"""
+        if max_age is not None and self.last_snapshot is not None and \
+                time.monotonic() - self._snapshot_time <= max_age:
+            return self.last_snapshot
+        snapshot = self.supervisor.request(self.shard, 'snapshot', self.account_name, max_age)
+        self._store(snapshot)
+        return snapshot
+
+
+class _Worker:
+    """一个分片的工作进程及其重启状态"""
+
+    def __init__(self, shard: int, configs: List[Dict]):
+        self.shard = shard
+        self.configs = configs
+        self.process = None
+        self.conn = None
+        self.send_lock = threading.Lock()
+        self.started_at = 0.0
+        self.failures = 0
+        self.restart_at = 0.0
+
+
+class Supervisor:
+    """多进程模式：账户按分片交给多个工作进程监控，主进程汇总仓位变化并统一发送通知和报告
+
+    工作进程各自拥有客户端、执行线程和调度器，JSON 解析等 CPU 开销分摊到多个核心；
+    工作进程异常退出时按指数退避自动重启（稳定运行 stable_time 秒后退出不累计退避）。
+    """
+
+    def __init__(self, configs: List[Dict],
+                 on_update: Callable[[RemoteAccount, Optional[Dict], Optional[Dict], Optional[List[Dict]]], None],
+                 workers: int = 2, sub_accounts: bool = False, target: Callable = run_worker,
+                 price_cache: Optional[MarkPriceCache] = None, timeout: float = 30,
+                 base_backoff: float = 1, max_backoff: float = 60, stable_time: float = 60,
+                 clock: Callable[[], float] = time.monotonic):
+        self.on_update = on_update
+        self.target = target
+        self.sub_accounts = sub_accounts
+        self.price_cache = price_cache if price_cache is not None else mark_prices
+        self.timeout = timeout
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.stable_time = stable_time
+        self._clock = clock
+        # spawn 启动的工作进程不继承主进程的线程、连接和锁
+        self._context = multiprocessing.get_context('spawn')
+        self._workers = [_Worker(shard, shard_accounts)
+                         for shard, shard_accounts in enumerate(shard_configs(configs, workers))]
+        # 账户列表在工作进程上报子账户后追加，Telegram 查询等直接引用此列表
+        self.accounts = [RemoteAccount(self, config['name'], worker.shard)
+                         for worker in self._workers for config in worker.configs]
+        self._accounts = {account.account_name: account for account in self.accounts}
+        self._requests = {}  # 请求编号 -> (分片, Future)
+        self._request_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+        for worker in self._workers:
+            metrics.gauge('worker_alive', '工作进程是否在运行',
+                          func=lambda worker=worker: int(worker.process is not None and worker.process.is_alive()),
+                          shard=str(worker.shard))
+
+    @property
+    def workers(self) -> int:
+        return len(self._workers)
+
+    def start(self):
+        """启动所有工作进程和事件接收线程"""
+        self._running = True
+        for worker in self._workers:
+            self._spawn(worker)
+        self._thread = threading.Thread(target=self._receive, name='supervisor-events', daemon=True)
+        self._thread.start()
+
+    def _spawn(self, worker: _Worker):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=self.target, args=(worker.configs, self.sub_accounts and worker.shard == 0, child_conn),
+            name=f"worker-{worker.shard}", daemon=True
+        )
+        process.start()
+        # 子进程持有自己的一端，主进程关闭副本后子进程退出时才能读到 EOF
+        child_conn.close()
+        worker.process, worker.conn = process, parent_conn
+        worker.started_at = self._clock()
+
+    def check(self):
+        """重启已退出的工作进程，连续崩溃时指数退避"""
+        if not self._running:
+            return
+        now = self._clock()
+        for worker in self._workers:
+            if worker.process is not None:
+                if worker.process.is_alive():
+                    continue
+                exitcode = worker.process.exitcode
+                if now - worker.started_at >= self.stable_time:
+                    worker.failures = 0
+                worker.failures += 1
+                delay = min(self.base_backoff * 2 ** (worker.failures - 1), self.max_backoff)
+                worker.restart_at = now + delay
+                worker.process = None
+                worker.conn.close()
+                self._fail_requests(worker.shard, f"工作进程 {worker.shard} 已退出")
+                metrics.counter('worker_restarts_total', '工作进程异常退出后重启的次数', shard=str(worker.shard)).inc()
+                print(f"工作进程 {worker.shard} 已退出（退出码 {exitcode}），{delay:g}秒后重启")
+            if now >= worker.restart_at:
+                self._spawn(worker)
+
+    def _receive(self):
+        """接收所有工作进程的事件，按账户分发"""
+        while self._running:
+            conns = {worker.conn: worker for worker in self._workers
+                     if worker.process is not None and not worker.conn.closed}
+            if not conns:
+                time.sleep(0.5)
+                continue
+            try:
+                ready = wait(list(conns), timeout=0.5)
+            except OSError:
+                # 连接在等待期间被关闭（工作进程正在重启）
+                continue
+            for conn in ready:
+                try:
+                    event = conn.recv()
+                except (EOFError, OSError):
+                    # 工作进程已退出，由 check 负责重启
+                    conn.close()
+                    continue
+                try:
+                    self._dispatch(conns[conn], event)
+                except Exception as e:
+                    print(f"处理工作进程事件失败: {str(e)}")
+
+    def _dispatch(self, worker: _Worker, event: Tuple):
+        kind = event[0]
+        if kind == 'update':
+            _, name, changes, snapshot, positions, market_ids = event
+            account = self._account(name, worker.shard)
+            account._store(snapshot)
+            self.price_cache.track(name, market_ids)
+            self.on_update(account, changes, snapshot, positions)
+        elif kind == 'reply':
+            _, request_id, result, error = event
+            with self._lock:
+                _, future = self._requests.pop(request_id, (None, None))
+            if future is not None:
+                if error is not None:
+                    future.set_exception(Exception(error))
+                else:
+                    future.set_result(result)
+        elif kind == 'ready':
+            for name in event[1]:
+                self._account(name, worker.shard)
+            if worker.failures:
+                print(f"工作进程 {worker.shard} 已重启，监控账户 {len(event[1])} 个")
+
+    def _account(self, name: str, shard: int) -> RemoteAccount:
+        with self._lock:
+            account = self._accounts.get(name)
+            if account is None:
+                account = self._accounts[name] = RemoteAccount(self, name, shard)
+                self.accounts.append(account)
+            return account
+
+    def _submit(self, shard: int, *command) -> Future:
+        """向工作进程发送请求，返回等待回复的 Future"""
+        future = Future()
+        with self._lock:
+            request_id = next(self._request_ids)
+            self._requests[request_id] = (shard, future)
+        worker = self._workers[shard]
+        try:
+            if worker.process is None or worker.conn.closed:
+                raise ConnectionError(f"工作进程 {shard} 正在重启")
+            with worker.send_lock:
+                worker.conn.send((command[0], request_id) + command[1:])
+        except (OSError, ConnectionError) as e:
+            with self._lock:
+                self._requests.pop(request_id, None)
+            future.set_exception(e)
+        return future
+
+    def _fail_requests(self, shard: int, message: str):
+        with self._lock:
+            failed = [(request_id, future) for request_id, (request_shard, future) in self._requests.items()
+                      if request_shard == shard]
+            for request_id, _ in failed:
+                del self._requests[request_id]
+        for _, future in failed:
+            future.set_exception(ConnectionError(message))
+
+    def request(self, shard: int, *command, timeout: Optional[float] = None):
+        """向工作进程发送请求并等待结果"""
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return self._submit(shard, *command).result(timeout=timeout)
+        except FutureTimeoutError:
+            raise TimeoutError(f"工作进程 {shard} 请求超时（{timeout}秒）")
+
+    def map_snapshots(self, timeout: Optional[float] = None) -> List[Tuple[RemoteAccount, Optional[Dict],
+                                                                               Optional[Exception]]]:
+        """获取所有账户的快照（每个工作进程一次请求），按账户顺序返回 (账户, 快照, 异常)"""
+        timeout = self.timeout if timeout is None else timeout
+        futures = [(worker.shard, self._submit(worker.shard, 'snapshots')) for worker in self._workers]
+        deadline = time.monotonic() + timeout
+        results = []
+        for shard, future in futures:
+            try:
+                replies = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeoutError:
+                error = TimeoutError(f"工作进程 {shard} 请求超时（{timeout}秒）")
+                replies = [(account.account_name, None, error) for account in self.accounts if account.shard == shard]
+            except Exception as e:
+                replies = [(account.account_name, None, e) for account in self.accounts if account.shard == shard]
+            for name, snapshot, error in replies:
+                account = self._account(name, shard)
+                account._store(snapshot)
+                results.append((account, snapshot, Exception(error) if isinstance(error, str) else error))
+        order = {account.account_name: index for index, account in enumerate(self.accounts)}
+        return sorted(results, key=lambda item: order[item[0].account_name])
+
+    def stop(self, timeout: float = 10):
+        """通知所有工作进程退出，超时未退出的强制结束"""
+        self._running = False
+        for worker in self._workers:
+            if worker.process is None:
+                continue
+            try:
+                with worker.send_lock:
+                    worker.conn.send(('stop',))
+            except OSError:
+                pass
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            if worker.process is None:
+                continue
+            worker.process.join(max(deadline - time.monotonic(), 0))
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join(1)
+        if self._thread is not None:
+            self._thread.join(timeout=2)
@@ -0,0 +1,93 @@
+"""Telegram 提醒规则命令：异常消息不阻塞消息循环，只接受配置的聊天"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from alert_rules import AlertRuleEngine, AlertRuleStore, parse_rule
+from price_cache import MarkPriceCache
+from services.telegram_service import TelegramService
+
+
+class StopLoop(Exception):
+    pass
+
+
+class FakeBot:
+    """按批次返回消息，记录每次请求的 offset 和发出的消息"""
+
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.offsets = []
+        self.sent = []
+
+    async def get_updates(self, offset=None, timeout=30):
+        self.offsets.append(offset)
+        if not self.batches:
+            raise asyncio.CancelledError
+        return self.batches.pop(0)
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.sent.append((chat_id, text))
+
+
+def update(update_id, text, chat_id=1):
+    message = SimpleNamespace(text=text, chat=SimpleNamespace(id=chat_id))
+    return SimpleNamespace(update_id=update_id, message=message)
+
+
+@pytest.fixture
+def engine():
+    store = AlertRuleStore(':memory:')
+    yield AlertRuleEngine(store, lambda alerts: None, price_cache=MarkPriceCache())
+    store.close()
+
+
+@pytest.fixture
+def service(monkeypatch):
+    # 消息循环每批之间的等待不影响结果
+    sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, 'sleep', lambda seconds: sleep(0))
+    service = TelegramService.__new__(TelegramService)
+    service.chat_id = '1'
+    service._query_tasks = set()
+    return service
+
+
+def run_loop(service, bot, engine):
+    service._bot = bot
+    service._async_send_message = lambda _, text: bot.send_message(service.chat_id, text)
+    try:
+        asyncio.run(service.start_message_handler([], engine))
+    except asyncio.CancelledError:
+        pass
+
+
+@pytest.mark.parametrize('args', [['BTC', '>', 'nan'], ['BTC', '1e400'], ['SOL', 'pnl', 'inf'], ['SOL', '-inf%']])
+def test_parse_rule_rejects_non_finite_values(args):
+    with pytest.raises(ValueError):
+        parse_rule(args)
+
+
+def test_bad_messages_do_not_stall_update_loop(service, engine):
+    bot = FakeBot([[
+        update(10, '/alert BTC > 70000'),
+        update(11, '   '),
+        update(12, '/alert BTC > nan'),
+        update(13, '/unalert 99999999999999999999'),
+        update(14, '/alert ETH < 2000'),
+    ]])
+    run_loop(service, bot, engine)
+    # 下一次请求从最后一条消息之后开始，规则不会被重复添加
+    assert bot.offsets == [None, 15]
+    assert [(rule.market_id, rule.op) for rule in engine.rules()] == [('BTCUSDT', '>'), ('ETHUSDT', '<')]
+    assert any('没有提醒 #99999999999999999999' in text for _, text in bot.sent)
+
+
+def test_rule_commands_from_other_chats_are_ignored(service, engine):
+    rule = engine.add('price', 'BTCUSDT', '>', 70000)
+    bot = FakeBot([[update(1, '/alert ETH < 2000', chat_id=2), update(2, f'/unalert {rule.id}', chat_id=2),
+                    update(3, '/alerts', chat_id=2)]])
+    run_loop(service, bot, engine)
+    assert engine.rules() == [rule]
+    assert bot.sent == []
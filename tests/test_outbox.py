@@ -0,0 +1,61 @@
+"""NotificationOutbox：合并发送失败后逐条重发，渠道拒绝的消息不重试，停止时中断退避等待"""
+import time
+
+from services.outbox import NotificationOutbox, NotificationRejected
+
+
+class HtmlNotifier:
+    """模拟 Telegram HTML 模式：含未转义 '<' 的消息被拒绝"""
+    rate_limit = (1000, 1000)
+    max_message_length = 4000
+
+    def __init__(self, reject=NotificationRejected):
+        self.reject = reject
+        self.calls = []
+        self.delivered = []
+
+    def send_message(self, message):
+        self.calls.append(message)
+        if '<' in message:
+            if self.reject is None:
+                return False
+            raise self.reject(f"can't parse entities: {message}")
+        self.delivered.append(message)
+        return True
+
+
+def send_batch(outbox, *messages):
+    for message in messages:
+        outbox.send_message(message)
+    assert outbox.flush(timeout=10)
+
+
+def test_rejected_message_does_not_take_merged_messages_down():
+    notifier = HtmlNotifier()
+    outbox = NotificationOutbox(notifier, window=0.2)
+    send_batch(outbox, "账户: Desk<1>", "⚠️ 风险提醒")
+    outbox.stop()
+
+    assert notifier.delivered == ["⚠️ 风险提醒"]
+    # 合并发送一次，拆开后各发送一次，被拒绝的消息不重试
+    assert len(notifier.calls) == 3
+
+
+def test_failed_merged_payload_is_resent_part_by_part():
+    notifier = HtmlNotifier(reject=None)
+    outbox = NotificationOutbox(notifier, window=0.2, max_retries=0)
+    send_batch(outbox, "新开仓", "账户: R<D>", "平仓")
+    outbox.stop()
+
+    assert notifier.delivered == ["新开仓", "平仓"]
+
+
+def test_stop_interrupts_retry_backoff():
+    notifier = HtmlNotifier(reject=None)
+    outbox = NotificationOutbox(notifier, window=0, max_retries=5)
+    outbox.send_message("<b>")
+    started = time.monotonic()
+    outbox.stop(timeout=0.5)
+
+    assert time.monotonic() - started < 3
+    assert not outbox._thread.is_alive()
@@ -0,0 +1,105 @@
+"""TaskScheduler 按注入的时钟调度：截止时间顺序、固定节拍不漂移、慢任务跳过节拍后重新调度"""
+from datetime import datetime
+
+from scheduler import TaskScheduler
+
+
+class ManualExecutor:
+    """提交的任务先排队，由测试决定何时执行（模拟执行中的慢任务）"""
+
+    def __init__(self, immediate: bool = True):
+        self.immediate = immediate
+        self.queued = []
+
+    def submit(self, func):
+        if self.immediate:
+            func()
+        else:
+            self.queued.append(func)
+
+    def run_queued(self):
+        queued, self.queued = self.queued, []
+        for func in queued:
+            func()
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def make_scheduler(clock, executor=None, wall_clock=datetime.now):
+    return TaskScheduler(clock=clock, wall_clock=wall_clock, executor=executor or ManualExecutor(),
+                         handle_signals=False)
+
+
+def test_tasks_run_in_due_time_order(clock):
+    scheduler = make_scheduler(clock)
+    order = []
+    for name, interval in (('c', 5), ('a', 2), ('b', 3)):
+        scheduler.add_interval_task(interval, lambda name=name: order.append((name, clock.now)), name=name)
+
+    while clock.now < 5:
+        clock.now += scheduler.run_pending()
+        scheduler.run_pending()
+    assert order == [('a', 2), ('b', 3), ('a', 4), ('c', 5)]
+
+
+def test_interval_does_not_drift_with_run_time(clock):
+    scheduler = make_scheduler(clock)
+    starts = []
+
+    def task():
+        starts.append(clock.now)
+        clock.now += 3  # 每次执行耗时 3 秒
+
+    job = scheduler.add_interval_task(10, task)
+    for _ in range(5):
+        clock.now += scheduler.run_pending()
+        scheduler.run_pending()
+    assert starts == [10, 20, 30, 40, 50]
+    assert job.runs == 5 and job.skipped == 0 and job.max_lateness == 0
+
+
+def test_slow_job_skips_overlapping_ticks_and_keeps_cadence(clock):
+    executor = ManualExecutor(immediate=False)
+    scheduler = make_scheduler(clock, executor)
+    job = scheduler.add_interval_task(10, lambda: None)
+
+    clock.now = 10
+    scheduler.run_pending()
+    assert job.running
+    # 上一次尚未结束，20 秒的节拍被跳过而不是重叠执行
+    clock.now = 20
+    scheduler.run_pending()
+    assert job.skipped == 1 and len(executor.queued) == 1
+
+    # 任务在 35 秒结束：已到期的 30 秒节拍只补执行一次，下一次仍在 40 秒（原节拍）
+    clock.now = 35
+    executor.run_queued()
+    assert not job.running
+    assert scheduler.run_pending() == 5
+    assert job.last_lateness == 5
+    executor.run_queued()
+
+    # 调度循环在 67 秒才醒来：只执行一次，错过的节拍计为跳过，之后回到 10 秒的整数倍
+    clock.now = 67
+    assert scheduler.run_pending() == 3
+    executor.run_queued()
+    assert job.runs == 3
+    assert job.last_lateness == 27
+    assert job.skipped == 1 + 2
+
+
+def test_daily_task_deadline_follows_wall_clock(clock):
+    clock.now = 1000.0
+    wall = datetime(2024, 11, 28, 8, 59, 30)
+    scheduler = make_scheduler(clock, wall_clock=lambda: wall)
+    runs = []
+    scheduler.add_daily_task('09:00', lambda: runs.append(clock.now))
+    assert scheduler.run_pending() == 30
+
+    clock.now += 30
+    wall = datetime(2024, 11, 28, 9, 0, 0)
+    scheduler.run_pending()
+    assert runs == [1030]
+    # 下一次为第二天 09:00
+    assert scheduler.run_pending() == 86400
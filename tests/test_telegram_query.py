@@ -0,0 +1,56 @@
+"""Telegram "查询" 经 AccountPool 的账户专属线程获取快照；仓位通知转义账户名中的 HTML 字符"""
+import asyncio
+import threading
+
+from account_pool import AccountPool
+from binance_client import BinanceClient
+from fakes import FakeFuturesExchange
+from price_cache import MarkPriceCache
+from services.telegram_service import TelegramService
+
+
+def test_query_runs_on_account_worker_thread():
+    exchange = FakeFuturesExchange()
+    exchange.set_position('BTCUSDT', 1, 60000)
+    client = BinanceClient({'name': '测试账户'}, exchange=exchange, price_cache=MarkPriceCache(),
+                           account_endpoint='v2')
+    threads = []
+    get_snapshot = client.get_snapshot
+
+    def recording_get_snapshot(max_age=None):
+        threads.append(threading.current_thread().name)
+        return get_snapshot(max_age)
+
+    client.get_snapshot = recording_get_snapshot
+    pool = AccountPool([client])
+    sent = []
+    service = TelegramService.__new__(TelegramService)
+    service._bot = object()
+
+    async def send(bot, text):
+        sent.append(text)
+
+    service._async_send_message = send
+    try:
+        asyncio.run(service._handle_query([client], pool))
+    finally:
+        pool.shutdown()
+    assert len(threads) == 1 and threads[0].startswith('account-测试账户')
+    assert len(sent) == 1 and 'BTC' in sent[0]
+
+
+def test_position_message_escapes_account_name():
+    exchange = FakeFuturesExchange()
+    client = BinanceClient({'name': 'R&D Desk<1>'}, exchange=exchange, price_cache=MarkPriceCache(),
+                           account_endpoint='v2')
+    client.check_position_changes()
+    service = TelegramService.__new__(TelegramService)
+
+    exchange.set_position('BTCUSDT', 1, 60000)
+    opened = service.format_position_message(client.check_position_changes())
+    exchange.set_position('BTCUSDT', 0, 60000, fill_price=61000)
+    closed = service.format_position_message(client.check_position_changes())
+
+    for message in (opened, closed):
+        assert "账户: R&amp;D Desk&lt;1&gt;\n" in message
+        assert '<' not in message and '&D' not in message
@@ -0,0 +1,67 @@
+"""平仓汇总：双向持仓的资金费按交易对结算，成交不完整时在通知中标明"""
+from fakes import FakeFuturesExchange
+from services.feishu_service import FeishuNotifier
+from trade_history import TradeHistory, TradeHistoryStore
+
+
+def make_history(clock, lookback=600):
+    clock.now = 1_700_000_000.0
+    exchange = FakeFuturesExchange(clock=clock)
+    store = TradeHistoryStore(':memory:')
+    return exchange, TradeHistory(exchange, '测试账户', store, lookback=lookback)
+
+
+def test_hedge_funding_overlapping_other_leg_is_not_counted_in_net_pnl(clock):
+    exchange, history = make_history(clock)
+    opened_at = exchange.milliseconds()
+    exchange.set_position('BTCUSDT', 1, 100, position_side='LONG')
+    clock.now += 60
+    exchange.set_position('BTCUSDT', -1, 100, position_side='SHORT')
+    clock.now += 60
+    exchange.add_funding('BTCUSDT', -5)
+    clock.now += 60
+    exchange.set_position('BTCUSDT', 0, 0, position_side='LONG', fill_price=110)
+
+    summary = history.close_summary('BTCUSDT', 'long', opened_at, exchange.milliseconds())
+    assert summary['complete'] and summary['funding_shared']
+    assert summary['funding'] == -5
+    assert summary['net_pnl'] == summary['realized_pnl'] - summary['fee']
+
+
+def test_single_hedge_leg_keeps_funding_in_net_pnl(clock):
+    exchange, history = make_history(clock)
+    opened_at = exchange.milliseconds()
+    exchange.set_position('BTCUSDT', 1, 100, position_side='LONG')
+    clock.now += 60
+    exchange.add_funding('BTCUSDT', -5)
+    clock.now += 60
+    exchange.set_position('BTCUSDT', 0, 0, position_side='LONG', fill_price=110)
+
+    summary = history.close_summary('BTCUSDT', 'long', opened_at, exchange.milliseconds())
+    assert not summary['funding_shared']
+    assert summary['net_pnl'] == summary['realized_pnl'] - summary['fee'] - 5
+
+
+def test_incomplete_summary_is_marked_in_message(clock):
+    exchange, history = make_history(clock, lookback=60)
+    exchange.set_position('ETHUSDT', 2, 100)
+    clock.now += 3600
+    # 开仓检测时间晚于实际开仓，回溯窗口内只有平仓成交
+    opened_at = exchange.milliseconds()
+    clock.now += 60
+    exchange.set_position('ETHUSDT', 0, 0, fill_price=105)
+
+    summary = history.close_summary('ETHUSDT', 'long', opened_at, exchange.milliseconds())
+    assert summary is not None and not summary['complete']
+
+    position = {
+        'account_name': '测试账户', 'base_currency': 'ETH', 'side': 'long', 'entryPrice': 100,
+        'contracts': 2, 'margin': 20, 'datetime': '2024-11-28 10:00:00', 'open_time': '2024-11-28 09:00:00',
+        'close_price': summary['close_price'], 'trades_complete': summary['complete'],
+        **{key: summary[key] for key in ('realized_pnl', 'fee', 'other_fees', 'funding', 'funding_shared',
+                                         'net_pnl')},
+    }
+    message = FeishuNotifier().format_position_message(
+        {'new_positions': [], 'closed_positions': [position], 'modified_positions': []}
+    )
+    assert '成交记录不完整' in message
@@ -0,0 +1,81 @@
+"""用户数据流 ACCOUNT_UPDATE 推送在单向和双向持仓模式下的仓位变化"""
+import pytest
+
+from binance_client import BinanceClient
+from fakes import FakeFuturesExchange, account_update_event
+from price_cache import MarkPriceCache
+
+
+def make_client(exchange=None):
+    return BinanceClient({'name': '测试账户'}, exchange=exchange or FakeFuturesExchange(),
+                         price_cache=MarkPriceCache(), account_endpoint='v2')
+
+
+def update(*rows):
+    """把多条 (交易对, 数量, 开仓价, 持仓方向) 合并为一个 ACCOUNT_UPDATE 事件"""
+    event = account_update_event(*rows[0][:3], position_side=rows[0][3])
+    for market_id, amount, entry_price, position_side in rows[1:]:
+        event['a']['P'].extend(account_update_event(market_id, amount, entry_price,
+                                                    position_side=position_side)['a']['P'])
+    return event
+
+
+def sides(changes, kind):
+    return sorted((p['base_currency'], p['side']) for p in changes[kind])
+
+
+def held(client):
+    return sorted(client.position_index.keys(client.account_name))
+
+
+def test_hedge_event_with_zero_both_row_opens_both_legs():
+    client = make_client()
+    changes = client.apply_user_data_event(update(
+        ('BTCUSDT', 1, 60000, 'LONG'), ('BTCUSDT', -1, 61000, 'SHORT'), ('BTCUSDT', 0, 0, 'BOTH')
+    ))
+    assert sides(changes, 'new_positions') == [('BTC', 'long'), ('BTC', 'short')]
+    assert changes['closed_positions'] == []
+    assert held(client) == [('BTC/USDT:USDT', 'long'), ('BTC/USDT:USDT', 'short')]
+
+
+def test_hedge_both_row_does_not_close_other_leg():
+    client = make_client()
+    client.apply_user_data_event(update(('BTCUSDT', -1, 61000, 'SHORT'), ('BTCUSDT', 0, 0, 'BOTH')))
+    changes = client.apply_user_data_event(update(('BTCUSDT', 0, 0, 'BOTH'), ('BTCUSDT', 2, 60000, 'LONG')))
+    assert sides(changes, 'new_positions') == [('BTC', 'long')]
+    assert changes['closed_positions'] == []
+    assert held(client) == [('BTC/USDT:USDT', 'long'), ('BTC/USDT:USDT', 'short')]
+
+
+def test_hedge_leg_close_only_removes_that_leg():
+    client = make_client()
+    client.apply_user_data_event(update(('ETHUSDT', 1, 3000, 'LONG'), ('ETHUSDT', -2, 3100, 'SHORT')))
+    changes = client.apply_user_data_event(update(('ETHUSDT', 0, 0, 'LONG'), ('ETHUSDT', 0, 0, 'BOTH')))
+    assert sides(changes, 'closed_positions') == [('ETH', 'long')]
+    assert held(client) == [('ETH/USDT:USDT', 'short')]
+
+
+def test_hedge_mode_from_rest_snapshot_ignores_lone_both_row():
+    exchange = FakeFuturesExchange()
+    exchange.set_position('BTCUSDT', 1, 60000, position_side='LONG')
+    exchange.set_position('BTCUSDT', -1, 61000, position_side='SHORT')
+    client = make_client(exchange)
+    client.check_position_changes()
+    changes = client.apply_user_data_event(update(('BTCUSDT', 0, 0, 'BOTH')))
+    assert changes['closed_positions'] == [] and changes['new_positions'] == []
+    assert held(client) == [('BTC/USDT:USDT', 'long'), ('BTC/USDT:USDT', 'short')]
+
+
+@pytest.mark.parametrize('amount, opened, closed', [
+    (2, [], []),
+    (-1, [('SOL', 'short')], [('SOL', 'long')]),
+    (0, [], [('SOL', 'long')]),
+])
+def test_one_way_both_row_maps_to_stored_side(amount, opened, closed):
+    client = make_client()
+    client.apply_user_data_event(update(('SOLUSDT', 1, 150, 'BOTH')))
+    changes = client.apply_user_data_event(update(('SOLUSDT', amount, 155, 'BOTH')))
+    assert sides(changes, 'new_positions') == opened
+    assert sides(changes, 'closed_positions') == closed
+    if amount == 2:
+        assert len(changes['modified_positions']) == 1
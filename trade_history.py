@@ -0,0 +1,297 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from db import open_sqlite
+
+logger = logging.getLogger(__name__)
+
+# userTrades / income 单次查询的时间范围上限为 7 天
+MAX_WINDOW_MS = 7 * 86400 * 1000
+# 单页条数上限
+PAGE_SIZE = 1000
+# 计入净盈亏的手续费资产
+SETTLE_ASSETS = ('USDT', 'USDC', '')
+# 数量比较容差（成交数量为字符串转浮点）
+EPSILON = 1e-9
+
+
+class TradeHistoryStore:
+    """成交和资金费历史（SQLite WAL 模式），按账户、数据流保存同步游标"""
+
+    def __init__(self, path: str):
+        self._conn = open_sqlite(path)
+        self._lock = threading.Lock()
+        with self._lock:
+            # stream 为 trades（按交易对）或 income（symbol 为空）；
+            # from_id / start_time 为下一次增量同步的起点，synced_from 为已同步范围的起始时间
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_cursors (
+                    account     TEXT NOT NULL,
+                    stream      TEXT NOT NULL,
+                    symbol      TEXT NOT NULL,
+                    from_id     INTEGER,
+                    start_time  INTEGER NOT NULL,
+                    synced_from INTEGER NOT NULL,
+                    PRIMARY KEY (account, stream, symbol)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS user_trades (
+                    account          TEXT NOT NULL,
+                    symbol           TEXT NOT NULL,
+                    id               INTEGER NOT NULL,
+                    side             TEXT NOT NULL,
+                    position_side    TEXT NOT NULL,
+                    price            REAL NOT NULL,
+                    qty              REAL NOT NULL,
+                    realized_pnl     REAL NOT NULL,
+                    commission       REAL NOT NULL,
+                    commission_asset TEXT NOT NULL,
+                    time             INTEGER NOT NULL,
+                    PRIMARY KEY (account, symbol, id)
+                ) WITHOUT ROWID
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS funding_income (
+                    account TEXT NOT NULL,
+                    tran_id TEXT NOT NULL,
+                    symbol  TEXT NOT NULL,
+                    income  REAL NOT NULL,
+                    asset   TEXT NOT NULL,
+                    time    INTEGER NOT NULL,
+                    PRIMARY KEY (account, tran_id, symbol)
+                ) WITHOUT ROWID
+            """)
+            self._conn.commit()
+
+    def cursor(self, account: str, stream: str, symbol: str = '') -> Optional[Tuple[Optional[int], int, int]]:
+        """返回 (from_id, start_time, synced_from)，未同步过时返回 None"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT from_id, start_time, synced_from FROM sync_cursors "
+                "WHERE account = ? AND stream = ? AND symbol = ?",
+                (account, stream, symbol)
+            ).fetchone()
+
+    def save_trades(self, account: str, symbol: str, rows: List[Dict],
+                    cursor: Tuple[Optional[int], int, int]):
+        """在一个事务中写入新成交和同步游标"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO user_trades VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (account, symbol, int(row['id']), row['side'], row.get('positionSide', 'BOTH'),
+                     float(row['price']), float(row['qty']), float(row.get('realizedPnl') or 0),
+                     float(row.get('commission') or 0), row.get('commissionAsset') or '', int(row['time']))
+                    for row in rows
+                ]
+            )
+            self._save_cursor(account, 'trades', symbol, cursor)
+
+    def save_income(self, account: str, rows: List[Dict], cursor: Tuple[Optional[int], int, int]):
+        """在一个事务中写入新资金费记录和同步游标"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO funding_income VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (account, str(row['tranId']), row.get('symbol') or '', float(row['income']),
+                     row.get('asset') or '', int(row['time']))
+                    for row in rows
+                ]
+            )
+            self._save_cursor(account, 'income', '', cursor)
+
+    def _save_cursor(self, account: str, stream: str, symbol: str, cursor: Tuple[Optional[int], int, int]):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sync_cursors VALUES (?, ?, ?, ?, ?, ?)",
+            (account, stream, symbol) + tuple(cursor)
+        )
+
+    def trades(self, account: str, symbol: str, position_side: Optional[str] = None,
+               until: Optional[int] = None) -> List[Tuple]:
+        """按时间顺序返回 (id, side, position_side, price, qty, realized_pnl, commission, commission_asset, time)"""
+        query = ("SELECT id, side, position_side, price, qty, realized_pnl, commission, commission_asset, time "
+                 "FROM user_trades WHERE account = ? AND symbol = ?")
+        params = [account, symbol]
+        if position_side is not None:
+            query += " AND position_side = ?"
+            params.append(position_side)
+        if until is not None:
+            query += " AND time <= ?"
+            params.append(until)
+        with self._lock:
+            return self._conn.execute(query + " ORDER BY time, id", params).fetchall()
+
+    def funding(self, account: str, symbol: str, start: int, end: int) -> float:
+        """交易对在时间范围内的资金费合计（负数为支付）"""
+        with self._lock:
+            (total,) = self._conn.execute(
+                "SELECT COALESCE(SUM(income), 0) FROM funding_income "
+                "WHERE account = ? AND symbol = ? AND time BETWEEN ? AND ?",
+                (account, symbol, start, end)
+            ).fetchone()
+        return total
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TradeHistory:
+    """单个账户的成交（userTrades）和资金费（income）增量同步，并据此计算平仓的实际结果
+
+    只在检测到平仓时同步：成交按交易对用 fromId 续传，资金费用 startTime 续传，
+    游标和数据保存在 SQLite 中，重启后也不会重新下载已同步的历史。
+    """
+
+    def __init__(self, exchange, account: str, store: TradeHistoryStore, lookback: float = 600,
+                 page_size: int = PAGE_SIZE):
+        self.exchange = exchange
+        self.account = account
+        self.store = store
+        self.lookback_ms = int(lookback * 1000)  # 首次同步时在开仓检测时间之前多取的时间
+        self.page_size = page_size
+        self._lock = threading.Lock()
+
+    def sync_trades(self, market_id: str, start: int, now: int) -> int:
+        """同步交易对的成交到 now，确保 start 之后的数据已在本地，返回新获取的条数"""
+        params = {'symbol': market_id}
+        with self._lock:
+            cursor = self.store.cursor(self.account, 'trades', market_id)
+            if cursor is None:
+                from_id, synced_from = None, start
+                rows = self._fetch_by_time(self._user_trades, params, start, now)
+            else:
+                from_id, start_time, synced_from = cursor
+                rows = []
+                if start < synced_from:
+                    # 需要的范围早于已同步范围：补齐缺失的一段
+                    rows = self._fetch_by_time(self._user_trades, params, start, synced_from - 1)
+                    synced_from = start
+                if from_id is None:
+                    rows += self._fetch_by_time(self._user_trades, params, start_time, now)
+                else:
+                    # 已有成交游标：只按 fromId 获取新成交
+                    next_id = from_id
+                    while True:
+                        batch = self._user_trades(dict(params, fromId=next_id, limit=self.page_size))
+                        rows.extend(batch)
+                        if len(batch) < self.page_size:
+                            break
+                        next_id = int(batch[-1]['id']) + 1
+            if rows:
+                from_id = max(from_id or 0, max(int(row['id']) for row in rows) + 1)
+            self.store.save_trades(self.account, market_id, rows, (from_id, now, synced_from))
+            return len(rows)
+
+    def sync_income(self, start: int, now: int) -> int:
+        """同步资金费记录到 now，确保 start 之后的数据已在本地，返回新获取的条数"""
+        params = {'incomeType': 'FUNDING_FEE'}
+        with self._lock:
+            cursor = self.store.cursor(self.account, 'income')
+            if cursor is None:
+                synced_from = start
+                rows = self._fetch_by_time(self._income, params, start, now)
+            else:
+                _, start_time, synced_from = cursor
+                rows = []
+                if start < synced_from:
+                    rows = self._fetch_by_time(self._income, params, start, synced_from - 1)
+                    synced_from = start
+                # 从上次同步的截止时间继续（含该时刻，重复的记录按主键忽略）
+                rows += self._fetch_by_time(self._income, params, start_time, now)
+            self.store.save_income(self.account, rows, (None, now, synced_from))
+            return len(rows)
+
+    def _fetch_by_time(self, fetch: Callable[[Dict], List[Dict]], params: Dict, start: int, end: int) -> List[Dict]:
+        """按不超过 7 天的时间窗口分页获取 [start, end] 内的记录"""
+        rows = []
+        window_start = start
+        while window_start <= end:
+            window_end = min(window_start + MAX_WINDOW_MS - 1, end)
+            batch = fetch(dict(params, startTime=window_start, endTime=window_end, limit=self.page_size))
+            rows.extend(batch)
+            if len(batch) < self.page_size:
+                window_start = window_end + 1
+            else:
+                # 本窗口未取完：从最后一条的时间继续，同一毫秒内的重复记录按主键忽略
+                last = int(batch[-1]['time'])
+                window_start = last if last > window_start else window_start + 1
+        return rows
+
+    def _user_trades(self, params: Dict) -> List[Dict]:
+        return self.exchange.fapiPrivateGetUserTrades(params)
+
+    def _income(self, params: Dict) -> List[Dict]:
+        return self.exchange.fapiPrivateGetIncome(params)
+
+    def close_summary(self, market_id: str, side: str, opened_at: Optional[int],
+                      now: Optional[int] = None) -> Optional[Dict]:
+        """计算一次平仓的成交均价、已实现盈亏、手续费和资金费
+
+        从平仓前最后一笔成交向前回溯，直到该方向的持仓数量回到 0，得到这次持仓的全部成交。
+        opened_at 为开仓检测时间（毫秒），只用于决定首次同步的起点。
+        """
+        now = now if now is not None else int(time.time() * 1000)
+        start = (opened_at if opened_at is not None else now) - self.lookback_ms
+        self.sync_trades(market_id, start, now)
+
+        # 双向持仓按 positionSide 区分；单向持仓（BOTH）下多头由买入开仓、卖出平仓，空头相反
+        rows = (self.store.trades(self.account, market_id, side.upper(), until=now)
+                or self.store.trades(self.account, market_id, 'BOTH', until=now))
+        opening = 'BUY' if side == 'long' else 'SELL'
+
+        fills = []
+        position = 0.0
+        for row in reversed(rows):
+            signed = row[4] if row[1] == opening else -row[4]
+            if not fills and signed > 0:
+                # 最后一笔不是减仓成交：持仓还没有平掉（或成交尚未同步到）
+                return None
+            fills.append(row)
+            position -= signed
+            if abs(position) <= EPSILON:
+                break
+        if not fills:
+            return None
+        complete = abs(position) <= EPSILON
+        fills.reverse()
+
+        closing = [row for row in fills if row[1] != opening]
+        closed_qty = sum(row[4] for row in closing)
+        first_time = fills[0][8] if complete else start
+        self.sync_income(first_time, now)
+
+        fees = {}
+        for row in fills:
+            fees[row[7]] = fees.get(row[7], 0.0) + row[6]
+        # 以结算资产（USDT/USDC）支付的手续费计入净盈亏，其他资产（如 BNB 抵扣）单独列出
+        fee = sum(fees.pop(asset, 0.0) for asset in SETTLE_ASSETS)
+        realized_pnl = sum(row[5] for row in fills)
+        funding = self.store.funding(self.account, market_id, first_time, now)
+        # 资金费按交易对结算：双向持仓的另一方向同期也有持仓时无法拆分，只作为交易对合计列出，不计入净盈亏
+        funding_shared = fills[0][2] != 'BOTH' and self._other_leg_held(market_id, side, first_time, now)
+        return {
+            'close_price': sum(row[3] * row[4] for row in closing) / closed_qty if closed_qty else None,
+            'realized_pnl': realized_pnl,
+            'fee': fee,
+            'other_fees': fees,
+            'funding': funding,
+            'funding_shared': funding_shared,
+            'net_pnl': realized_pnl - fee + (0.0 if funding_shared else funding),
+            'fills': len(fills),
+            'complete': complete,
+        }
+
+    def _other_leg_held(self, market_id: str, side: str, start: int, end: int) -> bool:
+        """双向持仓的另一方向在 [start, end] 内是否持有过仓位（按已同步的成交推算）"""
+        other = 'short' if side == 'long' else 'long'
+        opening = 'BUY' if other == 'long' else 'SELL'
+        position = 0.0
+        for row in self.store.trades(self.account, market_id, other.upper(), until=end):
+            if row[8] >= start:
+                return True
+            position += row[4] if row[1] == opening else -row[4]
+        return abs(position) > EPSILON
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict
+
+import websockets
+
+from binance_client import BinanceClient
+
+logger = logging.getLogger(__name__)
+
+# 币安 U 本位合约用户数据流地址
+USER_STREAM_URL = 'wss://fstream.binance.com/ws'
+
+
+class ListenKeyExpired(Exception):
+    """listenKey 已过期，需要重新申请并重连"""
+
+
+class UserDataStream:
+    """币安合约用户数据流，将账户推送事件实时应用到 BinanceClient 的仓位簿"""
+
+    def __init__(self, client: BinanceClient, on_changes: Callable[[BinanceClient, Dict], None],
+                 base_url: str = USER_STREAM_URL, keepalive_interval: int = 1800,
+                 max_backoff: int = 60):
+        self.client = client
+        self.on_changes = on_changes
+        self.base_url = base_url.rstrip('/')
+        self.keepalive_interval = keepalive_interval
+        self.max_backoff = max_backoff
+        self.connected = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._loop = None
+
+    def start(self):
+        """在后台线程中启动推送连接"""
+        self._thread = threading.Thread(
+            target=lambda: asyncio.run(self._run()),
+            name=f"user-stream-{self.client.account_name}",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """停止推送连接"""
+        self._stopping.set()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(lambda: None)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    async def _run(self):
+        """连接、接收事件，断线后指数退避重连"""
+        self._loop = asyncio.get_running_loop()
+        backoff = 1
+        while not self._stopping.is_set():
+            try:
+                listen_key = await asyncio.to_thread(self.client.create_listen_key)
+                async with websockets.connect(f"{self.base_url}/{listen_key}") as ws:
+                    self.connected.set()
+                    backoff = 1
+                    keepalive = asyncio.create_task(self._keepalive())
+                    try:
+                        while not self._stopping.is_set():
+                            try:
+                                raw = await asyncio.wait_for(ws.recv(), timeout=1)
+                            except asyncio.TimeoutError:
+                                continue
+                            self._handle_message(raw)
+                    finally:
+                        keepalive.cancel()
+            except ListenKeyExpired:
+                logger.warning(f"{self.client.account_name} listenKey 已过期，重新连接")
+            except Exception as e:
+                logger.error(f"{self.client.account_name} 用户数据流连接异常: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+            finally:
+                self.connected.clear()
+
+    async def _keepalive(self):
+        """定期延长 listenKey 有效期"""
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            try:
+                await asyncio.to_thread(self.client.keepalive_listen_key)
+            except Exception as e:
+                logger.error(f"{self.client.account_name} listenKey 续期失败: {e}")
+
+    def _handle_message(self, raw):
+        """解析单条推送并回调仓位变化"""
+        event = json.loads(raw)
+        if event.get('e') == 'listenKeyExpired':
+            raise ListenKeyExpired()
+
+        received_at = time.time()
+        changes = self.client.apply_user_data_event(event)
+        if changes and (changes['new_positions'] or changes['closed_positions']):
+            event_time = event.get('E')
+            if event_time:
+                logger.debug(f"{self.client.account_name} 推送延迟: {received_at * 1000 - event_time:.0f}ms")
+            try:
+                self.on_changes(self.client, changes)
+            except Exception as e:
+                logger.error(f"{self.client.account_name} 处理仓位推送失败: {e}")